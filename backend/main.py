@@ -1,10 +1,9 @@
 import os
 import sys
 from pathlib import Path
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 
 # Add project root to path for script imports
@@ -12,7 +11,8 @@ PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
 
-from backend.routers import generate
+from backend.routers import downloads, generate
+from output_store import OUTPUT_STORE
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -20,7 +20,11 @@ async def lifespan(app: FastAPI):
     output_dirs = ["output", "output/icon", "output/cta", "output/card", "output/boon", "output/gacha"]
     for d in output_dirs:
         Path(PROJECT_ROOT / d).mkdir(parents=True, exist_ok=True)
+    # Apply the output disk budget and age limit left over from the last run
+    OUTPUT_STORE.sweep()
     yield
+    # Outputs still held in memory by recent requests
+    await generate.drain_background_writes()
 
 app = FastAPI(
     title="UNGODLY Asset Generator",
@@ -38,16 +42,13 @@ app.add_middleware(
 
 # API routes (must be before static files)
 app.include_router(generate.router, prefix="/api", tags=["generation"])
+# Generated files: immutable versioned URLs, stable aliases redirect to them
+app.include_router(downloads.router, prefix="/downloads", tags=["downloads"])
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
-# Serve generated files for download
-output_path = PROJECT_ROOT / "output"
-if output_path.exists():
-    app.mount("/downloads", StaticFiles(directory=str(output_path)), name="downloads")
-
 # Serve static frontend files (must be last - catches all other routes)
 static_path = PROJECT_ROOT / "static"
 if static_path.exists():
@@ -0,0 +1,210 @@
+"""
+Download endpoints for generated files.
+
+Every tracked output has an immutable, content-versioned URL
+
+    /downloads/v/{sha256}/{name}     e.g. /downloads/v/8a33.../icon/ICONBTN_HEART.png
+
+served with a year-long immutable Cache-Control, a strong ETag (the
+digest), conditional GET (304) and single byte ranges, so browsers and the
+CDN can keep it forever. The stable alias /downloads/{name} redirects to
+the current version; it changes whenever the output is regenerated.
+
+HTML pages are the exception: they load their images by relative URL
+("assets/card.png"), which only resolves next to the page's own name, so
+pages are served from the alias (revalidated by ETag) and never versioned.
+
+Untracked files (written before the output store existed) are served
+directly from the alias. Evicted outputs answer 410 Gone.
+"""
+import re
+import sys
+import mimetypes
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+from output_store import OUTPUT_STORE
+
+router = APIRouter()
+
+OUTPUT_ROOT = (PROJECT_ROOT / "output").resolve()
+DOWNLOADS_PREFIX = "/downloads/"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Aliases move when an output is regenerated, so caches must revalidate them
+REVALIDATE = "no-cache"
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+# Served from the alias only (see module docstring)
+DOCUMENT_SUFFIXES = (".html", ".htm")
+_VERSIONED = re.compile(r"v/([0-9a-f]{64})/(.+)")
+
+UNSATISFIABLE = "unsatisfiable"
+
+
+# =============================================================================
+# URLS
+# =============================================================================
+
+def versioned_url(download_url: str) -> str:
+    """/downloads/{name} -> /downloads/v/{digest}/{name} for tracked outputs; other URLs unchanged."""
+    path = path_for_url(download_url)
+    digest = OUTPUT_STORE.digest_of(path) if path else None
+    if not digest or is_document(path):
+        return download_url
+    return f"{DOWNLOADS_PREFIX}v/{digest}/{quote(path.relative_to(OUTPUT_ROOT).as_posix())}"
+
+def path_for_url(download_url: Optional[str]) -> Optional[Path]:
+    """Output path behind a /downloads URL (alias or versioned), or None."""
+    if not download_url or not download_url.startswith(DOWNLOADS_PREFIX):
+        return None
+    _, rel = split_version(download_url[len(DOWNLOADS_PREFIX):])
+    return resolve(rel)
+
+def is_document(path: Path) -> bool:
+    """HTML pages, whose relative links would break under a version prefix."""
+    return path.suffix.lower() in DOCUMENT_SUFFIXES
+
+def split_version(rel: str) -> Tuple[Optional[str], str]:
+    """"v/{digest}/{name}" -> (digest, name); a bare name -> (None, name)."""
+    versioned = _VERSIONED.fullmatch(rel)
+    return (versioned.group(1), versioned.group(2)) if versioned else (None, rel)
+
+def resolve(rel: str) -> Optional[Path]:
+    """Path under output/ for a relative name; None for escapes and hidden files (.store)."""
+    target = (OUTPUT_ROOT / rel).resolve()
+    if OUTPUT_ROOT not in target.parents or any(part.startswith(".") for part in Path(rel).parts):
+        return None
+    return target
+
+
+# =============================================================================
+# CONDITIONAL AND RANGE REQUESTS
+# =============================================================================
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def parse_range(header: Optional[str], size: int) -> Union[None, str, Tuple[int, int]]:
+    """
+    A single "bytes=" range as (start, end) inclusive, UNSATISFIABLE, or None
+    to send the whole body (no header, malformed, or several ranges).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return UNSATISFIABLE
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return UNSATISFIABLE
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def ranged_response(request: Request, size: int, read: Callable[[int, int], bytes],
+                    media_type: str, headers: dict, full: Callable[[], Response]) -> Response:
+    """206 for a satisfiable single range, 416 for an unsatisfiable one, else full()."""
+    byte_range = parse_range(request.headers.get("range"), size)
+    if_range = request.headers.get("if-range")
+    if byte_range is not None and if_range and if_range != headers.get("ETag"):
+        byte_range = None  # the client's partial copy is of another version
+    if byte_range == UNSATISFIABLE:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return full()
+    start, end = byte_range
+    return Response(content=read(start, end - start + 1), status_code=206, media_type=media_type,
+                    headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"})
+
+def read_file_range(path: Path) -> Callable[[int, int], bytes]:
+    def read(start: int, length: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(length)
+    return read
+
+def serve_tracked(request: Request, target: Path, digest: str, headers: dict) -> Response:
+    """The current version of a tracked output (held in memory or its blob), honouring Range."""
+    media_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+    held = OUTPUT_STORE.held_bytes(target)
+    if held is not None:
+        # Generated moments ago and not flushed to disk yet
+        return ranged_response(request, len(held), lambda start, length: held[start:start + length],
+                               media_type, headers, lambda: Response(content=held, media_type=media_type,
+                                                                     headers=headers))
+    blob = OUTPUT_STORE.blob_path(digest)
+    if not blob.is_file():
+        gone_or_missing(target)
+    OUTPUT_STORE.touch(target)
+    return ranged_response(request, blob.stat().st_size, read_file_range(blob), media_type, headers,
+                           lambda: FileResponse(blob, media_type=media_type, headers=headers))
+
+def gone_or_missing(target: Optional[Path]):
+    if target is not None and OUTPUT_STORE.status(target) in ("live", "evicted"):
+        raise HTTPException(status_code=410, detail="This version was replaced or removed from storage - "
+                                                    "request the asset again")
+    raise HTTPException(status_code=404, detail="Not found")
+
+
+# =============================================================================
+# ROUTES
+# =============================================================================
+
+@router.api_route("/v/{digest}/{file_path:path}", methods=["GET", "HEAD"])
+async def download_version(digest: str, file_path: str, request: Request):
+    """One immutable version of an output."""
+    target = resolve(file_path)
+    if not _DIGEST.fullmatch(digest) or target is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    if is_document(target):
+        return RedirectResponse(DOWNLOADS_PREFIX + quote(file_path), status_code=307,
+                                headers={"Cache-Control": REVALIDATE})
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Only the version the name currently points at is served
+    if OUTPUT_STORE.digest_of(target) != digest:
+        gone_or_missing(target)
+    return serve_tracked(request, target, digest, headers)
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"])
+async def download(file_path: str, request: Request):
+    """Stable alias: redirect to the current version, or serve a page or an untracked file."""
+    target = resolve(file_path)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    digest = OUTPUT_STORE.digest_of(target)
+    if digest and is_document(target):
+        etag = f'"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE, "Accept-Ranges": "bytes"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        return serve_tracked(request, target, digest, headers)
+    if digest:
+        return RedirectResponse(versioned_url(DOWNLOADS_PREFIX + file_path), status_code=307,
+                                headers={"Cache-Control": REVALIDATE})
+    if target.is_file():
+        media_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+        headers = {"Cache-Control": REVALIDATE, "Accept-Ranges": "bytes"}
+        return ranged_response(request, target.stat().st_size, read_file_range(target), media_type, headers,
+                               lambda: FileResponse(target, media_type=media_type, headers=headers))
+    gone_or_missing(target)
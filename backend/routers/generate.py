@@ -4,25 +4,69 @@ Routes requests to appropriate generation services based on parsed intent.
 """
 import os
 import sys
+import json
 import uuid
+import base64
 import asyncio
+import hashlib
+import mimetypes
 import traceback
 from pathlib import Path
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, List
 
 # Add project root to path
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
 
+from backend.routers.downloads import (IMMUTABLE, REVALIDATE, etag_matches, gone_or_missing, path_for_url,
+                                      resolve, split_version, versioned_url)
 from backend.services.parser import IntentParser, ParsedIntent
+from gemini_client import DeadlineExceeded, model_metrics, request_deadline
+from output_store import OUTPUT_STORE
+from request_grammar import BoonIntent, CardIntent, CtaIntent, GachaIntent, IconIntent
+from thumbnails import THUMB_MEDIA_TYPE, THUMB_SOURCES, THUMBNAILS
 
 router = APIRouter()
 
+# Time budget for one /generate request; model calls hedge and retry within it
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "120"))
+
 class GenerateRequest(BaseModel):
     message: str
+    # Gacha only: return the HTML right away and render the PNG on first download
+    lazy: bool = False
+    # Icon only: bypass the result cache and call the model again
+    regenerate: bool = False
+    # Icon only: reuse a cached icon with a near-duplicate name ("a red heart icon" -> "heart")
+    similar: bool = True
+    # Boon only: composite locally with Pillow instead of calling the model
+    local: bool = False
+    # Seconds the client is willing to wait (defaults to REQUEST_DEADLINE_S)
+    timeout: Optional[float] = None
+    # Embed the image in the response (base64) so no second /downloads fetch is needed.
+    # Sending "Accept: image/*" instead returns the image bytes as the response body.
+    inline: bool = False
+
+class InlineImage(BaseModel):
+    media_type: str
+    # Strong ETag (content SHA-256), the same one /downloads serves for this file
+    etag: str
+    size: int
+    data: str
+
+class GenerateItem(BaseModel):
+    # "success", "error" or "timeout"
+    status: str
+    asset_type: str
+    request: str
+    message: str
+    download_url: Optional[str] = None
+    details: Optional[dict] = None
+    image: Optional[InlineImage] = None
 
 class GenerateResponse(BaseModel):
     status: str
@@ -30,9 +74,12 @@ class GenerateResponse(BaseModel):
     message: str
     download_url: Optional[str] = None
     details: Optional[dict] = None
+    image: Optional[InlineImage] = None
+    # Multi-asset messages only: one entry per asset, in message order
+    items: Optional[List[GenerateItem]] = None
 
 @router.post("/generate", response_model=GenerateResponse)
-async def generate_asset(request: GenerateRequest):
+async def generate_asset(request: GenerateRequest, http_request: Request):
     """
     Generate a UI asset based on natural language input.
     Parses the message to determine asset type and parameters,
@@ -41,76 +88,227 @@ async def generate_asset(request: GenerateRequest):
     print(f"[API] Received request: {request.message}")
     
     parser = IntentParser()
-    intent = parser.parse(request.message)
+    intents = parser.parse_all(request.message)
+    if len(intents) > 1:
+        return await generate_many(intents, request)
+    intent = intents[0]
     print(f"[API] Parsed intent: {intent.asset_type} with params {intent.params}")
     
     try:
-        result = await run_generation(intent)
+        with request_deadline(request.timeout or REQUEST_DEADLINE_S):
+            result = await run_persisted(intent, request)
         print(f"[API] Generation successful: {result}")
+        
+        wants_bytes = http_request.headers.get("accept", "").startswith("image/")
+        image = inline_image(result.get("download_url")) if wants_bytes or request.inline else None
+        if image and wants_bytes:
+            data, media_type, etag = image
+            return Response(content=data, media_type=media_type, headers={
+                "ETag": etag,
+                "X-Asset-Type": intent.asset_type,
+                "X-Download-Url": result["download_url"],
+            })
         return GenerateResponse(
             status="success",
             asset_type=intent.asset_type,
             message=result["message"],
             download_url=result.get("download_url"),
-            details=result.get("details")
+            details=result.get("details"),
+            image=embed(image) if request.inline else None
         )
+    except DeadlineExceeded as e:
+        print(f"[API] Generation timed out: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"[API] Generation error: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-async def run_generation(intent: ParsedIntent) -> dict:
-    """Route to appropriate generation service based on intent."""
+async def generate_many(intents: List[ParsedIntent], request: GenerateRequest) -> GenerateResponse:
+    """
+    Run every asset of a multi-asset message concurrently under one deadline,
+    so the response takes about as long as the slowest asset. Each asset
+    reports its own status; the request fails only if none succeeded.
+    """
+    print(f"[API] Parsed {len(intents)} intents: " +
+          ", ".join(f"{i.asset_type} {i.params}" for i in intents))
+    
+    with request_deadline(request.timeout or REQUEST_DEADLINE_S):
+        results = await asyncio.gather(*[run_persisted(intent, request) for intent in intents],
+                                       return_exceptions=True)
+    
+    items = []
+    for intent, result in zip(intents, results):
+        if isinstance(result, BaseException):
+            status = "timeout" if isinstance(result, DeadlineExceeded) else "error"
+            print(f"[API] {intent.asset_type} failed ({status}): {result}")
+            items.append(GenerateItem(status=status, asset_type=intent.asset_type,
+                                      request=intent.raw_message, message=str(result)))
+        else:
+            items.append(GenerateItem(status="success", asset_type=intent.asset_type,
+                                      request=intent.raw_message, message=result["message"],
+                                      download_url=result.get("download_url"),
+                                      details=result.get("details"),
+                                      image=embed(inline_image(result.get("download_url"))) if request.inline else None))
+    
+    succeeded = [item for item in items if item.status == "success"]
+    if not succeeded:
+        timed_out = all(item.status == "timeout" for item in items)
+        detail = "; ".join(f"{item.asset_type}: {item.message}" for item in items)
+        raise HTTPException(status_code=504 if timed_out else 500, detail=detail)
+    
+    print(f"[API] Generated {len(succeeded)}/{len(items)} assets")
+    return GenerateResponse(
+        status="success" if len(succeeded) == len(items) else "partial",
+        asset_type="multi",
+        message=f"Generated {len(succeeded)} of {len(items)} assets",
+        download_url=succeeded[0].download_url,
+        items=items
+    )
+
+# Background flushes of held outputs (see run_persisted), awaited on shutdown
+_background_writes: set = set()
+
+async def run_persisted(intent: ParsedIntent, request: GenerateRequest) -> dict:
+    """
+    run_generation() with output files held in memory (OutputStore.deferred):
+    the response is built from memory and the files reach disk in the
+    background. /downloads serves held files until they are flushed.
+    Returned /downloads URLs are pinned to the version just generated.
+    """
+    with OUTPUT_STORE.deferred() as held:
+        try:
+            result = await run_generation(intent, lazy=request.lazy, regenerate=request.regenerate,
+                                          local=request.local, similar=request.similar)
+            return pin_versions(result)
+        finally:
+            persist_in_background(held)
+
+def pin_versions(result: dict) -> dict:
+    """Rewrite the /downloads URLs of a generation result to their immutable versioned form."""
+    result = dict(result, download_url=versioned_url(result["download_url"])) if result.get("download_url") else result
+    details = result.get("details")
+    if details:
+        details = dict(details)
+        for key in ("manifest_url", "html_url"):
+            if isinstance(details.get(key), str):
+                details[key] = versioned_url(details[key])
+        if isinstance(details.get("variants"), list):
+            details["variants"] = [versioned_url(url) for url in details["variants"]]
+        result["details"] = details
+    return result
+
+def persist_in_background(names: List[str]):
+    if not names:
+        return
+    task = asyncio.create_task(asyncio.to_thread(OUTPUT_STORE.flush, list(names)))
+    _background_writes.add(task)
+    
+    def done(task: asyncio.Task):
+        _background_writes.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"[API] Background write failed: {task.exception()}")
+    
+    task.add_done_callback(done)
+
+async def drain_background_writes():
+    """Wait for pending background writes (called on shutdown)."""
+    if _background_writes:
+        await asyncio.gather(*list(_background_writes), return_exceptions=True)
+
+def inline_image(download_url: Optional[str]):
+    """(bytes, media type, strong ETag) of a /downloads file, from memory when still held; else None."""
+    path = path_for_url(download_url)
+    if path is None:
+        return None
+    try:
+        data = OUTPUT_STORE.read_bytes(path)
+    except FileNotFoundError:
+        return None
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    digest = OUTPUT_STORE.digest_of(path) or hashlib.sha256(data).hexdigest()
+    return data, media_type, f'"{digest}"'
+
+def embed(image) -> Optional[InlineImage]:
+    if image is None:
+        return None
+    data, media_type, etag = image
+    return InlineImage(media_type=media_type, etag=etag, size=len(data),
+                       data=base64.b64encode(data).decode("ascii"))
+
+@router.get("/metrics/model")
+async def get_model_metrics():
+    """Hedge/retry rates and latency percentiles of remote model calls."""
+    return model_metrics()
+
+@router.get("/metrics/parser")
+async def get_parser_metrics():
+    """Size and hit rate of the IntentParser result cache."""
+    return IntentParser.cache_info()
+
+@router.get("/metrics/cache")
+async def get_cache_metrics():
+    """Size, hit/miss and eviction counts of the icon and thumbnail result caches."""
+    from generate_icon import ICON_CACHE
+    return {"icon": ICON_CACHE.stats(), "thumbnail": THUMBNAILS.cache.stats()}
+
+@router.get("/metrics/output")
+async def get_output_metrics():
+    """Disk use, dedupe and eviction counts of the managed output/ tree."""
+    return OUTPUT_STORE.stats()
+
+async def run_generation(intent: ParsedIntent, lazy: bool = False, regenerate: bool = False,
+                         local: bool = False, similar: bool = True) -> dict:
+    """Route to appropriate generation service based on intent (its typed request)."""
     
     if intent.asset_type == "icon":
-        return await generate_icon(intent.params)
+        return await generate_icon(intent.request, regenerate=regenerate, similar=similar)
     elif intent.asset_type == "cta":
-        return await generate_cta(intent.params)
+        return await generate_cta(intent.request)
     elif intent.asset_type == "card":
-        return await generate_card(intent.params)
+        return await generate_card(intent.request)
     elif intent.asset_type == "boon":
-        return await generate_boon(intent.params)
+        return await generate_boon(intent.request, local=local)
     elif intent.asset_type == "gacha":
-        return await generate_gacha(intent.params)
+        return await generate_gacha(intent.request, lazy=lazy)
     else:
         raise ValueError(f"Unknown asset type: {intent.asset_type}")
 
-async def generate_icon(params: dict) -> dict:
+async def generate_icon(request: IconIntent, regenerate: bool = False, similar: bool = True) -> dict:
     """Generate an icon using the icon script."""
-    from generate_icon import generate_icon as gen_icon
+    from generate_icon import generate_icon_async, output_path_for
     
-    name = params.get("name", "button")
+    name = request.name or "button"
     
-    # Run in thread pool to avoid blocking
-    loop = asyncio.get_event_loop()
-    result_path = await loop.run_in_executor(None, gen_icon, name)
+    # Native async model call - concurrency is bounded by gemini_client.model_slots()
+    result_path = await generate_icon_async(name, regenerate, similar=similar)
     
     if result_path:
         filename = Path(result_path).name
+        details = {"name": name}
+        # A near-duplicate cache hit comes back under the earlier icon's name
+        if filename != Path(output_path_for(name)).name:
+            details["reused"] = filename
         return {
             "message": f"Generated icon: {name}",
             "download_url": f"/downloads/icon/{filename}",
-            "details": {"name": name}
+            "details": details
         }
     else:
         raise Exception("Icon generation failed - no image returned")
 
-async def generate_cta(params: dict) -> dict:
+async def generate_cta(request: CtaIntent) -> dict:
     """Generate a CTA button using the CTA script."""
     from generate_cta import CTAGenerator
     
-    cta_type = params.get("type", "primary")
-    text = params.get("text", "BUTTON")
-    color = params.get("color")
+    cta_type = request.button_type
+    text = request.text or "BUTTON"
+    color = request.color
     
     api_key = os.getenv("GOOGLE_API_KEY")
     generator = CTAGenerator(api_key=api_key)
     
-    loop = asyncio.get_event_loop()
-    result_path = await loop.run_in_executor(
-        None, 
-        lambda: generator.generate(button_type=cta_type, text=text, color=color)
-    )
+    result_path = await generator.generate_async(button_type=cta_type, text=text, color=color)
     
     if result_path:
         filename = Path(result_path).name
@@ -122,76 +320,88 @@ async def generate_cta(params: dict) -> dict:
     else:
         raise Exception("CTA generation failed")
 
-async def generate_card(params: dict) -> dict:
+async def generate_card(request: CardIntent) -> dict:
     """Generate a card using the card script."""
     from generate_card import SorceryCardGenerator
     
-    character = params.get("character", "")
-    rarity = params.get("rarity", "3star")
-    calling = params.get("calling", "Cunning")
-    
-    if not character:
-        raise ValueError("Character name is required for card generation")
-    if not calling:
-        raise ValueError("Calling type is required for card generation")
-    
     generator = SorceryCardGenerator()
     
-    loop = asyncio.get_event_loop()
-    result_path = await loop.run_in_executor(
-        None,
-        lambda: generator.generate(character=character, rarity=rarity, calling=calling)
-    )
+    # Resolved up front so the response can list the candidates when the name is ambiguous
+    resolution = None
+    if request.character:
+        resolution = await asyncio.to_thread(generator.resolver.resolve_character, request.character)
+    # to_thread (not run_in_executor) so the thread sees the deadline and OutputStore.deferred()
+    result_path = await asyncio.to_thread(generator.generate_intent, request, resolution)
     
     if result_path:
         filename = Path(result_path).name
+        message = f"Generated {request.rarity} card for {request.character} ({request.calling})"
+        if resolution.ambiguous:
+            others = ", ".join(c.path.stem for c in resolution.candidates[1:])
+            message += f" - '{request.character}' is ambiguous, used {resolution.match.path.stem} (also: {others})"
         return {
-            "message": f"Generated {rarity} card for {character} ({calling})",
+            "message": message,
             "download_url": f"/downloads/card/{filename}",
-            "details": {"character": character, "rarity": rarity, "calling": calling}
+            "details": {**request.params(), "character_match": resolution.details()}
         }
     else:
         raise Exception("Card generation failed")
 
-async def generate_boon(params: dict) -> dict:
+async def generate_boon(request: BoonIntent, local: bool = False) -> dict:
     """Generate a boon icon using the boon script."""
-    from generate_boon import generate_boon as gen_boon
+    from generate_boon import generate_boon_async, variants_dir_for
     
-    boon = params.get("boon", "fire")
-    subicon = params.get("subicon", "up")
+    boon = request.boon
+    subicon = request.subicon
     
-    loop = asyncio.get_event_loop()
-    result_path = await loop.run_in_executor(None, gen_boon, boon, subicon, None)
+    result_path = await generate_boon_async(boon, subicon, mode="local" if local else None)
     
     if result_path:
         filename = Path(result_path).name
+        details = {"boon": boon, "subicon": subicon}
+        
+        # Individual sprites sliced from the variation sheet
+        variants_dir = Path(variants_dir_for(result_path))
+        manifest_path = variants_dir / "manifest.json"
+        if OUTPUT_STORE.exists(manifest_path):
+            manifest = json.loads(OUTPUT_STORE.read_bytes(manifest_path))
+            base_url = f"/downloads/boon/{variants_dir.name}"
+            details["variants"] = [f"{base_url}/{v['file']}" for v in manifest["variants"]]
+            details["manifest_url"] = f"{base_url}/manifest.json"
+        
         return {
             "message": f"Generated {boon} boon with {subicon} modifier",
             "download_url": f"/downloads/boon/{filename}",
-            "details": {"boon": boon, "subicon": subicon}
+            "details": details
         }
     else:
         raise Exception("Boon generation failed")
 
-async def generate_gacha(params: dict) -> dict:
+async def generate_gacha(request: GachaIntent, lazy: bool = False) -> dict:
     """Generate a gacha screen using the gacha script."""
     from generate_gacha import UnifiedGachaGenerator
     
-    pull = params.get("pull", "1 5star primal, 9 3star sorcery")
-    
     generator = UnifiedGachaGenerator()
     
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        None,
-        lambda: generator.generate(pull_spec=pull)
-    )
+    # The pull was parsed once by IntentParser; the generator takes the counts as-is
+    result = await asyncio.to_thread(generator.generate, intent=request, render_png=not lazy)
     
+    params = {**request.params(), "cards": request.counts()}
     if result:
-        if result.get('png'):
+        output_root = PROJECT_ROOT / "output"
+        if result.get('png_pending'):
+            # Lazy mode - the PNG is rendered by /gacha/render on first fetch
+            rel_png = result['png_pending'].relative_to(output_root / "gacha")
+            rel_html = result['html'].relative_to(output_root)
+            return {
+                "message": "Generated gacha screen (PNG renders on first download)",
+                "download_url": f"/api/gacha/render/{rel_png.as_posix()}",
+                "details": {**params, "html_url": f"/downloads/{rel_html.as_posix()}"}
+            }
+        elif result.get('png'):
             # Return PNG if available
             png_path = result['png']
-            rel_path = png_path.relative_to(PROJECT_ROOT / "output")
+            rel_path = png_path.relative_to(output_root)
             return {
                 "message": "Generated gacha screen",
                 "download_url": f"/downloads/{rel_path}",
@@ -200,7 +410,7 @@ async def generate_gacha(params: dict) -> dict:
         elif result.get('html'):
             # Fall back to HTML if PNG failed
             html_path = result['html']
-            rel_path = html_path.relative_to(PROJECT_ROOT / "output")
+            rel_path = html_path.relative_to(output_root)
             return {
                 "message": "Generated gacha screen (HTML only - PNG rendering unavailable)",
                 "download_url": f"/downloads/{rel_path}",
@@ -209,6 +419,81 @@ async def generate_gacha(params: dict) -> dict:
     
     raise Exception("Gacha generation failed")
 
+# In-flight lazy renders, keyed by PNG path - concurrent first fetches share one render
+_pending_renders: Dict[Path, asyncio.Future] = {}
+
+async def materialize_gacha_png(png_path: Path) -> Optional[Path]:
+    """Render a deferred gacha PNG once, coalescing concurrent requests."""
+    if png_path.exists():
+        return png_path
+    
+    pending = _pending_renders.get(png_path)
+    if pending is None:
+        from generate_gacha import UnifiedGachaGenerator
+        
+        generator = UnifiedGachaGenerator()
+        # A task around to_thread, so the render sees the caller's deadline and OutputStore.deferred()
+        pending = asyncio.ensure_future(asyncio.to_thread(generator.materialize_png, png_path.with_suffix(".html")))
+        _pending_renders[png_path] = pending
+        pending.add_done_callback(lambda _: _pending_renders.pop(png_path, None))
+    
+    # Shield so one client disconnecting doesn't cancel the render for the others
+    return await asyncio.shield(pending)
+
+@router.get("/gacha/render/{png_path:path}")
+async def render_gacha_png(png_path: str):
+    """Serve a lazily generated gacha PNG, rendering it on the first fetch."""
+    gacha_root = (PROJECT_ROOT / "output" / "gacha").resolve()
+    target = (gacha_root / png_path).resolve()
+    if gacha_root not in target.parents or target.suffix.lower() != ".png":
+        raise HTTPException(status_code=404, detail="Not found")
+    if not OUTPUT_STORE.exists(target.with_suffix(".html")) and not target.exists():
+        if OUTPUT_STORE.status(target.with_suffix(".html")) == "evicted":
+            raise HTTPException(status_code=410, detail="This gacha screen was removed from storage - generate it again")
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    try:
+        result = await materialize_gacha_png(target)
+    except Exception as e:
+        print(f"[API] Gacha render error: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not result:
+        raise HTTPException(status_code=503, detail="Gacha PNG rendering unavailable")
+    return FileResponse(result, media_type="image/png")
+
+@router.get("/thumb/{file_path:path}")
+async def get_thumbnail(file_path: str, request: Request, w: int = Query(384, ge=1, le=4096)):
+    """
+    WebP preview of an output image, w snapped to an allowed width. Versioned
+    paths (v/{digest}/{name}, as in /downloads) are cached as immutable;
+    deferred gacha PNGs are rendered first.
+    """
+    version, rel = split_version(file_path)
+    target = resolve(rel)
+    if target is None or target.suffix.lower() not in THUMB_SOURCES:
+        raise HTTPException(status_code=404, detail="Not found")
+    if version and OUTPUT_STORE.digest_of(target) != version:
+        gone_or_missing(target)
+    
+    gacha_root = (PROJECT_ROOT / "output" / "gacha").resolve()
+    if gacha_root in target.parents and not OUTPUT_STORE.exists(target) and OUTPUT_STORE.exists(target.with_suffix(".html")):
+        if not await materialize_gacha_png(target):
+            raise HTTPException(status_code=503, detail="Gacha PNG rendering unavailable")
+    
+    try:
+        # The ETag comes from the source digest and width, so revalidation never renders
+        etag = await asyncio.to_thread(THUMBNAILS.etag, target, w)
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE if version else REVALIDATE}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        preview, etag = await asyncio.to_thread(THUMBNAILS.get, target, w)
+    except FileNotFoundError:
+        gone_or_missing(target)
+    headers["ETag"] = etag
+    return FileResponse(preview, media_type=THUMB_MEDIA_TYPE, headers=headers)
+
 @router.get("/health")
 async def health():
     return {"status": "ok"}
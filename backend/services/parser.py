@@ -1,10 +1,20 @@
 """
 Intent Parser - Consolidates all droid parsing logic into one service.
 Parses natural language requests into structured generation commands.
+
+Field extraction for cards, gacha pulls and CTAs lives in the shared
+request_grammar module (scripts/), which the generators use too.
 """
-from dataclasses import dataclass, field
-from typing import Optional, Literal
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Dict, FrozenSet, Iterable, List, Optional, Literal, Tuple
+import os
 import re
+import threading
+
+from request_grammar import (
+    BoonIntent, CALLINGS, IconIntent, Intent, parse_card, parse_cta, parse_gacha,
+)
 
 AssetType = Literal["icon", "cta", "card", "boon", "gacha"]
 
@@ -14,6 +24,98 @@ class ParsedIntent:
     params: dict = field(default_factory=dict)
     confidence: float = 0.5
     raw_message: str = ""
+    # Typed form of params, passed straight to the generators
+    request: Optional[Intent] = None
+
+
+class KeywordMatches:
+    """Everything KeywordMatcher found in one message."""
+    
+    __slots__ = ("keywords", "mask", "_matcher")
+    
+    def __init__(self, keywords: FrozenSet[str], mask: int, matcher: "KeywordMatcher"):
+        self.keywords = keywords
+        self.mask = mask
+        self._matcher = matcher
+    
+    def any(self, table: str) -> bool:
+        """True if any keyword of `table` occurs in the text."""
+        return bool(self.mask & self._matcher.bits[table])
+    
+    def hits(self, table: str) -> Tuple[str, ...]:
+        """Keywords of `table` that occur in the text, in table order."""
+        if not self.any(table):
+            return ()
+        return tuple(kw for kw in self._matcher.tables[table] if kw in self.keywords)
+    
+    def first(self, table: str) -> Optional[str]:
+        hits = self.hits(table)
+        return hits[0] if hits else None
+
+
+class KeywordMatcher:
+    """
+    Compiles named keyword tables into one regex so a single pass over the
+    text finds every keyword of every table.
+    
+    Matching keeps plain substring semantics (`keyword in text`), so "up"
+    still matches inside "cup". The regex is a lookahead over a prefix trie:
+    at each position it reports the longest keyword starting there, and the
+    shorter keywords that are prefixes of it come from a precomputed closure;
+    keywords starting elsewhere are found at their own positions. Table
+    membership is a bitmask per keyword, so a table check is one AND.
+    """
+    
+    def __init__(self, tables: Dict[str, Iterable[str]]):
+        self.tables = {name: tuple(keywords) for name, keywords in tables.items()}
+        self.bits = {name: 1 << i for i, name in enumerate(self.tables)}
+        own_mask: Dict[str, int] = {}
+        for name, keywords in self.tables.items():
+            for keyword in keywords:
+                own_mask[keyword] = own_mask.get(keyword, 0) | self.bits[name]
+        keywords = sorted(own_mask)
+        # longest keyword at a position -> (keywords that are prefixes of it, their combined tables)
+        self._closure: Dict[str, Tuple[FrozenSet[str], int]] = {}
+        for keyword in keywords:
+            prefixes = frozenset(p for p in keywords if keyword.startswith(p))
+            mask = 0
+            for prefix in prefixes:
+                mask |= own_mask[prefix]
+            self._closure[keyword] = (prefixes, mask)
+        self._regex = re.compile(f"(?=({self._trie_pattern(keywords)}))")
+    
+    @staticmethod
+    def _trie_pattern(keywords: List[str]) -> str:
+        """Alternation shaped like a trie, greedy so the longest keyword wins at each position."""
+        trie: dict = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        
+        def build(node: dict) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            return f"(?:{body})?" if "" in node else body
+        
+        return build(trie)
+    
+    def scan(self, text: str) -> KeywordMatches:
+        """Match every table against `text` (already lowercased) in one pass."""
+        found = self._regex.findall(text)
+        if not found:
+            return KeywordMatches(frozenset(), 0, self)
+        keywords = set()
+        mask = 0
+        for longest in set(found):
+            prefixes, prefix_mask = self._closure[longest]
+            keywords |= prefixes
+            mask |= prefix_mask
+        return KeywordMatches(frozenset(keywords), mask, self)
+
 
 class IntentParser:
     """Parses natural language into generation commands."""
@@ -44,185 +146,247 @@ class IntentParser:
     SECONDARY_CTA = ["secondary", "cancel", "gray", "grey", "dark", "back", "dismiss", "simple", "exit", "close", "no", "skip"]
     
     # Card callings from card-generator
-    CALLINGS = ["cunning", "might", "wisdom", "spirit", "shadow"]
+    CALLINGS = [c.lower() for c in CALLINGS]
     RARITIES = ["3star", "3 star", "4star", "4 star", "5star", "5 star"]
     
+    ICON_STOP_WORDS = frozenset(["icon", "ui", "game", "create", "make", "generate", "give", "me", "a", "an", "the", "please", "for"])
+    
+    # Every table above, compiled once into a single-pass matcher
+    MATCHER = KeywordMatcher({
+        "gacha": GACHA_TRIGGERS,
+        "card": CARD_TRIGGERS,
+        "cta": CTA_TRIGGERS,
+        "boon": BOON_TRIGGERS,
+        "icon": ICON_TRIGGERS,
+        **{f"boon_type:{boon}": keywords for boon, keywords in BOON_TYPES.items()},
+        "boon_element": [kw for keywords in BOON_TYPES.values() for kw in keywords],
+        "boon_up": BOON_UP,
+        "boon_down": BOON_DOWN,
+        "primary_cta": PRIMARY_CTA,
+        "secondary_cta": SECONDARY_CTA,
+        "calling": CALLINGS,
+        "rarity": RARITIES,
+        "cta_words": ["button", "says"],
+    })
+    
+    # Clause boundaries in multi-asset messages ("fire boon up, ice boon down and a PLAY button")
+    CLAUSE_SEPARATOR = re.compile(r"\s*(?:[,;\n]|\b(?:and|then|also)\b)\s*", re.IGNORECASE)
+    # Quoted button text is never split ("says 'PLAY, NOW'"); a single quote must not be an apostrophe
+    QUOTED = re.compile(r"\"[^\"]*\"|(?<!\w)'[^']*'(?!\w)")
+    ASSET_TABLES = ("gacha", "card", "cta", "boon", "icon")
+    
+    # LRU of parse results keyed on the whitespace-normalized message, shared by
+    # all parsers (the router makes one per request). 0 disables it.
+    CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "1024"))
+    _cache: "OrderedDict[str, ParsedIntent]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_hits = 0
+    _cache_misses = 0
+    
     def parse(self, message: str) -> ParsedIntent:
         """Parse a natural language message into a structured intent."""
+        # The chat UI resends the same requests with stray whitespace; case is kept
+        # because CTA text and CAPS detection depend on it
+        key = " ".join(message.split())
+        cls = IntentParser
+        with cls._cache_lock:
+            cached = cls._cache.get(key)
+            if cached is not None:
+                cls._cache.move_to_end(key)
+                cls._cache_hits += 1
+            else:
+                cls._cache_misses += 1
+        
+        if cached is None:
+            cached = self._parse(key)
+            if cls.CACHE_SIZE > 0:
+                with cls._cache_lock:
+                    cls._cache[key] = cached
+                    while len(cls._cache) > cls.CACHE_SIZE:
+                        cls._cache.popitem(last=False)
+        
+        # Callers get their own params dict; typed requests are frozen and shared
+        return ParsedIntent(cached.asset_type, dict(cached.params), cached.confidence, message, cached.request)
+    
+    @classmethod
+    def cache_info(cls) -> dict:
+        with cls._cache_lock:
+            lookups = cls._cache_hits + cls._cache_misses
+            return {
+                "size": len(cls._cache),
+                "capacity": cls.CACHE_SIZE,
+                "hits": cls._cache_hits,
+                "misses": cls._cache_misses,
+                "hit_rate": round(cls._cache_hits / lookups, 4) if lookups else None,
+            }
+    
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+            cls._cache_hits = 0
+            cls._cache_misses = 0
+    
+    def _parse(self, message: str) -> ParsedIntent:
         message_lower = message.lower()
+        matches = self.MATCHER.scan(message_lower)
         
         # Detect asset type (order matters - more specific patterns first)
-        if self._matches(message_lower, self.GACHA_TRIGGERS):
+        if matches.any("gacha"):
             return self._parse_gacha(message)
-        elif self._matches(message_lower, self.CARD_TRIGGERS) or self._has_card_indicators(message_lower):
-            return self._parse_card(message)
-        elif self._matches(message_lower, self.BOON_TRIGGERS) or self._has_boon_indicators(message_lower):
-            return self._parse_boon(message)
-        elif self._matches(message_lower, self.CTA_TRIGGERS) or self._has_cta_indicators(message_lower):
-            return self._parse_cta(message)
+        elif matches.any("card") or self._has_card_indicators(matches):
+            return self._parse_card(message, matches)
+        elif matches.any("boon") or self._has_boon_indicators(matches):
+            return self._parse_boon(message, matches)
+        elif matches.any("cta") or self._has_cta_indicators(message_lower, matches):
+            return self._parse_cta(message, matches)
         else:
             # Default to icon for simple object requests
             return self._parse_icon(message)
     
-    def _matches(self, text: str, triggers: list) -> bool:
-        """Check if text contains any trigger phrases."""
-        return any(trigger in text for trigger in triggers)
+    def parse_all(self, message: str) -> List[ParsedIntent]:
+        """
+        Parse a message that may ask for several assets into one intent per asset.
+        
+        The message is split into clauses on commas, semicolons, "and", "then"
+        and "also" outside quotes. A clause that names no asset type of its own
+        ("5 star", "in red", "pepper" in "salt and pepper icon") stays attached
+        to its neighbour, so a single-asset message parses exactly as parse()
+        does. Gacha requests are never split - their pull specs are comma lists.
+        """
+        if self.MATCHER.scan(message.lower()).any("gacha"):
+            return [self.parse(message)]
+        
+        # [start, end, names_asset] per group of clauses
+        groups: List[list] = []
+        for start, end in self._clauses(message):
+            clause = message[start:end]
+            names_asset = self._names_asset(clause.lower(), self.MATCHER.scan(clause.lower()))
+            if groups and not (names_asset and groups[-1][2]):
+                # Weak clause joins the previous group; a weak leading group joins this one
+                groups[-1][1] = end
+                groups[-1][2] = groups[-1][2] or names_asset
+            else:
+                groups.append([start, end, names_asset])
+        
+        if len(groups) <= 1:
+            return [self.parse(message)]
+        return [self.parse(message[start:end].strip()) for start, end, _ in groups]
+    
+    def _clauses(self, message: str) -> List[Tuple[int, int]]:
+        """(start, end) of each non-empty clause, splitting outside quoted text."""
+        quoted = [match.span() for match in self.QUOTED.finditer(message)]
+        spans = []
+        start = 0
+        for match in self.CLAUSE_SEPARATOR.finditer(message):
+            if any(q_start <= match.start() < q_end for q_start, q_end in quoted):
+                continue
+            if message[start:match.start()].strip():
+                spans.append((start, match.start()))
+            start = match.end()
+        if message[start:].strip():
+            spans.append((start, len(message)))
+        return spans
     
-    def _has_card_indicators(self, text: str) -> bool:
+    def _names_asset(self, text: str, matches: KeywordMatches) -> bool:
+        """True if the text asks for an asset type on its own (trigger word or indicators)."""
+        return (any(matches.any(table) for table in self.ASSET_TABLES)
+                or self._has_card_indicators(matches)
+                or self._has_boon_indicators(matches)
+                or self._has_cta_indicators(text, matches))
+    
+    def _has_card_indicators(self, matches: KeywordMatches) -> bool:
         """Check for card-specific patterns."""
-        has_rarity = any(r in text for r in self.RARITIES)
-        has_calling = any(c in text for c in self.CALLINGS)
-        return has_rarity and has_calling
+        return matches.any("rarity") and matches.any("calling")
     
-    def _has_boon_indicators(self, text: str) -> bool:
+    def _has_boon_indicators(self, matches: KeywordMatches) -> bool:
         """Check for boon-specific patterns (element + modifier)."""
-        has_element = any(any(kw in text for kw in keywords) for keywords in self.BOON_TYPES.values())
-        has_modifier = any(m in text for m in self.BOON_UP + self.BOON_DOWN)
-        return has_element and has_modifier
+        has_modifier = matches.any("boon_up") or matches.any("boon_down")
+        return matches.any("boon_element") and has_modifier
     
-    def _has_cta_indicators(self, text: str) -> bool:
+    def _has_cta_indicators(self, text: str, matches: KeywordMatches) -> bool:
         """Check for button/CTA patterns."""
-        return "button" in text or ("says" in text and any(word.isupper() for word in text.split()))
+        return "button" in matches.keywords or (
+            "says" in matches.keywords and any(word.isupper() for word in text.split()))
     
     def _parse_icon(self, message: str) -> ParsedIntent:
         """Parse icon generation request."""
         # Extract the icon subject - remove common words
-        words_to_remove = ["icon", "ui", "game", "create", "make", "generate", "give", "me", "a", "an", "the", "please", "for"]
         words = message.lower().split()
-        subject_words = [w for w in words if w not in words_to_remove]
+        subject_words = [w for w in words if w not in self.ICON_STOP_WORDS]
         
         # Join remaining words as the icon name
         icon_name = " ".join(subject_words).strip()
         if not icon_name:
             icon_name = "button"
         
+        request = IconIntent(name=icon_name)
         return ParsedIntent(
             asset_type="icon",
-            params={"name": icon_name},
+            params=request.params(),
             confidence=0.8,
-            raw_message=message
+            raw_message=message,
+            request=request
         )
     
-    def _parse_cta(self, message: str) -> ParsedIntent:
+    def _parse_cta(self, message: str, matches: KeywordMatches) -> ParsedIntent:
         """Parse CTA button request."""
-        message_lower = message.lower()
-        
-        # Determine button type
-        cta_type = "primary"
-        if any(kw in message_lower for kw in self.SECONDARY_CTA):
-            cta_type = "secondary"
-        
-        # Extract text - look for quoted text first
-        text = None
-        quoted = re.search(r'["\']([^"\']+)["\']', message)
-        if quoted:
-            text = quoted.group(1).upper()
-        else:
-            # Look for text after keywords
-            patterns = [
-                r'says?\s+(\w+(?:\s+\w+)?)',
-                r'labeled?\s+(\w+(?:\s+\w+)?)',
-                r'with\s+text\s+(\w+(?:\s+\w+)?)',
-                r':\s*(\w+(?:\s+\w+)?)\s*$'
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, message, re.IGNORECASE)
-                if match:
-                    text = match.group(1).upper()
-                    break
-        
-        if not text:
-            # Try to extract any capitalized words as button text
-            caps = re.findall(r'\b([A-Z]{2,}(?:\s+[A-Z]{2,})?)\b', message)
-            if caps:
-                text = caps[0]
-            else:
-                text = "BUTTON"
-        
-        # Extract color if specified
-        color = None
-        color_match = re.search(r'(?:in|with|using)\s+(\w+)\s*(?:color|theme)?', message_lower)
-        if color_match:
-            potential_color = color_match.group(1)
-            if potential_color not in ["text", "a", "the"]:
-                color = potential_color
+        # Determine button type; text and color come from the shared grammar
+        cta_type = "secondary" if matches.any("secondary_cta") else "primary"
+        request = parse_cta(message, cta_type)
         
         return ParsedIntent(
             asset_type="cta",
-            params={"type": cta_type, "text": text, "color": color},
+            params=request.params(),
             confidence=0.9,
-            raw_message=message
+            raw_message=message,
+            request=request
         )
     
-    def _parse_card(self, message: str) -> ParsedIntent:
+    def _parse_card(self, message: str, matches: KeywordMatches) -> ParsedIntent:
         """Parse card generation request."""
-        message_lower = message.lower()
-        
-        # Extract rarity
-        rarity = "3star"
-        for r in ["5star", "5 star", "5-star"]:
-            if r in message_lower:
-                rarity = "5star"
-                break
-        for r in ["4star", "4 star", "4-star"]:
-            if r in message_lower:
-                rarity = "4star"
-                break
-        
-        # Extract calling
-        calling = None
-        for c in self.CALLINGS:
-            if c in message_lower:
-                calling = c.capitalize()
-                break
-        
-        # Extract character name - remove known keywords
-        words_to_remove = ["card", "sorcery", "primal", "create", "make", "generate", "give", "me", "a", "an", 
-                          "the", "for", "with", "calling", "star", "3star", "4star", "5star", "3", "4", "5"] + self.CALLINGS
-        words = message_lower.split()
-        char_words = [w for w in words if w not in words_to_remove and not w.isdigit()]
-        character = " ".join(char_words).strip().title()
+        request = parse_card(message)
+        if request.rarity is None:
+            request = replace(request, rarity="3star")
         
         return ParsedIntent(
             asset_type="card",
-            params={"character": character, "rarity": rarity, "calling": calling},
+            params=request.params(),
             confidence=0.85,
-            raw_message=message
+            raw_message=message,
+            request=request
         )
     
-    def _parse_boon(self, message: str) -> ParsedIntent:
+    def _parse_boon(self, message: str, matches: KeywordMatches) -> ParsedIntent:
         """Parse boon icon request."""
-        message_lower = message.lower()
-        
-        # Detect boon type
-        boon_type = None
-        for boon, keywords in self.BOON_TYPES.items():
-            if any(kw in message_lower for kw in keywords):
-                boon_type = boon
-                break
+        # Detect boon type (first in BOON_TYPES order)
+        boon_type = next((boon for boon in self.BOON_TYPES if matches.any(f"boon_type:{boon}")), None)
         
         if not boon_type:
             boon_type = "fire"  # default
         
         # Detect modifier direction
         subicon = "up"  # default to buff
-        if any(m in message_lower for m in self.BOON_DOWN):
+        if matches.any("boon_down"):
             subicon = "down"
         
+        request = BoonIntent(boon=boon_type, subicon=subicon)
         return ParsedIntent(
             asset_type="boon",
-            params={"boon": boon_type, "subicon": subicon},
+            params=request.params(),
             confidence=0.9,
-            raw_message=message
+            raw_message=message,
+            request=request
         )
     
     def _parse_gacha(self, message: str) -> ParsedIntent:
         """Parse gacha pull screen request."""
-        # Pass the full message to the gacha script's parser which handles all variations
-        # e.g. "1 5star primal, 1 4star primal, 8 3star sorcery"
+        # Card counts are parsed once here, e.g. "1 5star primal, 1 4star primal, 8 3star sorcery"
+        request = parse_gacha(message)
         return ParsedIntent(
             asset_type="gacha",
-            params={"pull": message},
+            params=request.params(),
             confidence=0.85,
-            raw_message=message
+            raw_message=message,
+            request=request
         )
@@ -0,0 +1,122 @@
+"""
+Parser Benchmark
+================
+Replays a recorded corpus of chat messages through IntentParser and reports
+parse throughput (with and without the parse cache), the cache hit rate on
+the replay, and any classification changes against a stored baseline, so a
+parser optimization can be checked for speed and behaviour in one run.
+
+    python benchmarks/parser_benchmark.py                   # compare with baseline
+    python benchmarks/parser_benchmark.py --save-baseline   # record a new baseline
+
+The corpus (parser_corpus.jsonl) holds one {"message": ...} per line, kept
+verbatim including the stray whitespace the chat UI sends. The baseline
+(parser_baseline.json) maps each message to its asset type and params.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+from backend.services.parser import IntentParser
+
+BENCH_DIR = Path(__file__).resolve().parent
+CORPUS_PATH = BENCH_DIR / "parser_corpus.jsonl"
+BASELINE_PATH = BENCH_DIR / "parser_baseline.json"
+
+
+def load_corpus(path):
+    return [json.loads(line)["message"] for line in Path(path).read_text().splitlines() if line.strip()]
+
+
+def classify(parser, message):
+    intent = parser.parse(message)
+    return {"asset_type": intent.asset_type, "params": intent.params}
+
+
+def measure(messages, rounds, cache_size):
+    """
+    Best-of-`rounds` parses/sec over the whole corpus. Each round replays the
+    corpus in order from an empty cache, so hits come only from repeats within
+    it, as they would in a live session. Returns (rate, cache_info).
+    """
+    parser = IntentParser()
+    saved_size = IntentParser.CACHE_SIZE
+    IntentParser.CACHE_SIZE = cache_size
+    best = float("inf")
+    try:
+        for _ in range(rounds):
+            IntentParser.clear_cache()
+            started = time.perf_counter()
+            for message in messages:
+                parser.parse(message)
+            best = min(best, time.perf_counter() - started)
+        return len(messages) / best, IntentParser.cache_info()
+    finally:
+        IntentParser.CACHE_SIZE = saved_size
+        IntentParser.clear_cache()
+
+
+def diff_against(baseline, results):
+    changes = []
+    for message, result in results.items():
+        expected = baseline.get(message)
+        if expected is not None and expected != result:
+            changes.append({"message": message, "baseline": expected, "now": result})
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IntentParser throughput and regression benchmark")
+    parser.add_argument("--corpus", default=str(CORPUS_PATH))
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--rounds", type=int, default=20, help="Timed passes over the corpus (best is reported)")
+    parser.add_argument("--cache-size", type=int, default=IntentParser.CACHE_SIZE,
+                        help="Parse cache capacity for the cached run")
+    parser.add_argument("--save-baseline", action="store_true", help="Record current classifications as the baseline")
+    args = parser.parse_args()
+
+    messages = load_corpus(args.corpus)
+    intent_parser = IntentParser()
+    IntentParser.clear_cache()
+    results = {message: classify(intent_parser, message) for message in messages}
+    # A cache hit must classify exactly like a fresh parse
+    cached = {message: classify(intent_parser, message) for message in messages}
+    stale = [message for message in results if cached[message] != results[message]]
+
+    uncached_rate, _ = measure(messages, args.rounds, cache_size=0)
+    cached_rate, cache = measure(messages, args.rounds, cache_size=args.cache_size)
+    print(f"{len(messages)} messages ({len(results)} distinct): "
+          f"{uncached_rate:,.0f} parses/sec uncached, {cached_rate:,.0f} parses/sec cached")
+    print(f"Cache (capacity {cache['capacity']}): {cache['hits']} hits / {cache['misses']} misses "
+          f"per replay, hit rate {cache['hit_rate']:.1%}")
+
+    if stale:
+        print(f"{len(stale)} messages classify differently from the cache:")
+        for message in stale[:20]:
+            print(f"  {message!r}\n    fresh  {results[message]}\n    cached {cached[message]}")
+        sys.exit(1)
+
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=1, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    baseline_path = Path(args.baseline)
+    if not baseline_path.exists():
+        print("No baseline recorded (run with --save-baseline)")
+        sys.exit(0)
+
+    changes = diff_against(json.loads(baseline_path.read_text()), results)
+    if changes:
+        print(f"{len(changes)} classification changes against {baseline_path.name}:")
+        for change in changes[:20]:
+            print(f"  {change['message']!r}\n    was {change['baseline']}\n    now {change['now']}")
+        sys.exit(1)
+    print(f"Classifications identical to {baseline_path.name}")
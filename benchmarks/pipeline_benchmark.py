@@ -0,0 +1,182 @@
+"""
+Pipeline Benchmark
+==================
+End-to-end throughput of POST /api/generate against the fake Gemini backend:
+FastAPI -> run_generation -> generator scripts -> (fake) model, all on one
+machine, no network and no API cost.
+
+    python benchmarks/pipeline_benchmark.py --requests 200 --concurrency 32 \\
+        --latency "lognormal:2,0.5;tail=0.02@20" --error-rate 0.05
+
+--backend inproc uses the in-process FakeGeminiClient (GEMINI_BACKEND=fake);
+--backend http starts fake_gemini's HTTP server and drives the real SDK at it
+(GEMINI_BASE_URL), which also exercises request serialization and the
+connection pool. Generated files land in output/ as usual; the icon result
+cache is pointed at a temporary directory and icons are requested with
+regenerate=True so every request reaches the model.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+ICON_NAMES = ["heart", "sword", "shield", "crown", "star", "skull", "potion", "key", "gem", "scroll"]
+CTA_COLORS = ["red", "green", "purple", "gold"]
+
+
+def boon_names():
+    """Boon elements generate_boon can render ("outer_dark" -> "outer dark")."""
+    # Imported lazily: generate_boon reads the environment configure() sets up
+    from generate_boon import MAIN_BOONS
+
+    return [boon.replace("_", " ") for boon in MAIN_BOONS]
+
+
+MESSAGES = {
+    "icon": lambda rng: f"{rng.choice(ICON_NAMES)} icon",
+    "boon": lambda rng: f"{rng.choice(boon_names())} boon {rng.choice(['up', 'down'])}",
+    "cta": lambda rng: f"primary cta button saying PLAY in {rng.choice(CTA_COLORS)}",
+}
+
+
+def parse_mix(text):
+    """'icon=6,boon=2,cta=2' -> [("icon", 6), ...]"""
+    mix = []
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in MESSAGES:
+            raise SystemExit(f"Unknown asset kind in --mix: {kind}")
+        mix.append((kind.strip(), float(weight or 1)))
+    return mix
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def configure(args):
+    """Set up the environment before the backend (and its scripts) are imported."""
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ["ASSET_CACHE_DIR"] = tempfile.mkdtemp(prefix="pipeline-bench-cache-")
+    os.environ["CTA_RECOLOR_ENGINE"] = args.cta_engine
+    os.environ["FAKE_GEMINI_LATENCY"] = args.latency
+    os.environ["FAKE_GEMINI_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_GEMINI_ERROR_CODES"] = args.error_codes
+    os.environ["FAKE_GEMINI_SEED"] = str(args.seed)
+    if args.canned_dir:
+        os.environ["FAKE_GEMINI_CANNED_DIR"] = args.canned_dir
+
+    if args.backend == "http":
+        from fake_gemini import start_server
+
+        server, base_url = start_server()
+        os.environ["GEMINI_BASE_URL"] = base_url
+        return lambda: server.state.snapshot()
+
+    os.environ["GEMINI_BACKEND"] = "fake"
+    from gemini_client import get_client
+
+    return lambda: get_client(os.environ["GOOGLE_API_KEY"]).state.snapshot()
+
+
+async def run(args, fake_stats):
+    import httpx
+    from backend.main import app
+    from gemini_client import model_metrics
+
+    rng = random.Random(args.seed)
+    kinds, weights = zip(*parse_mix(args.mix))
+    plan = [rng.choices(kinds, weights)[0] for _ in range(args.requests)]
+    gate = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async def one(client, kind):
+        async with gate:
+            started = time.perf_counter()
+            response = await client.post("/api/generate", json={
+                "message": MESSAGES[kind](rng),
+                "regenerate": True,
+                "timeout": args.timeout,
+            })
+            results.append((kind, response.status_code, time.perf_counter() - started))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[one(client, kind) for kind in plan])
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, _, latency in results]
+    report = {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "backend": args.backend,
+        "fake_latency": args.latency,
+        "fake_error_rate": args.error_rate,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "latency_s": {name: round(percentile(latencies, q), 3)
+                      for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+        "status": dict(Counter(str(status) for _, status, _ in results)),
+        "by_kind": {
+            kind: {
+                "count": sum(1 for k, _, _ in results if k == kind),
+                "ok": sum(1 for k, s, _ in results if k == kind and s == 200),
+                "p50_s": round(percentile([l for k, _, l in results if k == kind], 0.5), 3),
+            }
+            for kind in kinds
+        },
+        "model": model_metrics(),
+        "fake": fake_stats(),
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /api/generate against the fake Gemini backend")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--backend", choices=["inproc", "http"], default="inproc")
+    parser.add_argument("--latency", default="lognormal:1,0.4",
+                        help="Fake model latency spec (see fake_gemini.parse_latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-codes", default="503,429")
+    parser.add_argument("--canned-dir", help="Answer with PNGs from this directory")
+    parser.add_argument("--mix", default="icon=6,boon=2,cta=2", help="Weighted asset mix")
+    parser.add_argument("--cta-engine", choices=["local", "model"], default="model",
+                        help="CTA recolor engine (model exercises the fake)")
+    parser.add_argument("--timeout", type=float, help="Per-request deadline in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only")
+    args = parser.parse_args()
+
+    fake_stats = configure(args)
+    report = asyncio.run(run(args, fake_stats))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("\n" + "=" * 60)
+        print(f"{report['requests']} requests, concurrency {report['concurrency']}, "
+              f"backend {report['backend']} ({report['fake_latency']}, errors {report['fake_error_rate']:.0%})")
+        print(f"  elapsed     {report['elapsed_s']}s  ->  {report['throughput_rps']} req/s")
+        print("  latency     " + "  ".join(f"{k}={v}s" for k, v in report["latency_s"].items()))
+        print(f"  status      {report['status']}")
+        for kind, row in report["by_kind"].items():
+            print(f"  {kind:<10}  {row}")
+        print(f"  model       {report['model']}")
+        print(f"  fake        {report['fake']}")
@@ -3,6 +3,19 @@ import imgUnGodlyLogo from '../assets/imgUnGodlyLogo.png';
 import imgGroup41 from '../assets/imgGroup41.png';
 import imgSend from '../assets/img.png';
 
+// Previews load a resized copy from /api/thumb; download links keep the full file
+const PREVIEW_WIDTH = 384;
+
+function thumbUrl(url, width = PREVIEW_WIDTH) {
+  if (url.startsWith('/downloads/')) {
+    return `/api/thumb/${url.slice('/downloads/'.length)}?w=${width}`;
+  }
+  if (url.startsWith('/api/gacha/render/')) {
+    return `/api/thumb/gacha/${url.slice('/api/gacha/render/'.length)}?w=${width}`;
+  }
+  return url;
+}
+
 export default function Chat() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
@@ -38,19 +51,24 @@ export default function Chat() {
         throw new Error(data.detail || 'Generation failed');
       }
 
-      setMessages(prev => [...prev, {
+      // Multi-asset messages come back with one item per asset
+      const results = data.items || [{ ...data, request: trimmed }];
+
+      setMessages(prev => [...prev, ...results.map(item => ({
         role: 'assistant',
-        text: data.message,
-        downloadUrl: data.download_url,
-        assetType: data.asset_type
-      }]);
+        text: item.status === 'success' || !data.items ? item.message : `Error (${item.request}): ${item.message}`,
+        downloadUrl: item.download_url,
+        assetType: item.asset_type,
+        isError: item.status !== 'success' && !!data.items
+      }))]);
 
-      if (data.download_url) {
-        setAssets(prev => [...prev, {
-          url: data.download_url,
-          type: data.asset_type,
-          prompt: trimmed
-        }]);
+      const downloads = results.filter(item => item.download_url);
+      if (downloads.length > 0) {
+        setAssets(prev => [...prev, ...downloads.map(item => ({
+          url: item.download_url,
+          type: item.asset_type,
+          prompt: item.request
+        }))]);
       }
     } catch (error) {
       setMessages(prev => [...prev, {
@@ -82,7 +100,7 @@ export default function Chat() {
                   {assets.map((asset, i) => (
                     <div key={i} className="border rounded-lg p-2 hover:shadow-md transition-shadow">
                       <div className="aspect-square bg-gray-50 rounded flex items-center justify-center mb-2 overflow-hidden">
-                        <img src={asset.url} alt="" className="max-w-full max-h-full object-contain" />
+                        <img src={thumbUrl(asset.url)} alt="" className="max-w-full max-h-full object-contain" />
                       </div>
                       <p className="text-xs text-gray-500 truncate">{asset.prompt}</p>
                       <a href={asset.url} download className="text-xs text-blue-600 hover:underline">Download</a>
@@ -146,7 +164,7 @@ export default function Chat() {
                     <div className="mt-3 space-y-3">
                       <div className="bg-white rounded-lg p-2 border">
                         <img 
-                          src={msg.downloadUrl} 
+                          src={thumbUrl(msg.downloadUrl)} 
                           alt={msg.assetType}
                           className="max-w-full max-h-48 mx-auto object-contain rounded"
                         />
@@ -0,0 +1,222 @@
+"""
+Asset Bundle
+============
+Reference assets, pre-decoded into one packed file of raw pixel buffers.
+
+Every worker otherwise decodes the same ~12 MB of PNG/JPEG under assets/
+and keeps its own decoded copy. The bundle is built once (at image build
+time) and mapped read-only: images are wrapped around the mapped pages with
+Image.frombuffer, so nothing is decoded and every process on the host
+shares the same page-cache pages.
+
+Layout: MAGIC, an 8-byte little-endian header length, a JSON header
+{"entries": {name: {offset, length, width, height, mode, mtime_ns, size}}},
+then each image's raw buffer at a page-aligned offset. Names are paths
+relative to assets/. Images with alpha are stored as RGBA; opaque ones as
+RGBX and handed out as RGB, like Image.open on a JPEG.
+
+Assets that are missing from the bundle, or changed since it was built, are
+decoded from disk as before, so a stale or absent bundle is never wrong.
+
+Usage:
+    python scripts/asset_bundle.py --build     # write build/assets.rgba
+    python scripts/asset_bundle.py --stats     # entries, stale assets, decode vs map time
+
+    from asset_bundle import open_asset
+    border = open_asset(ASSETS_DIR / "sorcerycardref/5star/SorceryCard_Front_Border_5star.png").convert("RGBA")
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ASSETS_DIR = BASE_DIR / "assets"
+BUNDLE_PATH = Path(os.getenv("ASSET_BUNDLE", BASE_DIR / "build" / "assets.rgba"))
+
+MAGIC = b"ASSETRGBA1\n"
+ALIGN = mmap.PAGESIZE
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def build_bundle(assets_dir=ASSETS_DIR, bundle_path=BUNDLE_PATH) -> Dict[str, Any]:
+    """Decode every image under `assets_dir` into a new bundle; returns the header."""
+    assets_dir, bundle_path = Path(assets_dir), Path(bundle_path)
+    buffers, entries = [], {}
+    for path in sorted(assets_dir.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        with Image.open(path) as image:
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            mode = "RGBA" if has_alpha else "RGBX"
+            raw = image.convert("RGBA" if has_alpha else "RGB").convert(mode).tobytes()
+            width, height = image.size
+        stat = path.stat()
+        name = path.relative_to(assets_dir).as_posix()
+        entries[name] = {"width": width, "height": height, "mode": mode, "length": len(raw),
+                         "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        buffers.append((name, raw))
+
+    # Offsets depend on the header size, which depends on the offsets: grow until it fits
+    header_room = 0
+    while True:
+        offset = _align(len(MAGIC) + 8 + header_room)
+        for name, raw in buffers:
+            entries[name]["offset"] = offset
+            offset = _align(offset + len(raw))
+        header = json.dumps({"entries": entries}, sort_keys=True).encode("utf-8")
+        if len(header) <= header_room:
+            break
+        header_room = len(header)
+
+    bundle_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = bundle_path.with_name(bundle_path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, raw in buffers:
+            f.seek(entries[name]["offset"])
+            f.write(raw)
+        f.truncate(offset)
+    # Running workers keep their mapping of the old file
+    tmp.replace(bundle_path)
+    return {"entries": entries}
+
+
+# =============================================================================
+# LOAD
+# =============================================================================
+
+class AssetBundle:
+    """Read-only mapping of a built bundle, opened on first use."""
+
+    def __init__(self, bundle_path=BUNDLE_PATH, assets_dir=ASSETS_DIR):
+        self.bundle_path = Path(bundle_path)
+        self.assets_dir = os.path.abspath(assets_dir)
+        self._lock = threading.Lock()
+        self._opened = False
+        self._map: Optional[mmap.mmap] = None
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.stale = []
+        self.mapped = 0
+        self.decoded = 0
+
+    def _open(self):
+        with self._lock:
+            if self._opened:
+                return
+            self._opened = True
+            try:
+                with open(self.bundle_path, "rb") as f:
+                    # The mapping stays valid after the file is closed (or replaced by a rebuild)
+                    bundle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return
+            if bundle[:len(MAGIC)] != MAGIC:
+                print(f"Ignoring asset bundle with unknown format: {self.bundle_path}")
+                return
+            (header_length,) = struct.unpack_from("<Q", bundle, len(MAGIC))
+            start = len(MAGIC) + 8
+            entries = json.loads(bundle[start:start + header_length])["entries"]
+
+            # Entries whose source changed since the build are decoded from disk instead
+            for name, entry in entries.items():
+                try:
+                    stat = os.stat(os.path.join(self.assets_dir, name))
+                except FileNotFoundError:
+                    continue
+                if (stat.st_mtime_ns, stat.st_size) == (entry["mtime_ns"], entry["size"]):
+                    self._entries[name] = entry
+                else:
+                    self.stale.append(name)
+            if self.stale:
+                print(f"Asset bundle is stale for {len(self.stale)} assets (rebuild with "
+                      f"scripts/asset_bundle.py --build): {', '.join(self.stale[:5])}")
+            self._map = bundle
+
+    def image(self, path) -> Optional[Image.Image]:
+        """The bundled image for an asset path, without decoding; None if not bundled."""
+        if not self._opened:
+            self._open()
+        name = os.path.relpath(os.path.abspath(path), self.assets_dir).replace(os.sep, "/")
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        offset, mode = entry["offset"], entry["mode"]
+        buffer = memoryview(self._map)[offset:offset + entry["length"]]
+        # Read-only view of the shared pages; PIL copies before any in-place edit
+        image = Image.frombuffer(mode, (entry["width"], entry["height"]), buffer, "raw", mode, 0, 1)
+        self.mapped += 1
+        return image.convert("RGB") if mode == "RGBX" else image
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._opened:
+            self._open()
+        return {
+            "path": str(self.bundle_path),
+            "loaded": self._map is not None,
+            "entries": len(self._entries),
+            "bytes": self._map.size() if self._map is not None else 0,
+            "stale": len(self.stale),
+            "mapped": self.mapped,
+            "decoded": self.decoded,
+        }
+
+
+ASSET_BUNDLE = AssetBundle()
+
+
+def open_asset(path) -> Image.Image:
+    """Image.open() for reference assets: served from the bundle when it has them."""
+    image = ASSET_BUNDLE.image(path)
+    if image is not None:
+        return image
+    ASSET_BUNDLE.decoded += 1
+    return Image.open(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect the packed reference asset bundle")
+    parser.add_argument("--build", action="store_true", help=f"Decode assets/ into {BUNDLE_PATH}")
+    parser.add_argument("--stats", action="store_true", help="Show bundle contents and decode vs map time")
+    args = parser.parse_args()
+
+    if args.build:
+        started = time.perf_counter()
+        entries = build_bundle()["entries"]
+        print(f"Bundled {len(entries)} assets into {BUNDLE_PATH} "
+              f"({BUNDLE_PATH.stat().st_size / 1024 / 1024:.1f} MB) in {time.perf_counter() - started:.1f}s")
+    elif args.stats:
+        stats = ASSET_BUNDLE.stats()
+        print(json.dumps(stats, indent=2))
+        if not stats["loaded"]:
+            sys.exit(1)
+        names = sorted(ASSET_BUNDLE._entries)
+        started = time.perf_counter()
+        for name in names:
+            with Image.open(ASSETS_DIR / name) as image:
+                image.load()
+        decode_s = time.perf_counter() - started
+        started = time.perf_counter()
+        for name in names:
+            ASSET_BUNDLE.image(ASSETS_DIR / name)
+        map_s = time.perf_counter() - started
+        print(f"{len(names)} assets: decode {decode_s * 1000:.0f} ms, map {map_s * 1000:.1f} ms")
+    else:
+        parser.print_help()
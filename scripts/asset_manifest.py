@@ -0,0 +1,212 @@
+"""
+Asset Manifest
+==============
+In-memory index of every file under assets/, so resolving a reference asset
+is a dict lookup instead of exists() calls and directory scans per request.
+
+Each entry records the file's path, name relative to assets/, normalized
+stem (lowercase, no spaces/underscores - how character names are matched),
+size, mtime and content hash (computed on first use). The tree is
+re-scanned at most every ASSET_MANIFEST_CHECK_S seconds (default 2) and the
+index rebuilt only if a file was added, removed or rewritten, so assets can
+be dropped in without restarting the server.
+
+Usage:
+    manifest = manifest_for(BASE_DIR / "assets")
+    manifest.entry("sorcerycardref/5star/SorceryCard_Front_Pip_5star.png")   # AssetEntry or None
+    manifest.match("sorcerycardref/primals", "frost queen")                   # by normalized stem
+    asset_exists(ASSETS_DIR / "gacharef" / "awaken_button.png")               # exists() without a stat
+
+    python scripts/asset_manifest.py            # list the manifest
+"""
+
+import os
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ASSETS_DIR = BASE_DIR / "assets"
+CHECK_INTERVAL_S = float(os.getenv("ASSET_MANIFEST_CHECK_S", "2"))
+
+
+def normalize_name(name: str) -> str:
+    """Lookup key for a file stem or a search term: "Frost_Queen" / "frost queen" -> "frostqueen"."""
+    return name.lower().replace(" ", "").replace("_", "")
+
+
+@dataclass
+class AssetEntry:
+    path: Path
+    name: str          # relative to the assets root, "/"-separated
+    key: str           # normalized stem
+    size: int
+    mtime_ns: int
+    _digest: Optional[str] = None
+
+    @property
+    def stem(self) -> str:
+        return self.path.stem
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the contents, read on first access."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.path.read_bytes()).hexdigest()
+        return self._digest
+
+
+class AssetManifest:
+    """Index of one assets root, refreshed by a throttled mtime check."""
+
+    def __init__(self, root, check_interval_s: float = CHECK_INTERVAL_S):
+        self.root = Path(os.path.abspath(root))
+        self._root_prefix = str(self.root) + os.sep
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._signature: Tuple = ()
+        self._entries: Dict[str, AssetEntry] = {}
+        self._by_lower: Dict[str, AssetEntry] = {}
+        self._by_dir: Dict[str, List[AssetEntry]] = {}
+        self._by_key: Dict[Tuple[str, str], AssetEntry] = {}
+        self.generation = 0
+        self.rebuilds = 0
+
+    # -- scanning -------------------------------------------------------------
+
+    def _scan(self) -> List[Tuple[str, os.stat_result]]:
+        files = []
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if item.name.startswith("."):
+                            continue
+                        if item.is_dir():
+                            pending.append(Path(item.path))
+                        elif item.is_file():
+                            rel = os.path.relpath(item.path, self.root).replace(os.sep, "/")
+                            files.append((rel, item.stat()))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        return files
+
+    def refresh(self, force: bool = False):
+        """Re-scan if the check interval has passed (or `force`); rebuild only on changes."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval_s:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.check_interval_s:
+                return
+            files = self._scan()
+            signature = tuple((rel, stat.st_size, stat.st_mtime_ns) for rel, stat in files)
+            self._checked_at = time.monotonic()
+            if signature == self._signature:
+                return
+
+            previous = self._entries
+            entries, by_lower, by_dir, by_key = {}, {}, {}, {}
+            for rel, stat in files:
+                old = previous.get(rel)
+                unchanged = old is not None and (old.size, old.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+                path = self.root / rel
+                entry = AssetEntry(path=path, name=rel, key=normalize_name(path.stem),
+                                   size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                                   _digest=old._digest if unchanged else None)
+                directory = rel.rpartition("/")[0]
+                entries[rel] = entry
+                by_lower.setdefault(rel.lower(), entry)
+                by_dir.setdefault(directory, []).append(entry)
+                by_key.setdefault((directory, entry.key), entry)
+            # Swapped in one step, so lookups never see a half-built index
+            self._entries, self._by_lower, self._by_dir, self._by_key = entries, by_lower, by_dir, by_key
+            self._signature = signature
+            self.generation += 1
+            self.rebuilds += 1
+
+    # -- lookups --------------------------------------------------------------
+
+    def name_for(self, path) -> Optional[str]:
+        """Manifest name of an absolute path under the root, else None (no filesystem access)."""
+        path = os.path.abspath(path)
+        if not path.startswith(self._root_prefix):
+            return None
+        return path[len(self._root_prefix):].replace(os.sep, "/")
+
+    def entry(self, name: str) -> Optional[AssetEntry]:
+        """Entry for a name relative to the root ("gacharef/awaken_button.png")."""
+        self.refresh()
+        return self._entries.get(name)
+
+    def entry_ci(self, name: str) -> Optional[AssetEntry]:
+        """Like entry(), ignoring case."""
+        self.refresh()
+        return self._by_lower.get(name.lower())
+
+    def path(self, name: str) -> Optional[Path]:
+        entry = self.entry(name)
+        return entry.path if entry else None
+
+    def exists(self, path) -> bool:
+        name = self.name_for(path)
+        return name is not None and self.entry(name) is not None
+
+    def files(self, directory: str) -> List[AssetEntry]:
+        """Entries directly inside `directory` (relative to the root), sorted by name."""
+        self.refresh()
+        return self._by_dir.get(directory.strip("/"), [])
+
+    def match(self, directory: str, name: str) -> Optional[AssetEntry]:
+        """Entry in `directory` whose normalized stem equals normalize_name(name)."""
+        self.refresh()
+        return self._by_key.get((directory.strip("/"), normalize_name(name)))
+
+    def stats(self) -> Dict[str, int]:
+        self.refresh()
+        return {"files": len(self._entries), "bytes": sum(e.size for e in self._entries.values()),
+                "generation": self.generation, "rebuilds": self.rebuilds}
+
+
+_manifests: Dict[str, AssetManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def manifest_for(root=ASSETS_DIR) -> AssetManifest:
+    """Shared manifest of an assets root (one per root per process)."""
+    key = os.path.abspath(root)
+    manifest = _manifests.get(key)
+    if manifest is None:
+        with _manifests_lock:
+            manifest = _manifests.setdefault(key, AssetManifest(key))
+    return manifest
+
+
+def asset_exists(path) -> bool:
+    """Path.exists() for files under a known assets root, answered from its manifest."""
+    for manifest in list(_manifests.values()):
+        if manifest.name_for(path) is not None:
+            return manifest.exists(path)
+    return Path(path).exists()
+
+
+ASSET_MANIFEST = manifest_for(ASSETS_DIR)
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    ASSET_MANIFEST.refresh(force=True)
+    scan_ms = (time.perf_counter() - started) * 1000
+    for directory in sorted(ASSET_MANIFEST._by_dir):
+        print(f"{directory or '.'}/")
+        for entry in ASSET_MANIFEST.files(directory):
+            print(f"  {entry.path.name:<48} {entry.size:>10,}  {entry.digest[:12]}")
+    stats = ASSET_MANIFEST.stats()
+    print(f"{stats['files']} files, {stats['bytes'] / 1024 / 1024:.1f} MB, scanned in {scan_ms:.1f} ms")
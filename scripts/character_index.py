@@ -0,0 +1,246 @@
+"""
+Character Index
+===============
+Trigram index over character art names, for resolving a requested character
+("frost queen", "Frost_Queen", "frostqeen") to the best file in a large
+primal roster.
+
+Names are reduced to lowercase letters and digits, split into padded
+trigrams, and kept in an inverted index (trigram -> entries). A lookup
+counts shared trigrams for all entries at once (numpy bincount over the
+query's posting lists), scores them by Dice similarity, and re-scores the
+best few with a small bonus for names that contain the query or are
+contained in it (the old substring rule). Results are ranked
+deterministically (score, then shorter name, then name), and a lookup is
+ambiguous when the runner-up scores within AMBIGUITY_MARGIN of the best
+non-exact match.
+
+The index is updated incrementally: sync() adds and removes only the files
+that changed, and index_for() keeps one index per asset directory in step
+with its asset manifest.
+
+Usage:
+    index = index_for(manifest_for(ASSETS_DIR), "sorcerycardref/primals")
+    result = index.resolve("frost queen")
+    result.match.path, result.ambiguous, result.candidates
+
+    python scripts/character_index.py "frost queen"
+"""
+
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from asset_manifest import AssetManifest, manifest_for
+
+CHARACTER_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+# Below this a name is not a match at all
+MIN_SCORE = 0.4
+# A runner-up this close to the best (non-exact) match makes the lookup ambiguous
+AMBIGUITY_MARGIN = 0.05
+# Added for names containing the query, or contained in it (the old substring rule)
+CONTAINS_BONUS = 0.1
+
+
+def character_key(name: str) -> str:
+    """"Frost_Queen-v2" / "frost queen v2" -> "frostqueenv2"."""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class CharacterMatch:
+    name: str       # as indexed (the asset manifest name)
+    path: Path
+    score: float
+
+
+@dataclass
+class CharacterResolution:
+    query: str
+    candidates: List[CharacterMatch] = field(default_factory=list)
+    ambiguous: bool = False
+
+    @property
+    def match(self) -> Optional[CharacterMatch]:
+        return self.candidates[0] if self.candidates else None
+
+    def describe(self) -> str:
+        return ", ".join(f"{c.path.stem} ({c.score:.2f})" for c in self.candidates)
+
+    def details(self) -> dict:
+        """JSON form for API responses; candidates are listed so a caller can pick one by name."""
+        return {
+            "match": self.match.path.stem if self.match else None,
+            "ambiguous": self.ambiguous,
+            "candidates": [{"name": c.path.stem, "score": c.score} for c in self.candidates],
+        }
+
+
+class CharacterIndex:
+    """Inverted trigram index of character files, updated by name."""
+
+    # Candidates re-scored in Python (exact and substring bonuses) per lookup
+    RESCORE = 40
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}                 # name -> slot
+        self._names: List[Optional[str]] = []          # slot -> name (None when free)
+        self._keys: List[str] = []
+        self._paths: List[Optional[Path]] = []
+        self._sizes: List[int] = []                    # trigram count per slot
+        self._free: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        # Lazily built numpy views of the above, dropped when they change
+        self._posting_arrays: Dict[str, np.ndarray] = {}
+        self._size_array: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # -- updates --------------------------------------------------------------
+
+    def add(self, name: str, path: Path):
+        key = character_key(Path(name).stem)
+        with self._lock:
+            if name in self._ids:
+                self._remove(name)
+            grams = trigrams(key)
+            if self._free:
+                slot = self._free.pop()
+                self._names[slot], self._keys[slot], self._paths[slot], self._sizes[slot] = name, key, Path(path), len(grams)
+            else:
+                slot = len(self._names)
+                self._names.append(name)
+                self._keys.append(key)
+                self._paths.append(Path(path))
+                self._sizes.append(len(grams))
+            self._ids[name] = slot
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(slot)
+                self._posting_arrays.pop(gram, None)
+            self._size_array = None
+
+    def remove(self, name: str):
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name: str):
+        slot = self._ids.pop(name, None)
+        if slot is None:
+            return
+        for gram in trigrams(self._keys[slot]):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.remove(slot)
+                self._posting_arrays.pop(gram, None)
+                if not posting:
+                    del self._postings[gram]
+        self._names[slot], self._keys[slot], self._paths[slot] = None, "", None
+        self._free.append(slot)
+
+    def sync(self, files: Iterable[Tuple[str, Path]]) -> Tuple[int, int]:
+        """Make the index hold exactly `files` ((name, path) pairs); returns (added, removed)."""
+        files = {name: Path(path) for name, path in files}
+        removed = [name for name in self._ids if name not in files]
+        added = [name for name, path in files.items()
+                 if name not in self._ids or self._paths[self._ids[name]] != path]
+        for name in removed:
+            self.remove(name)
+        for name in added:
+            self.add(name, files[name])
+        return len(added), len(removed)
+
+    # -- lookups --------------------------------------------------------------
+
+    def _posting_array(self, gram: str) -> np.ndarray:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            array = self._posting_arrays[gram] = np.fromiter(self._postings[gram], dtype=np.int32)
+        return array
+
+    def search(self, query: str, limit: int = 5) -> List[CharacterMatch]:
+        """Best `limit` matches for a name, best first."""
+        key = character_key(query)
+        if not key:
+            return []
+        grams = trigrams(key)
+        with self._lock:
+            postings = [self._posting_array(gram) for gram in grams if gram in self._postings]
+            if not postings:
+                return []
+            if self._size_array is None:
+                self._size_array = np.asarray(self._sizes, dtype=np.float32)
+            # Trigrams shared with the query, for every entry at once
+            shared = np.bincount(np.concatenate(postings), minlength=len(self._names))
+            candidates = np.flatnonzero(shared)
+            dice = 2 * shared[candidates] / (len(grams) + self._size_array[candidates])
+            if len(candidates) > self.RESCORE:
+                top = np.argpartition(-dice, self.RESCORE)[:self.RESCORE]
+                candidates, dice = candidates[top], dice[top]
+
+            scored = []
+            for slot, score in zip(candidates.tolist(), dice.tolist()):
+                entry_key = self._keys[slot]
+                if entry_key == key:
+                    score = 1.0
+                else:
+                    if key in entry_key or entry_key in key:
+                        score += CONTAINS_BONUS
+                    score = min(score, 0.99)
+                if score >= MIN_SCORE:
+                    scored.append((-score, len(entry_key), self._names[slot], self._paths[slot]))
+        scored.sort()
+        return [CharacterMatch(name, path, round(-neg, 4)) for neg, _, name, path in scored[:limit]]
+
+    def resolve(self, query: str, limit: int = 5) -> CharacterResolution:
+        """Ranked candidates for a name, flagged ambiguous when the top two are too close to call."""
+        candidates = self.search(query, limit)
+        ambiguous = (len(candidates) > 1 and candidates[0].score < 1.0
+                     and candidates[1].score >= candidates[0].score - AMBIGUITY_MARGIN)
+        return CharacterResolution(query=query, candidates=candidates, ambiguous=ambiguous)
+
+
+# (manifest root, directory) -> (index, manifest generation it reflects)
+_indexes: Dict[Tuple[str, str], List] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(manifest: AssetManifest, directory: str) -> CharacterIndex:
+    """Shared index of the character files in a manifest directory, synced when the manifest changes."""
+    manifest.refresh()
+    slot_key = (str(manifest.root), directory)
+    with _indexes_lock:
+        slot = _indexes.setdefault(slot_key, [CharacterIndex(), -1])
+        index, generation = slot
+        if generation != manifest.generation:
+            index.sync((entry.name, entry.path) for entry in manifest.files(directory)
+                       if entry.path.suffix.lower() in CHARACTER_SUFFIXES)
+            slot[1] = manifest.generation
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('Usage: python scripts/character_index.py "character name"')
+        sys.exit(1)
+    index = index_for(manifest_for(), "sorcerycardref/primals")
+    result = index.resolve(" ".join(sys.argv[1:]))
+    print(f"{len(index)} characters indexed")
+    if not result.candidates:
+        print(f"No match for {result.query!r}")
+        sys.exit(1)
+    for candidate in result.candidates:
+        print(f"  {candidate.score:.2f}  {candidate.path}")
+    if result.ambiguous:
+        print("Ambiguous: the top matches score too closely")
@@ -0,0 +1,552 @@
+"""
+Fake Gemini Server
+==================
+Local stand-in for the parts of the Gemini API the generators use: the Files
+API (resumable upload, get, delete) and generateContent. It answers every
+generation with a canned or synthesized PNG so the pipelines can run offline,
+and it records how many bytes each request carried.
+
+Point the scripts at it with GEMINI_BASE_URL:
+    python scripts/fake_gemini.py --port 8765 --latency lognormal:12,0.4 --error-rate 0.02
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=test \\
+        python scripts/generate_icon.py --name heart
+
+Or skip the socket entirely with GEMINI_BACKEND=fake: get_client() then
+returns an in-process FakeGeminiClient with the same behaviour.
+
+Behaviour is configured by flags or environment variables:
+    FAKE_GEMINI_LATENCY      fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA,
+                             optionally ";tail=P@S" (probability P of taking S seconds)
+    FAKE_GEMINI_ERROR_RATE   fraction of generate calls that fail (default 0)
+    FAKE_GEMINI_ERROR_CODES  statuses to fail with, e.g. "503,429" (default 503)
+    FAKE_GEMINI_CANNED_DIR   directory of PNGs to answer with (default: synthesized)
+    FAKE_GEMINI_FILE_TTL     seconds before uploaded files expire (default 48h)
+    FAKE_GEMINI_SEED         seed for latency/error sampling
+
+Uploaded files expire after the TTL; generateContent rejects requests that
+reference unknown or expired files with a 404, like the real service.
+GET /stats returns the counters as JSON.
+"""
+
+import io
+import os
+import json
+import math
+import time
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+
+def _timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def synthesize_png(seed: str, size: int = 256) -> bytes:
+    """Deterministic placeholder: a pale rounded shape on the #4A4A4A backdrop the prompts ask for."""
+    digest = hashlib.sha256(seed.encode()).digest()
+    image = Image.new("RGBA", (size, size), (0x4A, 0x4A, 0x4A, 255))
+    inset = size // 5 + digest[0] % (size // 10)
+    fill = (225 + digest[1] % 30, 225 + digest[2] % 30, 225 + digest[3] % 30, 255)
+    ImageDraw.Draw(image).rounded_rectangle(
+        (inset, inset, size - inset, size - inset), radius=size // 8, fill=fill)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+# =============================================================================
+# BEHAVIOUR (latency, injected errors, images)
+# =============================================================================
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Latency sampler for a spec string: "fixed:0.5", "uniform:0.2,1.5" or
+    "lognormal:12,0.4" (median seconds, sigma), optionally followed by
+    ";tail=0.02@90" so 2% of calls take 90 seconds.
+    """
+    spec = (spec or "fixed:0").strip()
+    tail_prob, tail_s = 0.0, 0.0
+    if ";" in spec:
+        spec, tail = spec.split(";", 1)
+        prob, seconds = tail.strip().replace("tail=", "").split("@")
+        tail_prob, tail_s = float(prob), float(seconds)
+
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "fixed":
+        fixed = values[0] if values else 0.0
+        base = lambda rng: fixed
+    elif kind == "uniform" and len(values) == 2:
+        base = lambda rng: rng.uniform(values[0], values[1])
+    elif kind == "lognormal" and values:
+        mu, sigma = math.log(values[0]), (values[1] if len(values) > 1 else 0.5)
+        base = lambda rng: rng.lognormvariate(mu, sigma)
+    else:
+        raise ValueError(f"Bad latency spec '{spec}' (use fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA)")
+
+    if tail_prob <= 0:
+        return base
+    return lambda rng: tail_s if rng.random() < tail_prob else base(rng)
+
+
+@dataclass
+class FakeModelBehavior:
+    """How the fake answers generateContent: latency, injected failures and images."""
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    error_codes: Tuple[int, ...] = (503,)
+    canned_dir: Optional[str] = None
+    file_ttl: float = 48 * 3600
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._sample = parse_latency(self.latency)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+        self._canned: List[bytes] = []
+        if self.canned_dir:
+            self._canned = [path.read_bytes() for path in sorted(Path(self.canned_dir).glob("*.png"))]
+            if not self._canned:
+                raise FileNotFoundError(f"No PNGs in canned dir {self.canned_dir}")
+
+    @classmethod
+    def from_env(cls) -> "FakeModelBehavior":
+        seed = os.getenv("FAKE_GEMINI_SEED")
+        return cls(
+            latency=os.getenv("FAKE_GEMINI_LATENCY", "fixed:0"),
+            error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+            error_codes=parse_codes(os.getenv("FAKE_GEMINI_ERROR_CODES", "503")),
+            canned_dir=os.getenv("FAKE_GEMINI_CANNED_DIR") or None,
+            file_ttl=float(os.getenv("FAKE_GEMINI_FILE_TTL", str(48 * 3600))),
+            seed=int(seed) if seed else None,
+        )
+
+    def next_call(self) -> Tuple[float, Optional[int]]:
+        """Sample (latency seconds, injected error status or None) for one generate call."""
+        with self._rng_lock:
+            latency = max(0.0, self._sample(self._rng))
+            failed = self._rng.random() < self.error_rate
+            return latency, (self._rng.choice(self.error_codes) if failed else None)
+
+    def image_for(self, request_key: str) -> bytes:
+        if self._canned:
+            return self._canned[int(request_key[:8], 16) % len(self._canned)]
+        return synthesize_png(request_key)
+
+
+def parse_codes(text: str) -> Tuple[int, ...]:
+    return tuple(int(code) for code in text.split(",") if code.strip())
+
+
+ERROR_STATUSES = {
+    400: "INVALID_ARGUMENT", 403: "PERMISSION_DENIED", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED",
+}
+
+
+def error_json(status: int, message: str) -> Dict[str, Any]:
+    return {"error": {"code": status, "message": message, "status": ERROR_STATUSES.get(status, "UNKNOWN")}}
+
+
+# =============================================================================
+# SHARED STATE
+# =============================================================================
+
+class FakeGeminiState:
+    """Files and counters shared by the HTTP handlers and FakeGeminiClient."""
+
+    def __init__(self, behavior: Optional[FakeModelBehavior] = None):
+        self.behavior = behavior or FakeModelBehavior.from_env()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            "uploads": 0,
+            "upload_bytes": 0,
+            "generate_requests": 0,
+            "generate_request_bytes": 0,
+            "file_refs": 0,
+            "inline_refs": 0,
+            "rejected": 0,
+            "injected_errors": 0,
+            "simulated_latency_s": 0.0,
+        }
+
+    @property
+    def file_ttl(self) -> float:
+        return self.behavior.file_ttl
+
+    def live_file(self, name: str) -> Optional[Dict[str, Any]]:
+        record = self.files.get(name)
+        if record is None or record["expires"] <= time.time():
+            return None
+        return record
+
+    def expire_all(self):
+        """Expire every uploaded file now (for exercising re-upload paths)."""
+        with self.lock:
+            for record in self.files.values():
+                record["expires"] = time.time()
+
+    def add_file(self, data: bytes, mime_type: Optional[str], display_name: str) -> Dict[str, Any]:
+        now = time.time()
+        record = {
+            "name": f"files/{uuid.uuid4().hex[:12]}",
+            "display_name": display_name,
+            "mime_type": mime_type or "application/octet-stream",
+            "data": data,
+            "created": now,
+            "expires": now + self.file_ttl,
+        }
+        with self.lock:
+            self.files[record["name"]] = record
+            self.stats["uploads"] += 1
+            self.stats["upload_bytes"] += len(data)
+        return record
+
+    def admit_generate(self, file_uris: List[str], inline_refs: int,
+                       request_bytes: int) -> Tuple[float, Optional[Tuple[int, str]]]:
+        """
+        Count one generate call and decide its fate: returns (latency to
+        simulate, (status, message) or None). Unknown or expired file
+        references fail immediately with a 404; otherwise the behaviour's
+        latency and error rate apply.
+        """
+        with self.lock:
+            self.stats["generate_requests"] += 1
+            self.stats["generate_request_bytes"] += request_bytes
+            self.stats["file_refs"] += len(file_uris)
+            self.stats["inline_refs"] += inline_refs
+            for uri in file_uris:
+                name = "files/" + uri.rsplit("/files/", 1)[-1]
+                if self.live_file(name) is None:
+                    self.stats["rejected"] += 1
+                    return 0.0, (404, f"File {name} not found or expired")
+
+        latency, status = self.behavior.next_call()
+        with self.lock:
+            self.stats["simulated_latency_s"] += latency
+            if status:
+                self.stats["injected_errors"] += 1
+        return latency, ((status, "Injected failure") if status else None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats, live_files=sum(1 for name in self.files if self.live_file(name)))
+        stats["simulated_latency_s"] = round(stats["simulated_latency_s"], 3)
+        return stats
+
+
+# =============================================================================
+# HTTP SERVER
+# =============================================================================
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    server_version = "FakeGemini/1.0"
+
+    @property
+    def state(self) -> FakeGeminiState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, error_json(status, message))
+
+    def _file_json(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        host = self.headers.get("Host", "localhost")
+        return {
+            "name": record["name"],
+            "displayName": record["display_name"],
+            "mimeType": record["mime_type"],
+            "sizeBytes": str(len(record["data"])),
+            "createTime": _timestamp(record["created"]),
+            "expirationTime": _timestamp(record["expires"]),
+            "sha256Hash": base64.b64encode(hashlib.sha256(record["data"]).digest()).decode(),
+            "uri": f"http://{host}/v1beta/{record['name']}",
+            "state": "ACTIVE",
+        }
+
+    # -------------------------------------------------------------------------
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            return self._send_json(200, self.state.snapshot())
+        if "/files/" in path:
+            name = "files/" + path.rsplit("/files/", 1)[1]
+            with self.state.lock:
+                record = self.state.live_file(name)
+            if record is None:
+                return self._send_error(404, f"File {name} not found")
+            return self._send_json(200, self._file_json(record))
+        self._send_error(404, f"Unknown path {path}")
+
+    def do_DELETE(self):
+        path = self.path.split("?")[0]
+        if "/files/" in path:
+            name = "files/" + path.rsplit("/files/", 1)[1]
+            with self.state.lock:
+                self.state.files.pop(name, None)
+            return self._send_json(200, {})
+        self._send_error(404, f"Unknown path {path}")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self._body()
+        if path.endswith("/upload/v1beta/files"):
+            return self._start_upload(body)
+        if path.startswith("/upload-session/"):
+            return self._upload_chunk(path.rsplit("/", 1)[1], body)
+        if path.endswith(":generateContent"):
+            return self._generate(path, body)
+        self._send_error(404, f"Unknown path {path}")
+
+    # -------------------------------------------------------------------------
+
+    def _start_upload(self, body: bytes):
+        meta = json.loads(body or b"{}").get("file", {})
+        session_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.sessions[session_id] = {
+                "data": bytearray(),
+                "mime_type": meta.get("mimeType") or self.headers.get("X-Goog-Upload-Header-Content-Type"),
+                "display_name": meta.get("displayName", ""),
+            }
+        host = self.headers.get("Host", "localhost")
+        self._send_json(200, {}, headers={"X-Goog-Upload-URL": f"http://{host}/upload-session/{session_id}"})
+
+    def _upload_chunk(self, session_id: str, body: bytes):
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        with self.state.lock:
+            session = self.state.sessions.get(session_id)
+            if session is None:
+                return self._send_error(404, "Unknown upload session")
+            session["data"].extend(body)
+            if "finalize" not in command:
+                return self._send_json(200, {}, headers={"X-Goog-Upload-Status": "active"})
+            del self.state.sessions[session_id]
+
+        record = self.state.add_file(bytes(session["data"]), session["mime_type"], session["display_name"])
+        self._send_json(200, {"file": self._file_json(record)}, headers={"X-Goog-Upload-Status": "final"})
+
+    def _generate(self, path: str, body: bytes):
+        request = json.loads(body or b"{}")
+        file_uris, inline_refs = [], 0
+        for content in request.get("contents", []):
+            for part in content.get("parts", []):
+                # The SDK may send either camelCase or snake_case field names
+                file_data = part.get("fileData") or part.get("file_data")
+                if file_data:
+                    file_uris.append(file_data.get("fileUri") or file_data.get("file_uri", ""))
+                elif "inlineData" in part or "inline_data" in part:
+                    inline_refs += 1
+        file_refs = len(file_uris)
+
+        latency, error = self.state.admit_generate(file_uris, inline_refs, len(body))
+        time.sleep(latency)
+        if error:
+            return self._send_error(*error)
+
+        image = self.state.behavior.image_for(hashlib.sha256(body).hexdigest())
+        self._send_json(200, {
+            "candidates": [{
+                "content": {"role": "model", "parts": [
+                    {"text": f"fake response ({file_refs} file refs, {inline_refs} inline)"},
+                    {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(image).decode()}},
+                ]},
+                "finishReason": "STOP",
+            }],
+            "modelVersion": path.rsplit("/", 1)[-1].split(":")[0],
+        })
+
+
+def start_server(port: int = 0, file_ttl: Optional[float] = None,
+                 behavior: Optional[FakeModelBehavior] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the server on a background thread; returns (server, base_url)."""
+    behavior = behavior or FakeModelBehavior.from_env()
+    if file_ttl is not None:
+        behavior.file_ttl = file_ttl
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGeminiHandler)
+    server.daemon_threads = True
+    server.state = FakeGeminiState(behavior)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# =============================================================================
+# IN-PROCESS CLIENT (GEMINI_BACKEND=fake)
+# =============================================================================
+
+def _api_error(status: int, message: str):
+    from google.genai import errors
+
+    error_class = errors.ServerError if status >= 500 else errors.ClientError
+    return error_class(status, error_json(status, message))
+
+
+class _FakeModels:
+    def __init__(self, state: FakeGeminiState):
+        self.state = state
+
+    def _admit(self, model: str, contents) -> Tuple[float, Optional[Tuple[int, str]], str]:
+        """Inspect the request like the server would; returns (latency, error, request key)."""
+        from google.genai import types
+
+        file_uris, inline_refs, request_bytes = [], 0, 0
+        key = hashlib.sha256(model.encode())
+        for item in contents if isinstance(contents, list) else [contents]:
+            if isinstance(item, str):
+                request_bytes += len(item.encode())
+                key.update(item.encode())
+            elif isinstance(item, types.Part) and item.file_data:
+                file_uris.append(item.file_data.file_uri)
+                request_bytes += len(item.file_data.file_uri)
+                key.update(item.file_data.file_uri.encode())
+            elif isinstance(item, types.Part) and item.inline_data:
+                inline_refs += 1
+                # On the wire the bytes travel base64-encoded
+                request_bytes += len(item.inline_data.data) * 4 // 3
+                key.update(hashlib.sha256(item.inline_data.data).digest())
+            elif isinstance(item, Image.Image):
+                inline_refs += 1
+                request_bytes += item.width * item.height
+                key.update(item.tobytes()[:4096])
+        latency, error = self.state.admit_generate(file_uris, inline_refs, request_bytes)
+        return latency, error, key.hexdigest()
+
+    def _response(self, request_key: str):
+        from google.genai import types
+
+        image = self.state.behavior.image_for(request_key)
+        return types.GenerateContentResponse(candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[
+                types.Part.from_text(text="fake response"),
+                types.Part.from_bytes(data=image, mime_type="image/png"),
+            ]),
+            finish_reason=types.FinishReason.STOP,
+        )])
+
+    def generate_content(self, *, model: str, contents, config=None):
+        latency, error, key = self._admit(model, contents)
+        time.sleep(latency)
+        if error:
+            raise _api_error(*error)
+        return self._response(key)
+
+
+class _AsyncFakeModels(_FakeModels):
+    async def generate_content(self, *, model: str, contents, config=None):
+        latency, error, key = self._admit(model, contents)
+        await asyncio.sleep(latency)
+        if error:
+            raise _api_error(*error)
+        return self._response(key)
+
+
+class _FakeFiles:
+    def __init__(self, state: FakeGeminiState):
+        self.state = state
+
+    def upload(self, *, file, config=None):
+        from google.genai import types
+
+        if isinstance(config, dict):
+            config = types.UploadFileConfig(**config)
+        data = file.read() if hasattr(file, "read") else Path(file).read_bytes()
+        record = self.state.add_file(data, getattr(config, "mime_type", None),
+                                     getattr(config, "display_name", None) or "")
+        return types.File(
+            name=record["name"],
+            display_name=record["display_name"],
+            mime_type=record["mime_type"],
+            size_bytes=len(data),
+            create_time=datetime.fromtimestamp(record["created"], timezone.utc),
+            expiration_time=datetime.fromtimestamp(record["expires"], timezone.utc),
+            uri=f"fake://v1beta/{record['name']}",
+            state=types.FileState.ACTIVE,
+        )
+
+
+class _AsyncFakeFiles(_FakeFiles):
+    async def upload(self, *, file, config=None):
+        return _FakeFiles.upload(self, file=file, config=config)
+
+
+class _AsyncFakeClient:
+    def __init__(self, state: FakeGeminiState):
+        self.models = _AsyncFakeModels(state)
+        self.files = _AsyncFakeFiles(state)
+
+
+class FakeGeminiClient:
+    """
+    In-process stand-in for genai.Client covering what the generators call:
+    models.generate_content, files.upload and their .aio counterparts. Shares
+    FakeGeminiState with the HTTP server, so behaviour and counters match.
+    """
+
+    def __init__(self, behavior: Optional[FakeModelBehavior] = None):
+        self.state = FakeGeminiState(behavior)
+        self.models = _FakeModels(self.state)
+        self.files = _FakeFiles(self.state)
+        self.aio = _AsyncFakeClient(self.state)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--file-ttl", type=float, help="Seconds before uploaded files expire")
+    parser.add_argument("--latency", help="Latency spec, e.g. 'lognormal:12,0.4;tail=0.02@90'")
+    parser.add_argument("--error-rate", type=float, help="Fraction of generate calls that fail")
+    parser.add_argument("--error-codes", help="Statuses for injected failures, e.g. 503,429")
+    parser.add_argument("--canned-dir", help="Answer with PNGs from this directory")
+    parser.add_argument("--seed", type=int, help="Seed for latency/error sampling")
+    args = parser.parse_args()
+
+    env = FakeModelBehavior.from_env()
+    behavior = FakeModelBehavior(
+        latency=args.latency or env.latency,
+        error_rate=env.error_rate if args.error_rate is None else args.error_rate,
+        error_codes=parse_codes(args.error_codes) if args.error_codes else env.error_codes,
+        canned_dir=args.canned_dir or env.canned_dir,
+        file_ttl=env.file_ttl if args.file_ttl is None else args.file_ttl,
+        seed=env.seed if args.seed is None else args.seed,
+    )
+
+    server, base_url = start_server(args.port, behavior=behavior)
+    print(f"Fake Gemini listening on {base_url} (latency {behavior.latency}, "
+          f"error rate {behavior.error_rate:.1%}, file TTL {behavior.file_ttl:.0f}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,42 @@
+"""
+File Lock
+=========
+Advisory lock shared by every process on the host, for the append-only
+JSONL indexes (result caches, the output store) that several workers write.
+
+Appends and compactions take the lock, so a compaction can merge what other
+processes appended before it replaces the log, and no append lands in a log
+that is about to be replaced.
+
+Usage:
+    with file_lock(store_dir / "index.lock"):
+        ... append to or rewrite index.jsonl ...
+"""
+
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to an in-process lock only
+    fcntl = None
+
+_local_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` (created if missing) for the block."""
+    path = Path(path)
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
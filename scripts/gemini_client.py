@@ -0,0 +1,419 @@
+"""
+Gemini Client
+=============
+Shared client construction for the generation scripts.
+
+Clients are created once per (API key, base URL) and reused, so repeated
+requests share one HTTP connection pool. Set GEMINI_BASE_URL to point the
+scripts at another endpoint that speaks the same API, such as the local
+stand-in server in fake_gemini.py. GEMINI_BACKEND=fake swaps in the
+in-process FakeGeminiClient from the same module (no network, no API key
+cost), for offline runs and load tests.
+
+Async callers share model_slots(), a per-event-loop semaphore that caps the
+number of model calls in flight (GEMINI_MAX_CONCURRENCY, default 16).
+
+Model calls go through call_model() / call_model_sync(), which enforce a
+deadline (set by the API layer with request_deadline(), or
+GEMINI_DEADLINE_S), fire one hedged duplicate when the first attempt is
+slower than the recent GEMINI_HEDGE_PERCENTILE latency (only if a slot is
+free, and for at most GEMINI_HEDGE_MAX_RATE of calls), and retry
+transient failures with jittered backoff while budget remains. Counters
+are available from model_metrics().
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import contextvars
+import concurrent.futures
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "gemini").lower()
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+
+# Deadline applied when the caller hasn't set one
+GEMINI_DEADLINE_S = float(os.getenv("GEMINI_DEADLINE_S", "120"))
+
+# Hedging: duplicate an attempt once it runs past this percentile of recent latencies
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "1") not in ("0", "false", "no")
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.9"))
+GEMINI_HEDGE_INITIAL_DELAY_S = float(os.getenv("GEMINI_HEDGE_INITIAL_DELAY_S", "30"))
+GEMINI_HEDGE_MIN_DELAY_S = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_S", "2"))
+HEDGE_MIN_SAMPLES = 20
+# At most this fraction of calls may send a hedge
+GEMINI_HEDGE_MAX_RATE = float(os.getenv("GEMINI_HEDGE_MAX_RATE", "0.1"))
+
+# Retries: full-jitter exponential backoff, only while the deadline allows
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "4"))
+GEMINI_RETRY_BASE_S = float(os.getenv("GEMINI_RETRY_BASE_S", "1"))
+GEMINI_RETRY_MAX_S = float(os.getenv("GEMINI_RETRY_MAX_S", "16"))
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], object] = {}
+_lock = threading.Lock()
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def get_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """Return a shared genai.Client for this API key and endpoint (or the fake backend)."""
+    from google import genai
+    from google.genai import types
+    
+    base_url = base_url or GEMINI_BASE_URL
+    key = (api_key, base_url)
+    with _lock:
+        if GEMINI_BACKEND == "fake":
+            from fake_gemini import FakeGeminiClient
+
+            # One fake for the whole process, whatever key is passed
+            key = ("fake", None)
+            if key not in _clients:
+                _clients[key] = FakeGeminiClient()
+            return _clients[key]
+        client = _clients.get(key)
+        if client is None:
+            http_options = types.HttpOptions(base_url=base_url) if base_url else None
+            client = genai.Client(api_key=api_key, http_options=http_options)
+            _clients[key] = client
+        return client
+
+
+def model_slots() -> asyncio.Semaphore:
+    """Semaphore bounding concurrent async model calls on the running event loop."""
+    loop = asyncio.get_running_loop()
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return slots
+
+
+# =============================================================================
+# DEADLINES
+# =============================================================================
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before the model answered."""
+
+
+# Absolute time.monotonic() deadline for the current request, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("gemini_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """
+    Give every model call made inside this block (including tasks and
+    asyncio.to_thread work started from it) a shared time budget.
+    Nested deadlines can only shorten the budget.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> float:
+    """Seconds left before the current deadline (GEMINI_DEADLINE_S if none is set)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return GEMINI_DEADLINE_S
+    return deadline - time.monotonic()
+
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+class ModelCallMetrics:
+    """Per-operation counters and a rolling latency window for hedge delays."""
+    
+    COUNTERS = ("calls", "attempts", "hedges", "hedge_wins", "hedges_skipped", "retries",
+                "successes", "failures", "deadline_exceeded")
+    
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._latencies: Dict[str, deque] = {}
+        self.window = window
+    
+    def incr(self, op: str, counter: str, n: int = 1):
+        with self._lock:
+            counts = self._counts.setdefault(op, dict.fromkeys(self.COUNTERS, 0))
+            counts[counter] += n
+    
+    def observe(self, op: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(op, deque(maxlen=self.window)).append(seconds)
+    
+    def hedge_allowed(self, op: str) -> bool:
+        """Whether another hedge stays within GEMINI_HEDGE_MAX_RATE of calls."""
+        with self._lock:
+            counts = self._counts.get(op)
+            return counts is None or counts["hedges"] < GEMINI_HEDGE_MAX_RATE * counts["calls"]
+    
+    def percentile(self, op: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(op, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    
+    def hedge_delay(self, op: str) -> float:
+        delay = self.percentile(op, GEMINI_HEDGE_PERCENTILE)
+        if delay is None:
+            delay = GEMINI_HEDGE_INITIAL_DELAY_S
+        return max(GEMINI_HEDGE_MIN_DELAY_S, delay)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            ops = {op: dict(counts) for op, counts in self._counts.items()}
+        for op, counts in ops.items():
+            calls = max(counts["calls"], 1)
+            counts["hedge_rate"] = round(counts["hedges"] / calls, 4)
+            counts["retry_rate"] = round(counts["retries"] / calls, 4)
+            for q in (0.5, 0.9, 0.99):
+                value = self.percentile(op, q)
+                counts[f"p{int(q * 100)}_s"] = round(value, 3) if value is not None else None
+            counts["hedge_delay_s"] = round(self.hedge_delay(op), 3)
+        return ops
+
+
+METRICS = ModelCallMetrics()
+
+
+def model_metrics() -> Dict[str, Dict[str, Any]]:
+    """Hedge/retry counters and latency percentiles per operation."""
+    return METRICS.snapshot()
+
+
+# =============================================================================
+# CALL WRAPPERS
+# =============================================================================
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures worth another attempt: throttling, 5xx, transport errors."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    try:
+        import httpx
+        if isinstance(error, (httpx.TransportError, httpx.TimeoutException)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, (ConnectionError, TimeoutError)) and not isinstance(error, DeadlineExceeded)
+
+
+def backoff_delay(retry: int) -> float:
+    """Full-jitter exponential backoff for the given retry number (1-based)."""
+    return random.uniform(0, min(GEMINI_RETRY_MAX_S, GEMINI_RETRY_BASE_S * 2 ** (retry - 1)))
+
+
+async def _attempt(make_call: Callable[[], Awaitable[Any]], op: str, started: List[float]):
+    async with model_slots():
+        METRICS.incr(op, "attempts")
+        began = time.monotonic()
+        started.append(began)
+        result = await make_call()
+        METRICS.observe(op, time.monotonic() - began)
+        return result
+
+
+async def _hedged(make_call: Callable[[], Awaitable[Any]], op: str, budget: float):
+    """
+    One attempt, plus a hedged duplicate if it outlives the hedge delay; first success wins.
+    
+    The delay runs from when the attempt got a model slot, so time spent
+    queueing is not mistaken for a slow answer. No hedge is sent while every
+    slot is busy (it would only queue too) or past the hedge rate cap.
+    """
+    end = time.monotonic() + budget
+    delay = METRICS.hedge_delay(op)
+    # Slot acquisition times, appended by _attempt
+    started: List[float] = []
+    tasks = [asyncio.ensure_future(_attempt(make_call, op, started))]
+    hedging = GEMINI_HEDGE
+    hedge = None
+    error = None
+    try:
+        while tasks:
+            now = time.monotonic()
+            if now >= end:
+                raise DeadlineExceeded(f"{op}: deadline exceeded")
+            # Until the attempt holds a slot, check back after a full delay
+            wake = min(end, (started[0] if started else now) + delay) if hedging else end
+            done, _ = await asyncio.wait(tasks, timeout=max(0.0, wake - now),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None:
+                    if task is hedge:
+                        METRICS.incr(op, "hedge_wins")
+                    return task.result()
+                error = task.exception()
+            if hedging and tasks and started and time.monotonic() >= started[0] + delay:
+                hedging = False
+                if model_slots().locked() or not METRICS.hedge_allowed(op):
+                    METRICS.incr(op, "hedges_skipped")
+                    continue
+                # The first attempt is slow: race a duplicate against it
+                METRICS.incr(op, "hedges")
+                print(f"[gemini] {op}: no answer after {delay:.1f}s, sending hedged request")
+                hedge = asyncio.ensure_future(_attempt(make_call, op, []))
+                tasks.append(hedge)
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_model(make_call: Callable[[], Awaitable[Any]], op: str = "generate"):
+    """
+    Await make_call() under the current deadline, with hedging and retries.
+    
+    make_call must start a fresh request each time it is called. Non-transient
+    errors (e.g. 4xx) are raised immediately; DeadlineExceeded is raised when
+    the budget runs out.
+    """
+    METRICS.incr(op, "calls")
+    attempt = 0
+    while True:
+        attempt += 1
+        budget = remaining_budget()
+        if budget <= 0:
+            METRICS.incr(op, "deadline_exceeded")
+            METRICS.incr(op, "failures")
+            raise DeadlineExceeded(f"{op}: no time budget left")
+        try:
+            result = await _hedged(make_call, op, budget)
+        except DeadlineExceeded:
+            METRICS.incr(op, "deadline_exceeded")
+            METRICS.incr(op, "failures")
+            raise
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            if not is_retryable(e) or attempt >= GEMINI_MAX_ATTEMPTS or delay >= remaining_budget():
+                METRICS.incr(op, "failures")
+                raise
+            METRICS.incr(op, "retries")
+            print(f"[gemini] {op}: {type(e).__name__} ({getattr(e, 'code', '')}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        METRICS.incr(op, "successes")
+        return result
+
+
+# Shared by all call_model_sync() callers; attempts past GEMINI_MAX_CONCURRENCY queue for a thread
+_sync_pool = concurrent.futures.ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY,
+                                                   thread_name_prefix="gemini-call")
+_sync_lock = threading.Lock()
+_sync_running = 0
+
+
+def _sync_attempt(make_call: Callable[[], Any], op: str, started: List[float]):
+    global _sync_running
+    with _sync_lock:
+        _sync_running += 1
+    try:
+        METRICS.incr(op, "attempts")
+        began = time.monotonic()
+        started.append(began)
+        result = make_call()
+        METRICS.observe(op, time.monotonic() - began)
+        return result
+    finally:
+        with _sync_lock:
+            _sync_running -= 1
+
+
+def call_model_sync(make_call: Callable[[], Any], op: str = "generate"):
+    """
+    Blocking call_model() for scripts without an event loop.
+    
+    Attempts run on a shared thread pool so a hedge can race a slow attempt;
+    hedges follow the same rules as call_model(). A losing attempt cannot be
+    interrupted; its result is discarded when it finishes.
+    """
+    METRICS.incr(op, "calls")
+    futures = []
+    try:
+        retry = 0
+        while True:
+            budget = remaining_budget()
+            end = time.monotonic() + budget
+            if budget <= 0:
+                METRICS.incr(op, "deadline_exceeded")
+                METRICS.incr(op, "failures")
+                raise DeadlineExceeded(f"{op}: no time budget left")
+            
+            delay = METRICS.hedge_delay(op)
+            started: List[float] = []
+            futures = [_sync_pool.submit(contextvars.copy_context().run, _sync_attempt, make_call, op, started)]
+            hedging = GEMINI_HEDGE
+            hedge = None
+            error = None
+            result = None
+            succeeded = False
+            while futures and not succeeded:
+                now = time.monotonic()
+                if now >= end:
+                    METRICS.incr(op, "deadline_exceeded")
+                    METRICS.incr(op, "failures")
+                    raise DeadlineExceeded(f"{op}: deadline exceeded")
+                wake = min(end, (started[0] if started else now) + delay) if hedging else end
+                done, _ = concurrent.futures.wait(futures, timeout=max(0.0, wake - now),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    futures.remove(future)
+                    if future.exception() is None:
+                        result, succeeded = future.result(), True
+                        if future is hedge:
+                            METRICS.incr(op, "hedge_wins")
+                        break
+                    error = future.exception()
+                if (not succeeded and hedging and futures and started
+                        and time.monotonic() >= started[0] + delay):
+                    hedging = False
+                    if _sync_running >= GEMINI_MAX_CONCURRENCY or not METRICS.hedge_allowed(op):
+                        METRICS.incr(op, "hedges_skipped")
+                        continue
+                    METRICS.incr(op, "hedges")
+                    print(f"[gemini] {op}: no answer after {delay:.1f}s, sending hedged request")
+                    hedge = _sync_pool.submit(contextvars.copy_context().run, _sync_attempt, make_call, op, [])
+                    futures.append(hedge)
+            
+            if succeeded:
+                METRICS.incr(op, "successes")
+                return result
+            
+            retry += 1
+            delay = backoff_delay(retry)
+            if not is_retryable(error) or retry >= GEMINI_MAX_ATTEMPTS or delay >= remaining_budget():
+                METRICS.incr(op, "failures")
+                raise error
+            METRICS.incr(op, "retries")
+            print(f"[gemini] {op}: {type(error).__name__} ({getattr(error, 'code', '')}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+    finally:
+        # Drops attempts still queued for a thread; running ones finish unobserved
+        for future in futures:
+            future.cancel()
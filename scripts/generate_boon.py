@@ -1,9 +1,22 @@
+import io
 import os
+import math
+import time
+import asyncio
 import argparse
-from PIL import Image
-from google import genai
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, List, Tuple
+from PIL import Image, ImageChops
 from google.genai import types
 
+from asset_bundle import open_asset
+from gemini_client import call_model, call_model_sync, get_client
+from output_store import OUTPUT_STORE
+from reference_payloads import (
+    PayloadReport, call_with_references, call_with_references_async,
+    load_reference, reference_part, reference_part_async,
+)
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -15,6 +28,9 @@ API_KEY = os.getenv("GOOGLE_API_KEY")
 
 MODEL_ID = "gemini-3-pro-image-preview"
 
+# "model" asks Gemini for a variation sheet; "local" composites with Pillow (no API call)
+BOON_MODE = os.getenv("BOON_MODE", "model").lower()
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ASSETS_DIR = os.path.join(BASE_DIR, "assets", "boonsref")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output", "boon")
@@ -53,7 +69,15 @@ def load_image(filename):
     path = os.path.join(ASSETS_DIR, filename)
     if not os.path.exists(path):
         raise FileNotFoundError(f"Asset not found: {path}")
-    return Image.open(path)
+    return open_asset(path)
+
+
+def load_payload(filename, report=None):
+    """Load the pre-encoded upload payload for an asset (encoded once per process)."""
+    payload = load_reference(os.path.join(ASSETS_DIR, filename), report=report)
+    if payload is None:
+        raise FileNotFoundError(f"Asset not found: {os.path.join(ASSETS_DIR, filename)}")
+    return payload
 
 
 def get_boon_filename(boon_key: str) -> str:
@@ -94,15 +118,34 @@ def generate_composite_prompt(boon_name: str, subicon_name: str) -> str:
     )
 
 
-def generate_boon(boon: str, subicon: str, output_name: str = None):
-    """
-    Generate a composite boon image.
-    
-    Args:
-        boon: The main boon type (fire, ice, celestial, earth, outer_dark, storm)
-        subicon: The sub-icon type (up/increase, down/decrease)
-        output_name: Optional custom output filename (without extension)
-    """
+SYSTEM_INSTRUCTION = (
+    "You are an expert UI artist specializing in game asset compositing. "
+    "You combine icons precisely while maintaining their original art style."
+)
+
+
+def request_config():
+    return types.GenerateContentConfig(
+        response_modalities=['TEXT', 'IMAGE'],
+        system_instruction=SYSTEM_INSTRUCTION,
+        image_config=types.ImageConfig(
+            aspect_ratio="1:1",
+        ),
+    )
+
+
+def output_path_for(boon: str, subicon: str, output_name: str = None) -> str:
+    if output_name:
+        filename = f"{output_name}.png"
+    else:
+        boon_clean = boon.upper().replace(" ", "_")
+        subicon_clean = "DOWN" if any(x in subicon.lower() for x in ["down", "decrease"]) else "UP"
+        filename = f"BOON_{boon_clean}_{subicon_clean}.png"
+    return os.path.join(OUTPUT_DIR, filename)
+
+
+def prepare_boon_request(boon: str, subicon: str):
+    """Resolve and load both images; returns (prompt, boon payload, sub-icon payload, report)."""
     print(f"--- Generating Composite Boon ---")
     print(f"Main Boon: {boon}")
     print(f"Sub-Icon: {subicon}")
@@ -117,98 +160,481 @@ def generate_boon(boon: str, subicon: str, output_name: str = None):
     print(f"Boon File: {boon_file}")
     print(f"Sub-Icon File: {subicon_file}")
     
-    # Load images
-    boon_img = load_image(boon_file)
-    subicon_img = load_image(subicon_file)
+    # Load pre-encoded images
+    report = PayloadReport()
+    boon_img = load_payload(boon_file, report)
+    subicon_img = load_payload(subicon_file, report)
     
-    # Initialize client
-    client = genai.Client(api_key=API_KEY)
+    return generate_composite_prompt(boon, subicon), boon_img, subicon_img, report
+
+
+def save_boon_response(response, boon: str, subicon: str, output_name: str = None,
+                       slice_sheet: bool = True):
+    """
+    Save the first image in a model response; returns the path or None.
+    
+    With slice_sheet, the variation sheet is also cut into numbered sprites
+    (see slice_boon_sheet).
+    """
+    if response.parts:
+        for part in response.parts:
+            if part.text:
+                print(f"Model Response: {part.text}")
+            
+            try:
+                image = part.as_image()
+            except AttributeError:
+                # Fallback for different SDK versions
+                image = None
+                if hasattr(part, 'inline_data') and part.inline_data:
+                    image = Image.open(io.BytesIO(part.inline_data.data))
+            
+            if image:
+                os.makedirs(OUTPUT_DIR, exist_ok=True)
+                save_path = output_path_for(boon, subicon, output_name)
+                OUTPUT_STORE.save_image(save_path, image)
+                print(f"SUCCESS: Saved to {save_path}")
+                if slice_sheet:
+                    slice_boon_sheet(save_path)
+                return save_path
+    
+    print("FAILED: No image returned from API.")
+    return None
+
+
+def generate_boon(boon: str, subicon: str, output_name: str = None, slice_sheet: bool = True,
+                  mode: str = None):
+    """
+    Generate a composite boon image.
     
-    # Build prompt
-    prompt = generate_composite_prompt(boon, subicon)
+    Args:
+        boon: The main boon type (fire, ice, celestial, earth, outer_dark, storm)
+        subicon: The sub-icon type (up/increase, down/decrease)
+        output_name: Optional custom output filename (without extension)
+        slice_sheet: Also produce individual variant sprites (sliced from the
+            model's sheet, or swept locally in local mode)
+        mode: "model" or "local" (defaults to BOON_MODE)
+    """
+    if (mode or BOON_MODE) == "local":
+        return generate_boon_local(boon, subicon, output_name, variations=slice_sheet)
     
-    # Build content list
-    contents = [
-        prompt,
-        boon_img,      # IMAGE 1: Main boon
-        subicon_img,   # IMAGE 2: Sub-icon
-    ]
+    prompt, boon_img, subicon_img, report = prepare_boon_request(boon, subicon)
     
-    print(f"Sending request to {MODEL_ID}...")
+    # Initialize client
+    client = get_client(API_KEY)
     
-    try:
-        response = client.models.generate_content(
-            model=MODEL_ID,
-            contents=contents,
-            config=types.GenerateContentConfig(
-                response_modalities=['TEXT', 'IMAGE'],
-                system_instruction=(
-                    "You are an expert UI artist specializing in game asset compositing. "
-                    "You combine icons precisely while maintaining their original art style."
-                ),
-                image_config=types.ImageConfig(
-                    aspect_ratio="1:1",
-                ),
-            )
+    # Build content list (rebuilt if file handles need re-uploading)
+    def build_contents():
+        return [
+            prompt,
+            reference_part(boon_img, client, report),      # IMAGE 1: Main boon
+            reference_part(subicon_img, client, report),   # IMAGE 2: Sub-icon
+        ]
+    
+    def call(contents):
+        print(f"Sending request to {MODEL_ID} ({report.summary()})...")
+        return call_model_sync(
+            lambda: client.models.generate_content(model=MODEL_ID, contents=contents, config=request_config()),
+            op="boon",
         )
-        
-        # Process response
-        image_saved = False
-        if response.parts:
-            for part in response.parts:
-                if part.text:
-                    print(f"Model Response: {part.text}")
-                
-                try:
-                    image = part.as_image()
-                    if image:
-                        os.makedirs(OUTPUT_DIR, exist_ok=True)
-                        
-                        # Generate filename
-                        if output_name:
-                            filename = f"{output_name}.png"
-                        else:
-                            boon_clean = boon.upper().replace(" ", "_")
-                            subicon_clean = "DOWN" if any(x in subicon.lower() for x in ["down", "decrease"]) else "UP"
-                            filename = f"BOON_{boon_clean}_{subicon_clean}.png"
-                        
-                        save_path = os.path.join(OUTPUT_DIR, filename)
-                        image.save(save_path)
-                        print(f"SUCCESS: Saved to {save_path}")
-                        image_saved = True
-                        return save_path
-                        
-                except AttributeError:
-                    if hasattr(part, 'inline_data') and part.inline_data:
-                        # Fallback for different SDK versions
-                        import io
-                        image_data = part.inline_data.data
-                        image = Image.open(io.BytesIO(image_data))
-                        
-                        os.makedirs(OUTPUT_DIR, exist_ok=True)
-                        
-                        if output_name:
-                            filename = f"{output_name}.png"
-                        else:
-                            boon_clean = boon.upper().replace(" ", "_")
-                            subicon_clean = "DOWN" if any(x in subicon.lower() for x in ["down", "decrease"]) else "UP"
-                            filename = f"BOON_{boon_clean}_{subicon_clean}.png"
-                        
-                        save_path = os.path.join(OUTPUT_DIR, filename)
-                        image.save(save_path)
-                        print(f"SUCCESS: Saved to {save_path}")
-                        image_saved = True
-                        return save_path
-
-        if not image_saved:
-            print("FAILED: No image returned from API.")
-            return None
+    
+    try:
+        response = call_with_references(client, build_contents, call)
+        return save_boon_response(response, boon, subicon, output_name, slice_sheet)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        raise
+
 
+async def generate_boon_async(boon: str, subicon: str, output_name: str = None, slice_sheet: bool = True,
+                              mode: str = None):
+    """Async generate_boon() on the SDK's native async client, via call_model()."""
+    if (mode or BOON_MODE) == "local":
+        return await asyncio.to_thread(generate_boon_local, boon, subicon, output_name, variations=slice_sheet)
+    
+    prompt, boon_img, subicon_img, report = prepare_boon_request(boon, subicon)
+    
+    client = get_client(API_KEY)
+    
+    async def build_contents():
+        return [
+            prompt,
+            await reference_part_async(boon_img, client, report),      # IMAGE 1: Main boon
+            await reference_part_async(subicon_img, client, report),   # IMAGE 2: Sub-icon
+        ]
+    
+    async def call(contents):
+        print(f"Sending request to {MODEL_ID} ({report.summary()})...")
+        return await call_model(
+            lambda: client.aio.models.generate_content(model=MODEL_ID, contents=contents, config=request_config()),
+            op="boon",
+        )
+    
+    try:
+        response = await call_with_references_async(client, build_contents, call)
+        # Saving and slicing are CPU work - keep them off the event loop
+        return await asyncio.to_thread(save_boon_response, response, boon, subicon, output_name, slice_sheet)
     except Exception as e:
         print(f"ERROR: {e}")
         raise
 
 
+# =============================================================================
+# Sheet Slicing: one model call -> 30 transparent variants
+# =============================================================================
+
+SHEET_BACKGROUND = (0x4A, 0x4A, 0x4A)   # Background color requested in the prompt
+
+# Colour distance (max over RGB) from the background: below KEY_LOW is fully
+# transparent, above KEY_HIGH fully opaque, soft alpha in between.
+KEY_LOW = 12
+KEY_HIGH = 48
+
+SPRITE_SIZE = 256       # Normalized variant size (square)
+SPRITE_MARGIN = 8       # Transparent padding inside the normalized sprite
+
+
+def variants_dir_for(sheet_path: str) -> str:
+    """Directory holding the sliced variants of a sheet (BOON_FIRE_UP.png -> BOON_FIRE_UP/)."""
+    return os.path.splitext(sheet_path)[0]
+
+
+def clear_variants(output_dir: str, stem: str):
+    """Remove sprites left by a previous run for the same sheet."""
+    for old in os.listdir(output_dir):
+        if old.startswith(f"{stem}_") and old.endswith(".png"):
+            OUTPUT_STORE.discard(os.path.join(output_dir, old))
+
+
+def estimate_background(rgb):
+    """Median colour of the sheet border; falls back to SHEET_BACKGROUND if the border is busy."""
+    import numpy as np
+    
+    border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]]).astype(np.int16)
+    median = np.median(border, axis=0)
+    if np.abs(border - median).max(axis=1).mean() > KEY_LOW:
+        return np.array(SHEET_BACKGROUND, dtype=np.float32)
+    return median.astype(np.float32)
+
+
+def key_background(rgba, background, low: int = KEY_LOW, high: int = KEY_HIGH):
+    """
+    Key a flat background colour to alpha.
+    
+    Returns a float32 RGBA array (0-255). Soft edges are un-mixed from the
+    background so sprites don't carry a gray fringe onto other backdrops.
+    """
+    import numpy as np
+    
+    rgb = rgba[..., :3].astype(np.float32)
+    distance = np.abs(rgb - background).max(axis=-1)
+    alpha = np.clip((distance - low) * (1.0 / (high - low)), 0.0, 1.0)
+    source_alpha = rgba[..., 3]
+    if source_alpha.min() < 255:
+        alpha *= source_alpha * np.float32(1 / 255)
+    
+    # Only partially transparent pixels need un-mixing
+    soft = (alpha > 0) & (alpha < 1)
+    soft_alpha = alpha[soft][:, None]
+    rgb[soft] = np.clip((rgb[soft] - background * (1.0 - soft_alpha)) / soft_alpha, 0, 255)
+    
+    keyed = np.empty(alpha.shape + (4,), dtype=np.float32)
+    keyed[..., :3] = rgb
+    keyed[..., 3] = alpha * 255.0
+    return keyed
+
+
+def find_runs(profile, min_gap: int, min_length: int):
+    """[start, end) runs where profile is True, bridging gaps shorter than min_gap."""
+    import numpy as np
+    
+    padded = np.concatenate([[False], profile, [False]])
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if runs and start - runs[-1][1] < min_gap:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    return [(int(start), int(end)) for start, end in runs if end - start >= min_length]
+
+
+def find_grid_cells(alpha, min_gap: int = None, min_pixels: int = 3):
+    """
+    Locate sprite cells on a keyed sheet, in reading order.
+    
+    Rows come from the horizontal projection of the alpha mask; columns are
+    then found per row band, so rows with different counts or offsets still
+    slice cleanly. Returns a list of (left, top, right, bottom) boxes.
+    """
+    mask = alpha > 127
+    height, width = mask.shape
+    min_gap = min_gap or max(4, min(width, height) // 100)
+    min_length = max(8, min(width, height) // 40)
+    
+    cells = []
+    for top, bottom in find_runs(mask.sum(axis=1) >= min_pixels, min_gap, min_length):
+        band = mask[top:bottom]
+        for left, right in find_runs(band.sum(axis=0) >= min_pixels, min_gap, min_length):
+            rows = band[:, left:right].any(axis=1).nonzero()[0]
+            cells.append((left, top + int(rows[0]), right, top + int(rows[-1]) + 1))
+    return cells
+
+
+def normalize_sprite(sprite: Image.Image, size: int = SPRITE_SIZE, margin: int = SPRITE_MARGIN) -> Image.Image:
+    """Trim to content and fit centered on a transparent size x size canvas."""
+    bbox = sprite.getchannel("A").getbbox()
+    if bbox:
+        sprite = sprite.crop(bbox)
+    inner = size - 2 * margin
+    scale = min(inner / sprite.width, inner / sprite.height)
+    resized = sprite.resize((max(1, round(sprite.width * scale)), max(1, round(sprite.height * scale))),
+                            Image.Resampling.LANCZOS)
+    canvas = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    canvas.paste(resized, ((size - resized.width) // 2, (size - resized.height) // 2))
+    return canvas
+
+
+def slice_boon_sheet(sheet_path: str, output_dir: str = None, size: int = SPRITE_SIZE,
+                     expected: int = 30) -> dict:
+    """
+    Slice a generated variation sheet into numbered transparent sprites.
+    
+    Writes <output_dir>/<SHEET>_01.png ... and manifest.json next to them.
+    Returns the manifest dict.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("Sheet slicing requires numpy: pip install numpy")
+    import json
+    
+    sheet = Image.open(io.BytesIO(OUTPUT_STORE.read_bytes(sheet_path))).convert("RGBA")
+    rgba = np.asarray(sheet)
+    background = estimate_background(rgba[..., :3])
+    keyed = key_background(rgba, background)
+    cells = find_grid_cells(keyed[..., 3])
+    
+    # Drop specks: anything much smaller than the typical cell is noise, not a variant
+    if cells:
+        areas = np.array([(r - l) * (b - t) for l, t, r, b in cells])
+        cells = [c for c, area in zip(cells, areas) if area >= 0.2 * np.median(areas)]
+    
+    output_dir = output_dir or variants_dir_for(sheet_path)
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(sheet_path))[0]
+    
+    clear_variants(output_dir, stem)
+    keyed_image = Image.fromarray(np.round(keyed).astype(np.uint8), "RGBA")
+    
+    variants = []
+    for index, box in enumerate(cells, start=1):
+        sprite = normalize_sprite(keyed_image.crop(box), size)
+        filename = f"{stem}_{index:02d}.png"
+        OUTPUT_STORE.save_image(os.path.join(output_dir, filename), sprite, optimize=False, compress_level=6)
+        variants.append({"index": index, "file": filename, "sheet_box": list(box)})
+    
+    manifest = {
+        "sheet": os.path.basename(sheet_path),
+        "sheet_size": list(sheet.size),
+        "background": [round(float(c)) for c in background],
+        "sprite_size": size,
+        "count": len(variants),
+        "variants": variants,
+    }
+    OUTPUT_STORE.write_text(os.path.join(output_dir, "manifest.json"), json.dumps(manifest, indent=2))
+    
+    note = "" if len(variants) == expected else f" (expected {expected})"
+    print(f"SLICED: {len(variants)} variants{note} -> {output_dir}")
+    return manifest
+
+
+# =============================================================================
+# Local Compositor: deterministic, no model call
+# =============================================================================
+
+# Where the sub-icon sits, as the fraction of the canvas its center is placed at
+ANCHORS = {
+    "bottom-right": (0.75, 0.75),
+    "bottom-left": (0.25, 0.75),
+    "top-right": (0.75, 0.25),
+    "top-left": (0.25, 0.25),
+    "center": (0.5, 0.5),
+}
+
+
+@dataclass(frozen=True)
+class BoonCompositeParams:
+    """Geometry of one local composite (sizes are fractions of the canvas side)."""
+    scale: float = 0.44         # Sub-icon longest side
+    cutout: float = 0.03        # Transparent gap carved around the sub-icon
+    anchor: str = "bottom-right"
+    size: int = 512             # Output canvas side in pixels
+    
+    def anchor_point(self) -> Tuple[float, float]:
+        if self.anchor in ANCHORS:
+            return ANCHORS[self.anchor]
+        try:
+            x, y = (float(v) for v in self.anchor.split(","))
+            return x, y
+        except ValueError:
+            available = ", ".join(ANCHORS)
+            raise ValueError(f"Unknown anchor '{self.anchor}'. Use {available} or 'x,y' fractions")
+
+
+# Variation sweep: every sub-icon size against every cutout thickness
+SWEEP_SCALES = (0.36, 0.42, 0.48)
+SWEEP_CUTOUTS = (0.015, 0.03, 0.045, 0.06)
+
+
+def sweep_params(base: BoonCompositeParams = BoonCompositeParams(),
+                 scales=SWEEP_SCALES, cutouts=SWEEP_CUTOUTS) -> List[BoonCompositeParams]:
+    return [replace(base, scale=scale, cutout=cutout) for scale in scales for cutout in cutouts]
+
+
+# Upsampled dilation masks are re-thresholded around 50% with a short ramp for anti-aliasing
+CUTOUT_LUT = [min(255, max(0, (v - 96) * 4)) for v in range(256)]
+
+
+def dilate_alpha(alpha: Image.Image, radius: float, max_kernel_radius: int = 8) -> Image.Image:
+    """
+    Round (Euclidean) dilation of an alpha mask by radius pixels.
+    
+    Large radii are dilated on a box-downsampled mask so the disc kernel stays
+    within max_kernel_radius, then upsampled and re-thresholded; the mask
+    itself is merged back at full resolution so thin features keep their edge.
+    """
+    import numpy as np
+    
+    factor = max(1, math.ceil(radius / max_kernel_radius))
+    small = alpha.reduce(factor) if factor > 1 else alpha
+    # Grayscale dilation keeps the box-averaged edge coverage, so the contour stays smooth when upsampled
+    source = np.asarray(small)
+    r = radius / factor
+    k = int(math.ceil(r))
+    
+    padded = np.pad(source, k)
+    dilated = source.copy()
+    height, width = source.shape
+    for dy in range(-k, k + 1):
+        for dx in range(-k, k + 1):
+            if dx * dx + dy * dy <= r * r:
+                np.maximum(dilated, padded[k + dy:k + dy + height, k + dx:k + dx + width], out=dilated)
+    
+    mask = Image.fromarray(dilated, "L")
+    if factor > 1:
+        mask = mask.resize(alpha.size, Image.Resampling.BILINEAR).point(CUTOUT_LUT)
+    return ImageChops.lighter(mask, alpha)
+
+_keyed_assets: Dict[Tuple[str, int], Image.Image] = {}
+
+
+def load_keyed(filename: str, size: int) -> Image.Image:
+    """Asset with its flat backdrop keyed to alpha, resized to size x size (cached per process)."""
+    cache_key = (filename, size)
+    cached = _keyed_assets.get(cache_key)
+    if cached is None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("The local compositor requires numpy: pip install numpy")
+        
+        rgba = np.asarray(load_image(filename).convert("RGBA"))
+        keyed = key_background(rgba, estimate_background(rgba[..., :3]))
+        cached = Image.fromarray(np.round(keyed).astype(np.uint8), "RGBA")
+        if cached.size != (size, size):
+            cached = cached.resize((size, size), Image.Resampling.LANCZOS)
+        _keyed_assets[cache_key] = cached
+    return cached
+
+
+def composite_boon_local(boon: str, subicon: str,
+                         params: BoonCompositeParams = BoonCompositeParams()) -> Image.Image:
+    """
+    Place the sub-icon over the boon and carve a transparent cutout around it.
+    
+    The cutout is the sub-icon's alpha dilated by params.cutout (see
+    dilate_alpha) and subtracted from the boon's alpha.
+    """
+    size = params.size
+    boon_img = load_keyed(get_boon_filename(boon), size)
+    sub_img = load_keyed(get_subicon_filename(subicon), size)
+    
+    # Scale the trimmed sub-icon so its longest side is params.scale of the canvas
+    bbox = sub_img.getchannel("A").getbbox() or (0, 0, size, size)
+    sub_img = sub_img.crop(bbox)
+    factor = params.scale * size / max(sub_img.size)
+    sub_img = sub_img.resize((max(1, round(sub_img.width * factor)), max(1, round(sub_img.height * factor))),
+                             Image.Resampling.LANCZOS)
+    
+    ax, ay = params.anchor_point()
+    x = min(max(round(ax * size - sub_img.width / 2), 0), size - sub_img.width)
+    y = min(max(round(ay * size - sub_img.height / 2), 0), size - sub_img.height)
+    
+    layer = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    layer.paste(sub_img, (x, y))
+    
+    radius = params.cutout * size
+    if radius > 0:
+        cutout = dilate_alpha(layer.getchannel("A"), radius)
+        alpha = ImageChops.multiply(boon_img.getchannel("A"), ImageChops.invert(cutout))
+        result = boon_img.copy()
+        result.putalpha(alpha)
+    else:
+        result = boon_img.copy()
+    
+    result.alpha_composite(layer)
+    return result
+
+
+def generate_boon_local(boon: str, subicon: str, output_name: str = None,
+                        params: BoonCompositeParams = BoonCompositeParams(),
+                        variations: bool = False) -> str:
+    """
+    Composite a boon locally and save it; returns the saved path.
+    
+    With variations, the sweep_params() set is also written to the same
+    <SHEET>/<SHEET>_NN.png layout and manifest.json that sheet slicing produces.
+    """
+    import json
+    
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    save_path = output_path_for(boon, subicon, output_name)
+    OUTPUT_STORE.save_image(save_path, composite_boon_local(boon, subicon, params), compress_level=1)
+    print(f"SUCCESS (local): Saved to {save_path}")
+    
+    if variations:
+        output_dir = variants_dir_for(save_path)
+        os.makedirs(output_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(save_path))[0]
+        clear_variants(output_dir, stem)
+        entries = []
+        for index, variant in enumerate(sweep_params(params), start=1):
+            filename = f"{stem}_{index:02d}.png"
+            OUTPUT_STORE.save_image(os.path.join(output_dir, filename),
+                                    composite_boon_local(boon, subicon, variant), compress_level=1)
+            entries.append({"index": index, "file": filename, "params": asdict(variant)})
+        manifest = {"sheet": None, "mode": "local", "sprite_size": params.size,
+                    "count": len(entries), "variants": entries}
+        OUTPUT_STORE.write_text(os.path.join(output_dir, "manifest.json"), json.dumps(manifest, indent=2))
+        print(f"VARIANTS (local): {len(entries)} -> {output_dir}")
+    
+    return save_path
+
+
+def generate_all_local(params: BoonCompositeParams = BoonCompositeParams()) -> List[str]:
+    """Render every element x direction combination locally."""
+    boons = sorted(set(MAIN_BOONS.values()))
+    subicons = sorted(set(SUB_ICONS.values()))
+    keys = {filename: key for key, filename in MAIN_BOONS.items()}
+    sub_keys = {filename: key for key, filename in SUB_ICONS.items()}
+    
+    start = time.perf_counter()
+    paths = [generate_boon_local(keys[b], sub_keys[si], params=params) for b in boons for si in subicons]
+    print(f"Rendered {len(paths)} boons locally in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return paths
+
+
 def list_available():
     """Print available boons and sub-icons."""
     print("\n=== Available Main Boons ===")
@@ -232,12 +658,10 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--boon", 
-        required=True, 
         help="Main boon type (fire, ice, celestial, earth, outer_dark, storm)"
     )
     parser.add_argument(
         "--subicon", 
-        required=True, 
         help="Sub-icon type (up/increase, down/decrease)"
     )
     parser.add_argument(
@@ -250,10 +674,56 @@ if __name__ == "__main__":
         action="store_true", 
         help="List available boons and sub-icons"
     )
+    parser.add_argument(
+        "--no-slice",
+        action="store_true",
+        help="Keep the variation sheet whole instead of slicing it into sprites"
+    )
+    parser.add_argument(
+        "--slice",
+        metavar="SHEET",
+        help="Slice an existing variation sheet into sprites and exit"
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Composite locally with Pillow instead of calling the model"
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Render every boon x sub-icon combination locally"
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=BoonCompositeParams.scale,
+        help="Local mode: sub-icon size as a fraction of the canvas"
+    )
+    parser.add_argument(
+        "--cutout",
+        type=float,
+        default=BoonCompositeParams.cutout,
+        help="Local mode: cutout thickness as a fraction of the canvas"
+    )
+    parser.add_argument(
+        "--anchor",
+        default=BoonCompositeParams.anchor,
+        help=f"Local mode: {', '.join(ANCHORS)} or 'x,y' fractions"
+    )
     
     args = parser.parse_args()
+    params = BoonCompositeParams(scale=args.scale, cutout=args.cutout, anchor=args.anchor)
     
     if args.list:
         list_available()
+    elif args.slice:
+        slice_boon_sheet(args.slice)
+    elif args.all:
+        generate_all_local(params)
+    elif not (args.boon and args.subicon):
+        parser.error("--boon and --subicon are required")
+    elif args.local or BOON_MODE == "local":
+        generate_boon_local(args.boon, args.subicon, args.output, params, variations=not args.no_slice)
     else:
-        generate_boon(args.boon, args.subicon, args.output)
\ No newline at end of file
+        generate_boon(args.boon, args.subicon, args.output, slice_sheet=not args.no_slice)
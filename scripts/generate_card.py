@@ -14,13 +14,18 @@ Usage:
 """
 
 import os
-import re
 import argparse
 import json
 from pathlib import Path
 from PIL import Image, ImageOps, ImageFilter, ImageEnhance
 from typing import Tuple, Optional, Dict, Any, List
 
+from asset_bundle import open_asset
+from asset_manifest import manifest_for
+from character_index import CHARACTER_SUFFIXES, CharacterResolution, index_for
+from output_store import OUTPUT_STORE
+from request_grammar import CALLINGS, CardIntent, parse_card
+
 # Optional AI imports
 try:
     from google import genai
@@ -138,8 +143,8 @@ class CardConfig:
     # Supported rarities
     RARITIES = ["3star", "4star", "5star"]
     
-    # Known callings (expandable)
-    CALLINGS = ["Cunning", "Might", "Wisdom", "Spirit", "Shadow"]
+    # Known callings (expandable, in request_grammar)
+    CALLINGS = list(CALLINGS)
     
     # AI Model configuration
     GEMINI_MODEL = "gemini-3-pro-image-preview"
@@ -149,7 +154,7 @@ class CardConfig:
 
 
 class PathResolver:
-    """Resolves asset paths based on the project structure."""
+    """Resolves asset paths based on the project structure (lookups hit the in-memory asset manifest)."""
     
     def __init__(self, base_dir: str = None):
         if base_dir is None:
@@ -158,6 +163,24 @@ class PathResolver:
         self.base_dir = Path(base_dir)
         self.assets_dir = self.base_dir / "assets" / "sorcerycardref"
         self.output_dir = self.base_dir / "output" / "card"
+        self.manifest = manifest_for(self.base_dir / "assets")
+        # Fuzzy lookups by (kind, term), valid for one manifest generation
+        self._found: Dict[Tuple[str, str], Optional[Path]] = {}
+        self._found_generation = -1
+        
+    def _asset(self, *parts: str) -> Optional[Path]:
+        """Path of sorcerycardref/<parts> if it exists."""
+        return self.manifest.path("/".join(("sorcerycardref",) + parts))
+    
+    def _memo(self, kind: str, term: str, find) -> Optional[Path]:
+        self.manifest.refresh()
+        if self._found_generation != self.manifest.generation:
+            self._found.clear()
+            self._found_generation = self.manifest.generation
+        key = (kind, term)
+        if key not in self._found:
+            self._found[key] = find()
+        return self._found[key]
         
     def get_rarity_dir(self, rarity: str) -> Path:
         """Get the directory for a specific rarity's assets."""
@@ -171,54 +194,38 @@ class PathResolver:
         """Get the directory containing calling icons."""
         return self.assets_dir / "calling"
     
-    def get_base_shape(self, rarity: str = "3star") -> Path:
-        """Get the base shape file (check rarity folder first, then common)."""
-        # Check in rarity folder first
-        rarity_path = self.assets_dir / rarity / CardConfig.LAYER_CONFIG["base_shape"]["pattern"]
-        if rarity_path.exists():
-            return rarity_path
-        # Fallback to 3star
-        return self.assets_dir / "3star" / CardConfig.LAYER_CONFIG["base_shape"]["pattern"]
+    def get_base_shape(self, rarity: str = "3star") -> Optional[Path]:
+        """Get the base shape file (check rarity folder first, then 3star); None if neither exists."""
+        pattern = CardConfig.LAYER_CONFIG["base_shape"]["pattern"]
+        return self._asset(rarity, pattern) or self._asset("3star", pattern)
     
     def find_character(self, character_name: str) -> Optional[Path]:
-        """Find a character image by name (fuzzy matching)."""
-        primals_dir = self.get_primals_dir()
-        if not primals_dir.exists():
-            return None
-            
-        # Normalize search term
-        search_term = character_name.lower().replace(" ", "").replace("_", "")
-        
-        # Search for matching files
-        for file in primals_dir.iterdir():
-            if file.is_file() and file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.webp']:
-                file_normalized = file.stem.lower().replace(" ", "").replace("_", "")
-                if search_term in file_normalized or file_normalized in search_term:
-                    return file
-        return None
+        """Find a character image by name (best fuzzy match, see resolve_character)."""
+        match = self.resolve_character(character_name).match
+        return match.path if match else None
+    
+    def resolve_character(self, character_name: str) -> CharacterResolution:
+        """Ranked character matches for a name, with ambiguity flagged (trigram index of primals/)."""
+        return index_for(self.manifest, "sorcerycardref/primals").resolve(character_name)
     
     def find_calling_icon(self, calling: str) -> Optional[Path]:
         """Find a calling icon by name."""
-        calling_dir = self.get_calling_dir()
-        
-        # Try exact pattern first
-        pattern = f"icon_calling_{calling}.png"
-        exact_path = calling_dir / pattern
-        if exact_path.exists():
-            return exact_path
+        # Exact pattern first, then case-insensitive
+        pattern = f"sorcerycardref/calling/icon_calling_{calling}.png"
+        entry = self.manifest.entry(pattern) or self.manifest.entry_ci(pattern)
+        if entry:
+            return entry.path
         
-        # Case-insensitive search
+        # Also fuzzy match
         calling_lower = calling.lower()
-        pattern_lower = f"icon_calling_{calling_lower}.png"
         
-        if calling_dir.exists():
-            for file in calling_dir.iterdir():
-                if file.is_file() and file.name.lower() == pattern_lower:
-                    return file
-                # Also fuzzy match
-                if file.is_file() and calling_lower in file.stem.lower():
-                    return file
-        return None
+        def find():
+            for entry in self.manifest.files("sorcerycardref/calling"):
+                if calling_lower in entry.stem.lower():
+                    return entry.path
+            return None
+        
+        return self._memo("calling", calling_lower, find)
     
     def get_rarity_asset(self, rarity: str, asset_type: str) -> Optional[Path]:
         """Get a rarity-specific asset (border, pip, black_border)."""
@@ -226,9 +233,17 @@ class PathResolver:
         if not config or not config["pattern"]:
             return None
             
-        pattern = config["pattern"].format(rarity=rarity)
-        path = self.get_rarity_dir(rarity) / pattern
-        return path if path.exists() else None
+        return self._asset(rarity, config["pattern"].format(rarity=rarity))
+    
+    def list_characters(self) -> List[Path]:
+        return [e.path for e in self.manifest.files("sorcerycardref/primals")
+                if e.path.suffix.lower() in CHARACTER_SUFFIXES]
+    
+    def list_calling_icons(self) -> List[Path]:
+        return [e.path for e in self.manifest.files("sorcerycardref/calling")]
+    
+    def has_rarity(self, rarity: str) -> bool:
+        return bool(self.manifest.files(f"sorcerycardref/{rarity}"))
 
 
 # =============================================================================
@@ -238,87 +253,23 @@ class PathResolver:
 class CommandParser:
     """Parses natural language commands to extract card generation parameters."""
     
-    # Patterns for extracting components
-    RARITY_PATTERNS = [
-        r'(\d)\s*star',
-        r'(\d)-star',
-        r'rarity[:\s]+(\d)',
-    ]
-    
-    CALLING_PATTERNS = [
-        r'calling[:\s]+(\w+)',
-        r'type[:\s]+(\w+)',
-        r'class[:\s]+(\w+)',
-    ]
-    
-    def __init__(self):
-        self.known_callings = [c.lower() for c in CardConfig.CALLINGS]
-    
     def parse(self, command: str) -> Dict[str, Any]:
         """
-        Parse a natural language command into structured parameters.
+        Parse a natural language command into structured parameters
+        (rules shared with the chat API, see request_grammar.parse_card).
         
         Examples:
             "give me a card for frost queen 3 star calling cunning"
             "create frost queen 3star cunning"
             "frost queen, rarity: 3, calling: Cunning"
         """
-        command_lower = command.lower().strip()
-        result = {
-            "character": None,
-            "rarity": None,
-            "calling": None,
+        intent = parse_card(command)
+        return {
+            "character": intent.character or None,
+            "rarity": intent.rarity,
+            "calling": intent.calling,
             "raw_command": command
         }
-        
-        # Extract rarity
-        for pattern in self.RARITY_PATTERNS:
-            match = re.search(pattern, command_lower)
-            if match:
-                rarity_num = match.group(1)
-                result["rarity"] = f"{rarity_num}star"
-                break
-        
-        # Extract calling - check for known callings in the text
-        for calling in self.known_callings:
-            if calling in command_lower:
-                result["calling"] = calling.capitalize()
-                break
-        
-        # If not found, try patterns
-        if not result["calling"]:
-            for pattern in self.CALLING_PATTERNS:
-                match = re.search(pattern, command_lower)
-                if match:
-                    result["calling"] = match.group(1).capitalize()
-                    break
-        
-        # Extract character name (most complex)
-        # Remove known components to isolate character name
-        cleaned = command_lower
-        
-        # Remove rarity mentions
-        cleaned = re.sub(r'\d\s*star', '', cleaned)
-        cleaned = re.sub(r'\d-star', '', cleaned)
-        
-        # Remove calling mentions
-        cleaned = re.sub(r'calling[:\s]+\w+', '', cleaned)
-        for calling in self.known_callings:
-            cleaned = cleaned.replace(calling, '')
-        
-        # Remove common command words
-        remove_words = ['give', 'me', 'a', 'card', 'for', 'create', 'generate', 'make', 'rarity', 'type', 'class']
-        for word in remove_words:
-            cleaned = re.sub(rf'\b{word}\b', '', cleaned)
-        
-        # Clean up and get character name
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-        cleaned = re.sub(r'[^\w\s]', '', cleaned).strip()
-        
-        if cleaned:
-            result["character"] = cleaned.title()
-        
-        return result
 
 
 # =============================================================================
@@ -502,8 +453,8 @@ class CardCompositor:
         
         # Layer 1: Black border (background)
         black_border_path = self.resolver.get_rarity_asset(rarity, "black_border")
-        if black_border_path and black_border_path.exists():
-            black_border = Image.open(black_border_path).convert('RGBA')
+        if black_border_path:
+            black_border = open_asset(black_border_path).convert('RGBA')
             self._center_paste(canvas, black_border)
         
         # Layer 2: Character (masked to base shape)
@@ -515,16 +466,16 @@ class CardCompositor:
         
         # Layer 3: Decorative border
         border_path = self.resolver.get_rarity_asset(rarity, "border")
-        if border_path and border_path.exists():
-            border = Image.open(border_path).convert('RGBA')
+        if border_path:
+            border = open_asset(border_path).convert('RGBA')
             # Border offset from config: (19, 0)
             border_offset = CardConfig.LAYER_CONFIG["border"]["offset"]
             canvas.alpha_composite(border, border_offset)
         
         # Layer 4: Pip (rarity stars) - bottom center
         pip_path = self.resolver.get_rarity_asset(rarity, "pip")
-        if pip_path and pip_path.exists():
-            pip = Image.open(pip_path).convert('RGBA')
+        if pip_path:
+            pip = open_asset(pip_path).convert('RGBA')
             pip = self._resize_icon(pip, "pip")
             pip_w, pip_h = pip.size
             pip_x = (canvas_w - pip_w) // 2
@@ -533,8 +484,8 @@ class CardCompositor:
         
         # Layer 5: Calling icon - top center
         calling_path = self.resolver.find_calling_icon(calling)
-        if calling_path and calling_path.exists():
-            calling_icon = Image.open(calling_path).convert('RGBA')
+        if calling_path:
+            calling_icon = open_asset(calling_path).convert('RGBA')
             calling_icon = self._resize_icon(calling_icon, "calling")
             calling_w, calling_h = calling_icon.size
             calling_x = (canvas_w - calling_w) // 2
@@ -576,7 +527,18 @@ class SorceryCardGenerator:
             calling=params["calling"]
         )
     
-    def generate(self, character: str, rarity: str, calling: str) -> Optional[Path]:
+    def generate_intent(self, intent: CardIntent,
+                        resolution: Optional[CharacterResolution] = None) -> Optional[Path]:
+        """Generate a card from an already-parsed CardIntent (rarity defaults to 3star)."""
+        if not intent.character:
+            raise ValueError("Character name is required for card generation")
+        if not intent.calling:
+            raise ValueError("Calling type is required for card generation")
+        return self.generate(character=intent.character, rarity=intent.rarity or "3star", calling=intent.calling,
+                             resolution=resolution)
+    
+    def generate(self, character: str, rarity: str, calling: str,
+                 resolution: Optional[CharacterResolution] = None) -> Optional[Path]:
         """
         Generate a card with the specified parameters.
         
@@ -584,6 +546,8 @@ class SorceryCardGenerator:
             character: Character name (will be fuzzy matched to find image)
             rarity: Card rarity ("3star", "4star", "5star")
             calling: Character calling/class type
+            resolution: resolver.resolve_character(character), if the caller
+                already has it (e.g. to report the candidates)
             
         Returns:
             Path to the generated card image
@@ -601,27 +565,31 @@ class SorceryCardGenerator:
             raise ValueError(f"Invalid rarity: {rarity}. Must be one of {CardConfig.RARITIES}")
         
         # Find character image
-        character_path = self.resolver.find_character(character)
-        if not character_path:
+        if resolution is None:
+            resolution = self.resolver.resolve_character(character)
+        if not resolution.match:
             raise FileNotFoundError(f"Could not find character image for: {character}")
+        character_path = resolution.match.path
+        if resolution.ambiguous:
+            print(f"[!] '{character}' is ambiguous: {resolution.describe()} - using {character_path.name}")
         print(f"[✓] Found character: {character_path.name}")
         
         # Load base shape
         base_shape_path = self.resolver.get_base_shape(rarity)
-        if not base_shape_path.exists():
-            raise FileNotFoundError(f"Base shape not found: {base_shape_path}")
-        base_shape = Image.open(base_shape_path).convert('RGBA')
+        if base_shape_path is None:
+            raise FileNotFoundError(f"Base shape not found for {rarity}")
+        base_shape = open_asset(base_shape_path).convert('RGBA')
         print(f"[✓] Loaded base shape: {base_shape_path.name}")
         
         # Verify rarity assets exist
         border_path = self.resolver.get_rarity_asset(rarity, "border")
-        if not border_path or not border_path.exists():
+        if not border_path:
             print(f"[!] Warning: Border not found for {rarity}")
         else:
             print(f"[✓] Found border: {border_path.name}")
         
         pip_path = self.resolver.get_rarity_asset(rarity, "pip")
-        if not pip_path or not pip_path.exists():
+        if not pip_path:
             print(f"[!] Warning: Pip not found for {rarity}")
         else:
             print(f"[✓] Found pip: {pip_path.name}")
@@ -633,7 +601,7 @@ class SorceryCardGenerator:
             print(f"[✓] Found calling icon: {calling_path.name}")
         
         # Load character image
-        character_img = Image.open(character_path).convert('RGBA')
+        character_img = open_asset(character_path).convert('RGBA')
         print(f"[✓] Loaded character image: {character_img.size}")
         
         # Composite the card
@@ -654,7 +622,7 @@ class SorceryCardGenerator:
         output_filename = f"{char_clean}_front_merge.png"
         output_path = self.resolver.output_dir / output_filename
         
-        card.save(output_path, "PNG")
+        OUTPUT_STORE.save_image(output_path, card)
         print(f"\n[✓] SUCCESS: Saved to {output_path}")
         
         return output_path
@@ -668,26 +636,20 @@ class SorceryCardGenerator:
         }
         
         # Find characters
-        primals_dir = self.resolver.get_primals_dir()
-        if primals_dir.exists():
-            for f in primals_dir.iterdir():
-                if f.is_file() and f.suffix.lower() in ['.png', '.jpg', '.jpeg', '.webp']:
-                    assets["characters"].append(f.stem)
+        for f in self.resolver.list_characters():
+            assets["characters"].append(f.stem)
         
         # Find callings
-        calling_dir = self.resolver.get_calling_dir()
-        if calling_dir.exists():
-            for f in calling_dir.iterdir():
-                if f.is_file() and "calling" in f.stem.lower():
-                    # Extract calling name from filename
-                    name = f.stem.replace("icon_calling_", "").replace("icon_", "")
-                    assets["callings"].append(name)
+        for f in self.resolver.list_calling_icons():
+            if "calling" in f.stem.lower():
+                # Extract calling name from filename
+                name = f.stem.replace("icon_calling_", "").replace("icon_", "")
+                assets["callings"].append(name)
         
         # Check rarities
         for rarity in CardConfig.RARITIES:
-            rarity_dir = self.resolver.get_rarity_dir(rarity)
             assets["rarities"][rarity] = {
-                "available": rarity_dir.exists(),
+                "available": self.resolver.has_rarity(rarity),
                 "has_border": self.resolver.get_rarity_asset(rarity, "border") is not None,
                 "has_pip": self.resolver.get_rarity_asset(rarity, "pip") is not None,
                 "has_black_border": self.resolver.get_rarity_asset(rarity, "black_border") is not None
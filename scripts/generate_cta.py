@@ -2,8 +2,9 @@
 """
 CTA Button Generator (PIL-Based)
 =================================
-Generates Primary and Secondary CTA buttons using PIL for text rendering
-and optional Google Gemini API for color variations.
+Generates Primary and Secondary CTA buttons using PIL for text rendering.
+Color variations are recolored locally in OkLCh, with the Google Gemini API
+as an optional fallback (CTA_RECOLOR_ENGINE=model, or unrecognized colors).
 
 Based on Figma Design Specs:
 - Frame: "Secondary CTA" (node 9048:232)
@@ -18,12 +19,16 @@ Usage:
 """
 
 import os
+import asyncio
 import argparse
 from pathlib import Path
 from dataclasses import dataclass
 from typing import Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 
+from asset_bundle import open_asset
+from output_store import OUTPUT_STORE
+
 # =============================================================================
 # FIGMA SOURCE OF TRUTH
 # =============================================================================
@@ -57,6 +62,9 @@ class FigmaSpec:
 
 FIGMA = FigmaSpec()
 
+# "local" recolors the frame in OkLCh; "model" sends the finished button to Gemini
+RECOLOR_ENGINE = os.getenv("CTA_RECOLOR_ENGINE", "local")
+
 
 # =============================================================================
 # CONFIGURATION
@@ -172,7 +180,7 @@ class ExactImageLoader:
         """Load image ensuring consistent mode."""
         if not path.exists():
             raise FileNotFoundError(f"Asset not found: {path}")
-        img = Image.open(path)
+        img = open_asset(path)
         if img.mode != mode:
             img = img.convert(mode)
         return img
@@ -286,7 +294,7 @@ class CTACompositor:
     Composites CTA button layers using exact positioning.
     
     Layer stack (bottom to top):
-    1. Button frame (background texture)
+    1. Button frame (background texture, optionally recolored)
     2. Text layer (centered white text)
     """
     
@@ -294,14 +302,20 @@ class CTACompositor:
         self.resolver = resolver
         self.loader = ExactImageLoader()
         self.text_renderer = CTATextRenderer(resolver.get_font())
+        # Recolored frames, keyed by (frame file, color, lightness)
+        self._recolored_frames = {}
     
-    def composite(self, config: CTAConfig, text: str) -> Image.Image:
+    def composite(self, config: CTAConfig, text: str, color: Optional[str] = None,
+                  recolorizer: Optional['LocalRecolorizer'] = None) -> Image.Image:
         """
         Composite a complete CTA button with text.
         
         Args:
             config: CTA button configuration
             text: Text to display (will be uppercased)
+            color: Optional color for the frame (needs recolorizer)
+            recolorizer: Local recolorizer applied to the frame before the
+                text goes on, so the text is never recolored
             
         Returns:
             Final composited button image
@@ -315,6 +329,12 @@ class CTACompositor:
         
         print(f"  ✓ Loaded frame: {frame_path.name} ({frame.size[0]}x{frame.size[1]})")
         
+        if color and recolorizer:
+            key = (config.filename, color.strip().lower(), recolorizer.lightness)
+            if key not in self._recolored_frames:
+                self._recolored_frames[key] = recolorizer.recolor(frame, color)
+            frame = self._recolored_frames[key]
+        
         # Fixed padding values
         print(f"  ✓ Padding: H={FIGMA.PADDING_X_MAX}px (max), V={FIGMA.PADDING_Y}px (fixed)")
         
@@ -338,6 +358,146 @@ class CTACompositor:
         return result
 
 
+# =============================================================================
+# COLOR RECOLORIZER (Local, OkLCh)
+# =============================================================================
+
+def parse_color(color: str) -> Tuple[int, int, int]:
+    """
+    Parse a color request into RGB.
+    
+    Accepts hex ("#c9a227", "c9a227", "#fc0") and CSS color names, with
+    spaces/dashes ignored ("royal blue", "dark-red").
+    """
+    from PIL import ImageColor
+    
+    text = color.strip().lower()
+    candidates = [text, "".join(text.replace("-", " ").split())]
+    if all(ch in "0123456789abcdef" for ch in text) and len(text) in (3, 6):
+        candidates.insert(0, f"#{text}")
+    for candidate in candidates:
+        try:
+            return ImageColor.getrgb(candidate)[:3]
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized color '{color}'")
+
+
+# sRGB <-> OkLab (Björn Ottosson, 2020)
+_LMS_FROM_LINEAR = (
+    (0.4122214708, 0.5363325363, 0.0514459929),
+    (0.2119034982, 0.6806995451, 0.1073969566),
+    (0.0883024619, 0.2817188376, 0.6299787005),
+)
+_LAB_FROM_LMS = (
+    (0.2104542553, 0.7936177850, -0.0040720468),
+    (1.9779984951, -2.4285922050, 0.4505937099),
+    (0.0259040371, 0.7827717662, -0.8086757660),
+)
+
+
+def srgb_to_oklab(rgb):
+    """uint8/float RGB array (..., 3) in 0-255 -> OkLab float array."""
+    import numpy as np
+    
+    c = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    lms = np.cbrt(linear @ np.array(_LMS_FROM_LINEAR, dtype=np.float32).T)
+    return lms @ np.array(_LAB_FROM_LMS, dtype=np.float32).T
+
+
+def oklab_to_linear(lab):
+    """OkLab -> linear sRGB (unclipped, so callers can test the gamut)."""
+    import numpy as np
+    
+    lms = lab @ np.linalg.inv(np.array(_LAB_FROM_LMS, dtype=np.float64)).T.astype(np.float32)
+    return (lms ** 3) @ np.linalg.inv(np.array(_LMS_FROM_LINEAR, dtype=np.float64)).T.astype(np.float32)
+
+
+def linear_to_srgb(linear):
+    import numpy as np
+    
+    c = np.clip(linear, 0.0, 1.0)
+    c = np.where(c <= 0.0031308, c * 12.92, 1.055 * np.power(c, 1 / 2.4) - 0.055)
+    return np.round(c * 255.0).astype(np.uint8)
+
+
+class LocalRecolorizer:
+    """
+    Recolors a button frame in OkLCh without a model call.
+    
+    The frame's dominant surface color is measured from its central region.
+    Pixels close to that hue and chroma take the target hue, with chroma
+    scaled so the surface reaches the target's chroma; OkLab lightness is
+    kept, so the texture and shading are untouched. Low-chroma pixels
+    (stone borders, white embellishments) fall outside the mask and are
+    preserved. Out-of-gamut results are pulled in by reducing chroma.
+    
+    lightness (0-1) optionally moves the surface's mean lightness toward
+    the target's, for targets much lighter or darker than the frame.
+    """
+    
+    def __init__(self, lightness: float = 0.0):
+        self.lightness = lightness
+    
+    def recolor(self, frame: Image.Image, target_color: str) -> Image.Image:
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("Local recoloring requires numpy: pip install numpy")
+        
+        target_rgb = parse_color(target_color)
+        
+        rgba = np.asarray(frame.convert("RGBA"))
+        lab = srgb_to_oklab(rgba[..., :3])
+        chroma = np.hypot(lab[..., 1], lab[..., 2])
+        hue = np.arctan2(lab[..., 2], lab[..., 1])
+        
+        # Reference surface: opaque pixels in the central half of the frame
+        height, width = chroma.shape
+        center = (slice(height // 4, 3 * height // 4), slice(width // 4, 3 * width // 4))
+        opaque = rgba[center][..., 3] > 200
+        surface_chroma = float(np.median(chroma[center][opaque]))
+        surface_hue = float(np.angle(np.exp(1j * hue[center][opaque]).mean()))
+        surface_light = float(np.median(lab[center][..., 0][opaque]))
+        
+        target = srgb_to_oklab(np.array(target_rgb, dtype=np.float32))
+        target_chroma = float(np.hypot(target[1], target[2]))
+        target_hue = float(np.arctan2(target[2], target[1]))
+        
+        # Surface mask: enough chroma, and a hue near the surface's
+        weight = np.clip((chroma - 0.3 * surface_chroma) / (0.3 * surface_chroma), 0.0, 1.0)
+        weight *= np.clip((np.cos(hue - surface_hue) - 0.5) / 0.3, 0.0, 1.0)
+        
+        new_chroma = chroma * (target_chroma / max(surface_chroma, 1e-4))
+        new_light = np.clip(lab[..., 0] + self.lightness * (float(target[0]) - surface_light), 0.0, 1.0)
+        cos_h, sin_h = np.cos(target_hue), np.sin(target_hue)
+        
+        def in_gamut(light, c):
+            linear = oklab_to_linear(np.stack([light, c * cos_h, c * sin_h], axis=-1))
+            return ((linear >= -1e-4) & (linear <= 1 + 1e-4)).all(axis=-1)
+        
+        # Reduce chroma where the result falls outside sRGB (bisection on the out-of-gamut pixels only)
+        outside = ~in_gamut(new_light, new_chroma) & (weight > 0)
+        if outside.any():
+            light, c = new_light[outside], new_chroma[outside]
+            low, high = np.zeros_like(c), np.ones_like(c)
+            for _ in range(5):
+                mid = (low + high) / 2
+                inside = in_gamut(light, c * mid)
+                low = np.where(inside, mid, low)
+                high = np.where(inside, high, mid)
+            new_chroma[outside] = c * low
+        
+        recolored = np.stack([new_light, new_chroma * cos_h, new_chroma * sin_h], axis=-1)
+        blended = lab + weight[..., None] * (recolored - lab)
+        rgb = linear_to_srgb(oklab_to_linear(blended))
+        result = Image.fromarray(np.dstack([rgb, rgba[..., 3]]), "RGBA")
+        print(f"  ✓ Local recolor to {target_color} {target_rgb} "
+              f"({weight.mean() * 100:.0f}% of pixels in surface mask)")
+        return result
+
+
 # =============================================================================
 # COLOR RECOLORIZER (AI-Based, Optional)
 # =============================================================================
@@ -355,18 +515,15 @@ class ColorRecolorizer:
     @property
     def client(self):
         if self._client is None:
-            from google import genai
-            self._client = genai.Client(api_key=self.api_key)
+            from gemini_client import get_client
+            self._client = get_client(self.api_key)
         return self._client
     
-    def recolor(self, image: Image.Image, target_color: str, 
-                button_type: str) -> Image.Image:
-        """
-        Recolor a button using AI while preserving texture.
-        """
-        from google.genai import types
-        
-        prompt = f"""
+    MODEL_ID = "gemini-3-pro-image-preview"
+    
+    @staticmethod
+    def build_prompt(target_color: str, button_type: str) -> str:
+        return f"""
 Recolor this {button_type} CTA button to {target_color}.
 
 CRITICAL REQUIREMENTS:
@@ -381,18 +538,26 @@ CRITICAL REQUIREMENTS:
 
 The result should look like the same button, just with a different color scheme.
 """
-        
-        print(f"  → Sending recolor request to Gemini API...")
-        
-        response = self.client.models.generate_content(
-            model="gemini-3-pro-image-preview",
-            contents=[prompt, image],
-            config=types.GenerateContentConfig(
-                response_modalities=['TEXT', 'IMAGE'],  # Need BOTH modalities
-            )
+    
+    @staticmethod
+    def encode(image: Image.Image, button_type: str):
+        """Encode once ourselves (capped at the frame's size) instead of letting the SDK re-encode."""
+        from reference_payloads import PayloadReport, encode_image
+        report = PayloadReport()
+        payload = encode_image(image, name=f"{button_type}_cta",
+                               max_side=max(FIGMA.PRIMARY_WIDTH, FIGMA.SECONDARY_WIDTH), report=report)
+        return payload, report
+    
+    @staticmethod
+    def request_config():
+        from google.genai import types
+        return types.GenerateContentConfig(
+            response_modalities=['TEXT', 'IMAGE'],  # Need BOTH modalities
         )
-        
-        # Extract image from response
+    
+    @staticmethod
+    def extract_image(response, image: Image.Image):
+        """First image in the response, or the original if the model returned none."""
         for part in response.parts:
             try:
                 result_image = part.as_image()
@@ -404,6 +569,49 @@ The result should look like the same button, just with a different color scheme.
         
         print(f"  ⚠ Recolor failed, returning original")
         return image
+    
+    def recolor(self, image: Image.Image, target_color: str, 
+                button_type: str) -> Image.Image:
+        """
+        Recolor a button using AI while preserving texture.
+        """
+        from gemini_client import call_model_sync
+        from reference_payloads import reference_part
+        
+        payload, report = self.encode(image, button_type)
+        image_part = reference_part(payload, self.client, report)
+        
+        print(f"  → Sending recolor request to Gemini API ({report.summary()})...")
+        
+        response = call_model_sync(
+            lambda: self.client.models.generate_content(
+                model=self.MODEL_ID,
+                contents=[self.build_prompt(target_color, button_type), image_part],
+                config=self.request_config(),
+            ),
+            op="cta_recolor",
+        )
+        return self.extract_image(response, image)
+    
+    async def recolor_async(self, image: Image.Image, target_color: str,
+                            button_type: str) -> Image.Image:
+        """Async recolor() on the SDK's native async client, via call_model()."""
+        from gemini_client import call_model
+        from reference_payloads import reference_part_async
+        
+        payload, report = self.encode(image, button_type)
+        image_part = await reference_part_async(payload, self.client, report)
+        
+        print(f"  → Sending recolor request to Gemini API ({report.summary()})...")
+        response = await call_model(
+            lambda: self.client.aio.models.generate_content(
+                model=self.MODEL_ID,
+                contents=[self.build_prompt(target_color, button_type), image_part],
+                config=self.request_config(),
+            ),
+            op="cta_recolor",
+        )
+        return self.extract_image(response, image)
 
 
 # =============================================================================
@@ -415,12 +623,15 @@ class CTAGenerator:
     Main CTA button generator.
     
     Uses PIL for text rendering (fast, consistent)
-    Uses AI only for color changes (optional)
+    Recolors locally in OkLCh; the model is an optional fallback
     """
     
-    def __init__(self, base_dir: Optional[str] = None, api_key: Optional[str] = None):
+    def __init__(self, base_dir: Optional[str] = None, api_key: Optional[str] = None,
+                 recolor_engine: Optional[str] = None, lightness: float = 0.0):
         self.resolver = PathResolver(base_dir)
         self.compositor = CTACompositor(self.resolver)
+        self.recolor_engine = (recolor_engine or RECOLOR_ENGINE).lower()
+        self.local_recolorizer = LocalRecolorizer(lightness)
         self.recolorizer = ColorRecolorizer(api_key) if api_key else None
     
     def generate(self, button_type: str, text: str, 
@@ -432,12 +643,50 @@ class CTAGenerator:
         Args:
             button_type: "primary" or "secondary"
             text: Button text
-            color: Optional color override (triggers AI recoloring)
+            color: Optional color override (local recolor, model as fallback)
             output_name: Optional custom output filename
             
         Returns:
             Path to generated button image
         """
+        result, recolored = self.composite(button_type, text, color)
+        
+        # Step 2: Recolor with the model if requested and not already done locally
+        if color and not recolored:
+            print(f"\nStep 2: Recoloring to {color}...")
+            if self.recolorizer:
+                result = self.recolorizer.recolor(result, color, button_type)
+            else:
+                print("  ⚠ No API key provided, skipping recolor")
+        
+        return self.save(result, button_type, text, color, output_name)
+    
+    async def generate_async(self, button_type: str, text: str,
+                             color: Optional[str] = None,
+                             output_name: Optional[str] = None) -> Optional[Path]:
+        """
+        Async generate(): compositing and saving run in a worker thread, while the
+        recolor call awaits the SDK's async client instead of blocking one.
+        """
+        result, recolored = await asyncio.to_thread(self.composite, button_type, text, color)
+        
+        if color and not recolored:
+            print(f"\nStep 2: Recoloring to {color}...")
+            if self.recolorizer:
+                result = await self.recolorizer.recolor_async(result, color, button_type)
+            else:
+                print("  ⚠ No API key provided, skipping recolor")
+        
+        return await asyncio.to_thread(self.save, result, button_type, text, color, output_name)
+    
+    def composite(self, button_type: str, text: str,
+                  color: Optional[str] = None) -> Tuple[Image.Image, bool]:
+        """
+        Validate the request and composite the button with its text (step 1).
+        
+        Returns (image, recolored): recolored is True when the frame was
+        recolored locally, so no model recolor is needed.
+        """
         print(f"\n{'='*60}")
         print(f"CTA BUTTON GENERATOR (PIL)")
         print(f"{'='*60}")
@@ -454,19 +703,21 @@ class CTAGenerator:
         
         config = CTA_TYPES[button_type.lower()]
         
-        # Step 1: Composite button with text (PIL)
-        print("Step 1: Compositing button with text...")
-        result = self.compositor.composite(config, text)
-        
-        # Step 2: Recolor if requested (AI)
-        if color:
-            print(f"\nStep 2: Recoloring to {color}...")
-            if self.recolorizer:
-                result = self.recolorizer.recolor(result, color, button_type)
-            else:
-                print("  ⚠ No API key provided, skipping recolor")
+        recolorizer = None
+        if color and self.recolor_engine == "local":
+            try:
+                parse_color(color)
+                recolorizer = self.local_recolorizer
+            except ValueError as e:
+                print(f"  ⚠ {e} - falling back to model recolor")
         
-        # Step 3: Save output
+        # Step 1: Composite button with text (PIL), recoloring the frame first
+        print("Step 1: Compositing button with text...")
+        return self.compositor.composite(config, text, color, recolorizer), recolorizer is not None
+    
+    def save(self, result, button_type: str, text: str, color: Optional[str] = None,
+             output_name: Optional[str] = None) -> Path:
+        """Write the finished button to the output directory (step 3)."""
         print("\nStep 3: Saving output...")
         self.resolver.output_dir.mkdir(parents=True, exist_ok=True)
         
@@ -474,14 +725,9 @@ class CTAGenerator:
             output_path = self.resolver.output_dir / f"{output_name}.png"
         else:
             output_path = self.resolver.get_output_path(button_type, text, color)
-        # Handle different image types (PIL vs Gemini SDK)
+        # PIL images are encoded as PNG; Gemini SDK images are stored as returned
         if hasattr(result, 'save') and callable(result.save):
-            try:
-                # Try PIL-style save first
-                result.save(output_path, "PNG")
-            except TypeError:
-                # Fall back to Gemini SDK style save (takes only path)
-                result.save(str(output_path))
+            OUTPUT_STORE.save_image(output_path, result)
         
         print(f"\n{'='*60}")
         print(f"✓ SUCCESS: {output_path}")
@@ -536,7 +782,11 @@ Examples:
     parser.add_argument("--type", "-t", choices=["primary", "secondary"],
                         help="Button type")
     parser.add_argument("--text", "-x", help="Button text")
-    parser.add_argument("--color", "-c", help="Color override (uses AI)")
+    parser.add_argument("--color", "-c", help="Color override (name or hex)")
+    parser.add_argument("--engine", choices=["local", "model"],
+                        help="Recolor engine (default: CTA_RECOLOR_ENGINE or local)")
+    parser.add_argument("--lightness", type=float, default=0.0,
+                        help="Local recolor: move surface lightness toward the color (0-1)")
     parser.add_argument("--output", "-o", help="Custom output filename")
     parser.add_argument("--list", "-l", action="store_true", 
                         help="List available options")
@@ -546,7 +796,7 @@ Examples:
     # Get API key for recoloring (optional)
     api_key = os.getenv("GOOGLE_API_KEY")
     
-    generator = CTAGenerator(api_key=api_key)
+    generator = CTAGenerator(api_key=api_key, recolor_engine=args.engine, lightness=args.lightness)
     
     if args.list:
         generator.list_available()
@@ -27,6 +27,9 @@ Usage:
     
     # View current specs
     python3 generate_gacha.py --show-specs
+    
+    # Batch mode: one pull spec per line, rendered in a single session
+    python3 generate_gacha.py --batch pulls.txt --workers 4
 
 Output structure:
     output/
@@ -37,6 +40,13 @@ Output structure:
         ├── awaken_button.png
         └── [card assets used]
 
+Batch output structure:
+    output/gacha/batch_<timestamp>/
+    ├── manifest.json            # Every pull: spec, cards, outputs, status
+    ├── assets/                  # Shared 2D assets (copied once)
+    ├── pull_00000_1p9s.png
+    └── pull_00000_1p9s.html     # References ../assets instead of inlining
+
 Called by the Gacha Droid with natural language like:
     "generate a gacha with 2 primals"
     "sync from figma and generate a gacha with 1 primal"
@@ -49,13 +59,24 @@ import json
 import argparse
 import base64
 import re
-import shutil
 import subprocess
+import time
 from pathlib import Path
 from dataclasses import dataclass, field, asdict
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from enum import Enum, auto
+import io
+import math
+import struct
+import zlib
+
+from PIL import Image, ImageEnhance
+
+from asset_bundle import open_asset
+from asset_manifest import asset_exists, manifest_for
+from output_store import OUTPUT_STORE
+from request_grammar import GACHA_PULL_SIZE, GACHA_RARITY, GachaIntent, parse_gacha
 
 
 # =============================================================================
@@ -307,54 +328,31 @@ class GachaPull:
 
 
 class GachaPullParser:
-    RARITY_MAP = {
-        "5star": 5, "5-star": 5, "legendary": 5, "gold": 5, "ssr": 5,
-        "4star": 4, "4-star": 4, "epic": 4, "purple": 4, "sr": 4,
-        "3star": 3, "3-star": 3, "rare": 3, "blue": 3, "common": 3, "r": 3,
+    RARITY_MAP = GACHA_RARITY
+    TYPE_MAP = {
+        'primal_5star': CardType.PRIMAL_5STAR,
+        'primal_4star': CardType.PRIMAL_4STAR,
+        'primal_3star': CardType.PRIMAL_3STAR,
+        'sorcery_5star': CardType.SORCERY_5STAR,
+        'sorcery_4star': CardType.SORCERY_4STAR,
+        'sorcery_3star': CardType.SORCERY_3STAR,
     }
     
     def parse(self, spec: str) -> GachaPull:
-        spec_lower = spec.lower()
-        cards = []
-        
-        pattern = r'(\d+)\s*(?:x\s*)?(\d+[- ]?star|legendary|epic|rare|common|gold|purple|blue|ssr|sr|r)?\s*(primal|sorcery|primals|sorcerys|sorceries)'
-        matches = re.findall(pattern, spec_lower)
-        
-        for count_str, rarity_str, card_type_str in matches:
-            count = int(count_str)
-            rarity = 3
-            if rarity_str:
-                rarity_key = rarity_str.replace(" ", "").replace("-", "")
-                rarity = self.RARITY_MAP.get(rarity_key, 3)
-            
-            is_primal = "primal" in card_type_str
-            
-            if is_primal:
-                card_type = {5: CardType.PRIMAL_5STAR, 4: CardType.PRIMAL_4STAR}.get(rarity, CardType.PRIMAL_3STAR)
-            else:
-                card_type = {5: CardType.SORCERY_5STAR, 4: CardType.SORCERY_4STAR}.get(rarity, CardType.SORCERY_3STAR)
-            
-            cards.extend([card_type] * count)
-        
-        cards.sort(key=lambda c: (0 if CARD_ASSETS[c].is_primal else 1, -CARD_ASSETS[c].rarity))
-        return GachaPull(cards=cards[:10])
+        """Pull spec -> GachaPull (rules shared with the chat API, see request_grammar.parse_gacha)."""
+        return self.from_intent(parse_gacha(spec))
+    
+    def from_intent(self, intent: GachaIntent) -> GachaPull:
+        return self.create_pull(**intent.counts())
     
     def create_pull(self, **kwargs) -> GachaPull:
         cards = []
-        type_map = {
-            'primal_5star': CardType.PRIMAL_5STAR,
-            'primal_4star': CardType.PRIMAL_4STAR,
-            'primal_3star': CardType.PRIMAL_3STAR,
-            'sorcery_5star': CardType.SORCERY_5STAR,
-            'sorcery_4star': CardType.SORCERY_4STAR,
-            'sorcery_3star': CardType.SORCERY_3STAR,
-        }
-        for key, card_type in type_map.items():
+        for key, card_type in self.TYPE_MAP.items():
             count = kwargs.get(key, 0)
             cards.extend([card_type] * count)
         
         cards.sort(key=lambda c: (0 if CARD_ASSETS[c].is_primal else 1, -CARD_ASSETS[c].rarity))
-        return GachaPull(cards=cards[:10])
+        return GachaPull(cards=cards[:GACHA_PULL_SIZE])
 
 
 # =============================================================================
@@ -367,19 +365,34 @@ class DynamicHTMLGenerator:
     Specs are loaded from gacha_figma_specs.json.
     """
     
-    def __init__(self, specs: GachaFigmaSpecs, assets_dir: Path):
+    def __init__(self, specs: GachaFigmaSpecs, assets_dir: Path, asset_href: Optional[str] = None):
+        """
+        Args:
+            specs: Cached Figma specs
+            assets_dir: Directory holding the source 2D assets
+            asset_href: If set, reference assets as "{asset_href}/{filename}"
+                        instead of inlining them as data URIs (batch mode)
+        """
         self.specs = specs
         self.assets_dir = assets_dir
+        self.asset_href = asset_href
+        self._data_uris: Dict[str, str] = {}
     
     def _get_asset_data_uri(self, filename: str) -> str:
+        if self.asset_href is not None:
+            return f"{self.asset_href}/{filename}"
+        # Encode each asset once per generator - the background alone is ~1MB of base64
+        if filename in self._data_uris:
+            return self._data_uris[filename]
         path = self.assets_dir / filename
-        if not path.exists():
+        if not asset_exists(path):
             return ""
         with open(path, "rb") as f:
             data = base64.b64encode(f.read()).decode()
         ext = path.suffix.lower()
         mime = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}.get(ext, "image/png")
-        return f"data:{mime};base64,{data}"
+        self._data_uris[filename] = f"data:{mime};base64,{data}"
+        return self._data_uris[filename]
     
     def _generate_card_html(self, card_type: CardType, slot_index: int) -> str:
         asset = CARD_ASSETS[card_type]
@@ -512,23 +525,92 @@ class DynamicHTMLGenerator:
 # =============================================================================
 
 class PlaywrightRenderer:
+    """
+    Renders HTML to PNG with headless Chromium.
+    
+    By default every render launches and closes its own browser. Call start()
+    to keep one browser (and one page per viewport) open across renders, which
+    is what batch mode does; stop() tears the session down again.
+    """
+    
+    # Container-friendly launch settings
+    LAUNCH_ARGS = [
+        '--no-sandbox',
+        '--disable-setuid-sandbox',
+        '--disable-dev-shm-usage',
+        '--disable-gpu',
+        '--single-process',
+        '--no-zygote'
+    ]
+    
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._pages: Dict[Tuple[int, int, float], Any] = {}
+    
+    @property
+    def in_session(self) -> bool:
+        return self._browser is not None
+    
+    def start(self) -> bool:
+        """Launch a long-lived browser. Returns False if Playwright is unavailable."""
+        if self._browser is not None:
+            return True
+        try:
+            from playwright.sync_api import sync_playwright
+            
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(args=self.LAUNCH_ARGS)
+            return True
+        except Exception as e:
+            print(f"Playwright session unavailable: {e}")
+            self.stop()
+            return False
+    
+    def stop(self):
+        """Close the long-lived browser, if any."""
+        self._pages.clear()
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+    
+    def _session_page(self, width: int, height: int, scale: float):
+        key = (width, height, scale)
+        page = self._pages.get(key)
+        if page is None:
+            page = self._browser.new_page(
+                viewport={"width": width, "height": height},
+                device_scale_factor=scale
+            )
+            self._pages[key] = page
+        return page
+    
     def render(self, html: str, output_path: Path, 
                width: int, height: int, scale: float = 1.0) -> Path:
+        if self.in_session:
+            try:
+                page = self._session_page(width, height, scale)
+                page.set_content(html, wait_until='domcontentloaded')
+                page.screenshot(path=str(output_path), type="png")
+                return output_path
+            except Exception as e:
+                print(f"Playwright render failed: {e}")
+                return None
+        
         try:
             from playwright.sync_api import sync_playwright
             
             with sync_playwright() as p:
-                # Launch with container-friendly settings
-                browser = p.chromium.launch(
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--single-process',
-                        '--no-zygote'
-                    ]
-                )
+                browser = p.chromium.launch(args=self.LAUNCH_ARGS)
                 page = browser.new_page(
                     viewport={"width": width, "height": height},
                     device_scale_factor=scale
@@ -542,12 +624,37 @@ class PlaywrightRenderer:
             print(f"Playwright render failed: {e}")
             print("Gacha PNG rendering unavailable - returning HTML only")
             return None
+    
+    def render_file(self, html_path: Path, output_path: Path,
+                    width: int, height: int, scale: float = 1.0) -> Optional[Path]:
+        """
+        Render an HTML file by URL so relative asset references resolve.
+        Shared assets then stay in the browser's cache between pulls.
+        Requires an open session (see start()).
+        """
+        if not self.in_session:
+            return None
+        try:
+            page = self._session_page(width, height, scale)
+            page.goto(html_path.resolve().as_uri(), wait_until='load')
+            page.screenshot(path=str(output_path), type="png")
+            return output_path
+        except Exception as e:
+            print(f"Playwright render failed: {e}")
+            return None
 
 
 # =============================================================================
 # UNIFIED GENERATOR
 # =============================================================================
 
+def pull_label(pull: GachaPull) -> str:
+    """Short name for a pull, e.g. "1p9s" for 1 primal and 9 sorcery cards."""
+    primal_str = f"{pull.primal_count}p" if pull.primal_count else ""
+    sorcery_str = f"{pull.sorcery_count}s" if pull.sorcery_count else ""
+    return f"{primal_str}{sorcery_str}"
+
+
 class UnifiedGachaGenerator:
     """
     Main generator that uses cached specs and supports Figma sync.
@@ -560,6 +667,8 @@ class UnifiedGachaGenerator:
         
         self.base_dir = Path(base_dir)
         self.assets_dir = self.base_dir / "assets" / "gacharef"
+        # Registers the manifest asset_exists() answers from
+        manifest_for(self.base_dir / "assets")
         self.output_dir = self.base_dir / "output" / "gacha"
         self.specs_file = self.base_dir / "scripts" / "gacha_figma_specs.json"
         
@@ -622,15 +731,22 @@ class UnifiedGachaGenerator:
     def generate(self, pull_spec: str = None,
                  primal_5star: int = 0, primal_4star: int = 0, primal_3star: int = 0,
                  sorcery_5star: int = 0, sorcery_4star: int = 0, sorcery_3star: int = 0,
-                 output_name: str = None, scale: float = 2.0) -> Dict[str, Path]:
+                 output_name: str = None, scale: float = 2.0,
+                 render_png: bool = True, intent: Optional[GachaIntent] = None) -> Dict[str, Path]:
         """
         Generate a gacha screen.
         
         Always produces (all in same subfolder):
-        1. PNG screenshot
+        1. PNG screenshot (unless render_png=False)
         2. HTML source file
         3. Assets folder with all 2D assets used
         
+        With render_png=False the Playwright screenshot is skipped and
+        'png_pending' holds the path materialize_png() will write on demand.
+        
+        The pull comes from `intent` (already parsed, e.g. by the chat API),
+        else from `pull_spec`, else from the per-type counts.
+        
         Returns:
             Dict with paths to 'png', 'html', and 'assets_dir'
         """
@@ -642,7 +758,10 @@ class UnifiedGachaGenerator:
         print(f"  Assets dir: {self.assets_dir}")
         
         # Parse pull
-        if pull_spec:
+        if intent is not None:
+            print(f"  Pull: \"{intent.spec}\"")
+            pull = self.parser.from_intent(intent)
+        elif pull_spec:
             print(f"  Parsing: \"{pull_spec}\"")
             pull = self.parser.parse(pull_spec)
         else:
@@ -668,9 +787,7 @@ class UnifiedGachaGenerator:
         if output_name:
             base_name = f"{output_name}_{timestamp}"
         else:
-            primal_str = f"{pull.primal_count}p" if pull.primal_count else ""
-            sorcery_str = f"{pull.sorcery_count}s" if pull.sorcery_count else ""
-            base_name = f"gacha_{primal_str}{sorcery_str}_{timestamp}"
+            base_name = f"gacha_{pull_label(pull)}_{timestamp}"
         
         # Create subfolder for this generation
         output_subfolder = self.output_dir / base_name
@@ -682,10 +799,10 @@ class UnifiedGachaGenerator:
         
         # 1. Save HTML
         print("\nStep 2: Saving HTML...")
-        output_html.write_text(html)
+        OUTPUT_STORE.write_text(output_html, html)
         print(f"  ✓ HTML: {output_html}")
         
-        # 2. Create assets folder with all 2D assets used
+        # 2. Create assets folder with all 2D assets used (deduplicated across runs by the store)
         print("\nStep 3: Copying assets...")
         output_assets_dir.mkdir(parents=True, exist_ok=True)
         
@@ -693,14 +810,14 @@ class UnifiedGachaGenerator:
         
         # Copy background
         bg_src = self.assets_dir / "gachabackground.jpeg"
-        if bg_src.exists():
-            shutil.copy(bg_src, output_assets_dir / bg_src.name)
+        if asset_exists(bg_src):
+            OUTPUT_STORE.put_file(output_assets_dir / bg_src.name, source=bg_src)
             assets_copied.append(bg_src.name)
         
         # Copy button
         btn_src = self.assets_dir / "awaken_button.png"
-        if btn_src.exists():
-            shutil.copy(btn_src, output_assets_dir / btn_src.name)
+        if asset_exists(btn_src):
+            OUTPUT_STORE.put_file(output_assets_dir / btn_src.name, source=btn_src)
             assets_copied.append(btn_src.name)
         
         # Copy card assets (only the ones used in this pull)
@@ -709,8 +826,8 @@ class UnifiedGachaGenerator:
             asset = CARD_ASSETS[card_type]
             if asset.filename not in used_cards:
                 card_src = self.assets_dir / asset.filename
-                if card_src.exists():
-                    shutil.copy(card_src, output_assets_dir / asset.filename)
+                if asset_exists(card_src):
+                    OUTPUT_STORE.put_file(output_assets_dir / asset.filename, source=card_src)
                     assets_copied.append(asset.filename)
                     used_cards.add(asset.filename)
         
@@ -719,14 +836,20 @@ class UnifiedGachaGenerator:
             print(f"      - {asset_name}")
         
         # 3. Render PNG
-        print("\nStep 4: Rendering PNG with Playwright...")
-        png_result = self.renderer.render(
-            html=html,
-            output_path=output_png,
-            width=self.specs.canvas_width,
-            height=self.specs.canvas_height,
-            scale=scale
-        )
+        png_result = None
+        if render_png:
+            print("\nStep 4: Rendering PNG with Playwright...")
+            png_result = self.renderer.render(
+                html=html,
+                output_path=output_png,
+                width=self.specs.canvas_width,
+                height=self.specs.canvas_height,
+                scale=scale
+            )
+            if png_result:
+                OUTPUT_STORE.put_file(output_png)
+        else:
+            print("\nStep 4: Skipped (PNG is rendered on first fetch)")
         
         print(f"\n{'='*60}")
         print(f"✓ GENERATION COMPLETE")
@@ -735,6 +858,8 @@ class UnifiedGachaGenerator:
             actual_w = int(self.specs.canvas_width * scale)
             actual_h = int(self.specs.canvas_height * scale)
             print(f"  PNG:    {output_png} ({actual_w}x{actual_h}px)")
+        elif not render_png:
+            print(f"  PNG:    (deferred) {output_png}")
         else:
             print(f"  PNG:    (rendering failed)")
         print(f"  HTML:   {output_html}")
@@ -743,9 +868,900 @@ class UnifiedGachaGenerator:
         
         return {
             'png': output_png if png_result else None,
+            'png_pending': output_png if not render_png else None,
             'html': output_html,
             'assets_dir': output_assets_dir,
         }
+    
+    def export_reveal(self, pull_spec: str = None, pull: GachaPull = None, fmt: str = "apng",
+                      output_name: str = None, scale: float = 1.0,
+                      timing: 'RevealTiming' = None) -> Path:
+        """
+        Export an animated reveal (APNG or animated WebP) for a pull.
+        
+        Returns:
+            Path to the animation file
+        """
+        if pull is None:
+            pull = self.parser.parse(pull_spec or "")
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_name = f"{output_name}_{timestamp}" if output_name else f"gacha_{pull_label(pull)}_{timestamp}"
+        output_subfolder = self.output_dir / base_name
+        output_subfolder.mkdir(parents=True, exist_ok=True)
+        suffix = ".png" if fmt.lower() == "apng" else f".{fmt.lower()}"
+        output_path = output_subfolder / f"{base_name}_reveal{suffix}"
+        
+        animator = GachaRevealAnimator(self.specs, self.assets_dir, scale=scale, timing=timing)
+        print(f"Rendering {animator.timing.frames}-frame {fmt.upper()} reveal "
+              f"({animator.size[0]}x{animator.size[1]}px)...")
+        start = time.perf_counter()
+        animator.export(pull, output_path, fmt)
+        OUTPUT_STORE.put_file(output_path)
+        elapsed = time.perf_counter() - start
+        print(f"  ✓ {output_path} ({output_path.stat().st_size:,} bytes, {elapsed:.2f}s)")
+        return output_path
+    
+    def materialize_png(self, html_path: Path, scale: float = 2.0) -> Optional[Path]:
+        """
+        Render the PNG for a previously generated (deferred) screen.
+        
+        The PNG is written next to the HTML with the same base name; if it
+        already exists it is returned without rendering again.
+        """
+        html_path = Path(html_path)
+        output_png = html_path.with_suffix(".png")
+        if output_png.exists():
+            return output_png
+        if not OUTPUT_STORE.exists(html_path):
+            raise FileNotFoundError(f"Gacha HTML not found: {html_path}")
+        
+        # Write to a temp name so a half-written file is never served as the PNG
+        tmp_png = output_png.with_name(f".{output_png.stem}.rendering.png")
+        result = self.renderer.render(
+            html=OUTPUT_STORE.read_bytes(html_path).decode("utf-8"),
+            output_path=tmp_png,
+            width=self.specs.canvas_width,
+            height=self.specs.canvas_height,
+            scale=scale
+        )
+        if not result:
+            tmp_png.unlink(missing_ok=True)
+            return None
+        OUTPUT_STORE.put_file(output_png, source=tmp_png)
+        tmp_png.unlink(missing_ok=True)
+        return output_png
+
+
+# =============================================================================
+# ANIMATED REVEAL EXPORT (APNG / animated WebP)
+# =============================================================================
+
+def _css_px(value: str, reference: float = 0.0) -> float:
+    """Resolve a spec length ("12.5px", "50%", "calc(50% + 0.5px)") to pixels."""
+    value = value.strip()
+    if value.startswith("calc(") and value.endswith(")"):
+        total = 0.0
+        for sign, term in re.findall(r'([+-]?)\s*(-?\d+(?:\.\d+)?(?:px|%))', value[5:-1]):
+            total += (-1 if sign == "-" else 1) * _css_px(term, reference)
+        return total
+    if value.endswith("%"):
+        return float(value[:-1]) / 100 * reference
+    return float(value.replace("px", ""))
+
+
+def _css_deg(value: str) -> float:
+    return float(value.strip().replace("deg", ""))
+
+
+@dataclass
+class RevealTiming:
+    """Frame timeline for the reveal animation."""
+    frames: int = 60
+    fps: int = 30
+    entrance_frames: int = 8      # slide-in + fade per card
+    stagger_frames: int = 3       # delay between consecutive slots
+    hold_frames: int = 4          # pause between landing and flipping
+    flip_frames: int = 8          # squeeze-and-expand flip per card
+    entrance_offset: float = 40.0 # canvas px a card slides up from
+
+
+class APNGStreamWriter:
+    """
+    Writes an APNG frame by frame, so frames never have to be held in memory.
+    
+    Each frame after the first may cover only a sub-rectangle of the canvas
+    (blend_op SOURCE over an unchanged background), which is how unchanged
+    static layers are skipped instead of re-encoded.
+    """
+    
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+    
+    def __init__(self, fp, size: Tuple[int, int], num_frames: int, fps: int,
+                 num_plays: int = 1, compress_level: int = 1):
+        self.fp = fp
+        self.size = size
+        self.num_frames = num_frames
+        self.fps = fps
+        self.num_plays = num_plays
+        self.compress_level = compress_level
+        self._sequence = 0
+        self._written = 0
+    
+    def _chunk(self, kind: bytes, data: bytes):
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(kind)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+    
+    def _encode(self, image: Image.Image) -> Tuple[bytes, bytes]:
+        """PNG-encode with Pillow and return (IHDR data, concatenated IDAT data)."""
+        buf = io.BytesIO()
+        image.save(buf, "PNG", compress_level=self.compress_level)
+        data = buf.getvalue()
+        pos, ihdr, idat = len(self.SIGNATURE), b"", []
+        while pos < len(data):
+            length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+            body = data[pos + 8:pos + 8 + length]
+            if kind == b"IHDR":
+                ihdr = body
+            elif kind == b"IDAT":
+                idat.append(body)
+            pos += 12 + length
+        return ihdr, b"".join(idat)
+    
+    def add(self, frame: Image.Image, box: Optional[Tuple[int, int, int, int]] = None):
+        """Append a frame. `box` limits the update to that region (ignored for frame 0)."""
+        if self._written == 0 or box is None:
+            box = (0, 0) + self.size
+        x0, y0, x1, y1 = box
+        region = frame if box == (0, 0) + self.size else frame.crop(box)
+        ihdr, idat = self._encode(region)
+        
+        if self._written == 0:
+            self.fp.write(self.SIGNATURE)
+            self._chunk(b"IHDR", ihdr)
+            self._chunk(b"acTL", struct.pack(">II", self.num_frames, self.num_plays))
+        
+        # fcTL: sequence, size, offset, delay (1/fps s), dispose NONE, blend SOURCE
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._sequence, x1 - x0, y1 - y0,
+                                          x0, y0, 1, self.fps, 0, 0))
+        self._sequence += 1
+        if self._written == 0:
+            self._chunk(b"IDAT", idat)
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self._sequence) + idat)
+            self._sequence += 1
+        self._written += 1
+    
+    def close(self):
+        self._chunk(b"IEND", b"")
+
+
+class GachaRevealAnimator:
+    """
+    Renders a reveal animation for a GachaPull with Pillow.
+    
+    The background and AWAKEN button are composited once into a static layer.
+    Card sprites are resized, transformed (fade / flip) and rotated once per
+    (card type, animation step) and cached, so each frame is just the static
+    layer plus up to ten cached sprites. Frames are handed to the encoder as
+    they are produced.
+    """
+    
+    def __init__(self, specs: GachaFigmaSpecs, assets_dir: Path, scale: float = 1.0,
+                 timing: Optional[RevealTiming] = None):
+        self.specs = specs
+        self.assets_dir = assets_dir
+        self.scale = scale
+        self.timing = timing or RevealTiming()
+        self.size = (round(specs.canvas_width * scale), round(specs.canvas_height * scale))
+        
+        self._static: Optional[Image.Image] = None
+        self._card_images: Dict[Tuple[str, bool], Image.Image] = {}
+        self._sprites: Dict[Tuple, Image.Image] = {}
+    
+    # -- geometry -------------------------------------------------------------
+    
+    def _load(self, filename: str) -> Optional[Image.Image]:
+        path = self.assets_dir / filename
+        if not asset_exists(path):
+            return None
+        return open_asset(path).convert("RGBA")
+    
+    def _cover(self, image: Image.Image, width: float, height: float) -> Image.Image:
+        """Resize like CSS object-fit: cover."""
+        w, h = max(1, round(width * self.scale)), max(1, round(height * self.scale))
+        ratio = max(w / image.width, h / image.height)
+        resized = image.resize((max(w, round(image.width * ratio)), max(h, round(image.height * ratio))),
+                               Image.Resampling.LANCZOS)
+        left = (resized.width - w) // 2
+        top = (resized.height - h) // 2
+        return resized.crop((left, top, left + w, top + h))
+    
+    def _layout_origin(self) -> Tuple[float, float]:
+        s = self.specs
+        # .gacha-layout is positioned at (left, top) then translate(-50%, -50%)
+        left = _css_px(s.layout_left, s.canvas_width) - _css_px(s.layout_width) / 2
+        top = _css_px(s.layout_top, s.canvas_height) - _css_px(s.layout_height) / 2
+        return left, top
+    
+    def _slot_center(self, slot: Dict, use_primal: bool) -> Tuple[float, float]:
+        s = self.specs
+        origin_x, origin_y = self._layout_origin()
+        container_w = _css_px(s.primal_container_width if use_primal else s.sorcery_container_width)
+        container_h = _css_px(s.primal_container_height if use_primal else s.sorcery_container_height)
+        x = origin_x + _css_px(slot["left"]) + container_w / 2
+        y = origin_y + _css_px(slot["top"]) + container_h / 2
+        return x * self.scale, y * self.scale
+    
+    def static_layer(self) -> Image.Image:
+        """Background + button, composited once per animator."""
+        if self._static is None:
+            s = self.specs
+            layer = Image.new("RGBA", self.size, (255, 255, 255, 255))
+            bg = self._load("gachabackground.jpeg")
+            if bg:
+                bg = self._cover(bg, _css_px(s.bg_width), _css_px(s.bg_height))
+                layer.alpha_composite(bg, (0, round(_css_px(s.bg_top) * self.scale)))
+            button = self._load("awaken_button.png")
+            if button:
+                button = self._cover(button, _css_px(s.button_width), _css_px(s.button_height))
+                layer.alpha_composite(button, (round(_css_px(s.button_left) * self.scale),
+                                               round(_css_px(s.button_top) * self.scale)))
+            self._static = layer
+        return self._static
+    
+    # -- sprites --------------------------------------------------------------
+    
+    def _card_image(self, card_type: CardType, use_primal: bool) -> Optional[Image.Image]:
+        asset = CARD_ASSETS[card_type]
+        key = (asset.filename, use_primal)
+        if key not in self._card_images:
+            image = self._load(asset.filename)
+            if image is not None:
+                s = self.specs
+                image = self._cover(image,
+                                    _css_px(s.primal_width if use_primal else s.sorcery_width),
+                                    _css_px(s.primal_height if use_primal else s.sorcery_height))
+            self._card_images[key] = image
+        return self._card_images[key]
+    
+    def _sprite(self, card_type: CardType, use_primal: bool,
+                entrance_step: int, flip_step: int) -> Optional[Image.Image]:
+        """A rotated card sprite for one animation step (cached)."""
+        key = (card_type, use_primal, entrance_step, flip_step)
+        if key in self._sprites:
+            return self._sprites[key]
+        
+        card = self._card_image(card_type, use_primal)
+        if card is None:
+            return None
+        t = self.timing
+        
+        if flip_step:
+            # Squeeze to zero width and back; flash brighter on the way out
+            progress = flip_step / t.flip_frames
+            width = max(1, round(card.width * abs(math.cos(math.pi * progress))))
+            squeezed = card.resize((width, card.height), Image.Resampling.BILINEAR)
+            if progress > 0.5:
+                flash = math.sin(math.pi * progress)
+                squeezed = ImageEnhance.Brightness(squeezed).enhance(1.0 + 0.6 * flash)
+            card = Image.new("RGBA", card.size, (0, 0, 0, 0))
+            card.paste(squeezed, ((card.width - width) // 2, 0))
+        elif entrance_step < t.entrance_frames:
+            alpha = (entrance_step + 1) / t.entrance_frames
+            r, g, b, a = card.split()
+            card = Image.merge("RGBA", (r, g, b, a.point(lambda v: int(v * alpha))))
+        
+        rotation = _css_deg(self.specs.primal_rotation if use_primal else self.specs.sorcery_rotation)
+        # CSS rotate() is clockwise, PIL rotate() is counter-clockwise
+        sprite = card.rotate(-rotation, resample=Image.Resampling.BICUBIC, expand=True)
+        self._sprites[key] = sprite
+        return sprite
+    
+    def _slot_state(self, index: int, frame: int) -> Optional[Tuple[int, int, float]]:
+        """(entrance_step, flip_step, y_offset) for a slot at a frame, or None if hidden."""
+        t = self.timing
+        enter_start = index * t.stagger_frames
+        if frame < enter_start:
+            return None
+        step = frame - enter_start
+        if step < t.entrance_frames:
+            eased = 1 - (1 - (step + 1) / t.entrance_frames) ** 3
+            return step, 0, t.entrance_offset * (1 - eased) * self.scale
+        flip_start = t.entrance_frames + t.hold_frames
+        flip_step = min(max(step - flip_start + 1, 0), t.flip_frames)
+        # A finished flip looks exactly like the settled card
+        if flip_step == t.flip_frames:
+            flip_step = 0
+        return t.entrance_frames, flip_step, 0.0
+    
+    # -- frames ---------------------------------------------------------------
+    
+    def frames(self, pull: GachaPull):
+        """
+        Yield (frame, dirty_box) for every frame of the reveal.
+        dirty_box is the region that changed since the previous frame (None
+        means the full canvas).
+        """
+        static = self.static_layer()
+        placed: Dict[int, Tuple[Tuple, Tuple[int, int, int, int]]] = {}
+        
+        for frame_index in range(self.timing.frames):
+            frame = static.copy()
+            dirty = None
+            
+            for slot_index, card_type in enumerate(pull.cards):
+                if slot_index >= len(self.specs.card_slots):
+                    break
+                slot = self.specs.card_slots[slot_index]
+                use_primal = slot.get("is_primal", False) and CARD_ASSETS[card_type].is_primal
+                
+                state = self._slot_state(slot_index, frame_index)
+                sprite = self._sprite(card_type, use_primal, state[0], state[1]) if state else None
+                current = None
+                if sprite is not None:
+                    cx, cy = self._slot_center(slot, use_primal)
+                    x = round(cx - sprite.width / 2)
+                    y = round(cy + state[2] - sprite.height / 2)
+                    if x >= 0 and y >= 0:
+                        frame.alpha_composite(sprite, (x, y))
+                    else:
+                        # alpha_composite rejects negative offsets; paste clips them
+                        frame.paste(sprite, (x, y), sprite)
+                    current = (state[:2] + (round(state[2]),), (x, y, x + sprite.width, y + sprite.height))
+                
+                previous = placed.get(slot_index)
+                if current != previous:
+                    for entry in (previous, current):
+                        if entry:
+                            box = entry[1]
+                            dirty = box if dirty is None else (min(dirty[0], box[0]), min(dirty[1], box[1]),
+                                                               max(dirty[2], box[2]), max(dirty[3], box[3]))
+                    if current:
+                        placed[slot_index] = current
+                    else:
+                        placed.pop(slot_index, None)
+            
+            if dirty is not None:
+                dirty = (max(0, dirty[0]), max(0, dirty[1]),
+                         min(self.size[0], dirty[2]), min(self.size[1], dirty[3]))
+            else:
+                # Nothing moved - a 1px update keeps the frame timing intact
+                dirty = (0, 0, 1, 1)
+            yield frame, (None if frame_index == 0 else dirty)
+    
+    def export(self, pull: GachaPull, output_path: Path, fmt: str = "apng") -> Path:
+        """Encode the reveal to APNG (streamed frame by frame) or animated WebP."""
+        fmt = fmt.lower()
+        if fmt == "apng":
+            with open(output_path, "wb") as fp:
+                writer = APNGStreamWriter(fp, self.size, self.timing.frames, self.timing.fps)
+                for frame, box in self.frames(pull):
+                    writer.add(frame, box)
+                writer.close()
+        elif fmt == "webp":
+            self._export_webp(pull, output_path)
+        else:
+            raise ValueError(f"Unknown animation format '{fmt}'. Available: apng, webp")
+        return output_path
+    
+    def _export_webp(self, pull: GachaPull, output_path: Path):
+        # Pillow's animated WebP writer needs every frame up front, so unlike
+        # APNG this holds the whole reveal in memory while encoding.
+        # loop=1 plays it once, like the APNG (num_plays=1)
+        frames = [frame for frame, _ in self.frames(pull)]
+        frames[0].save(output_path, "WEBP", save_all=True, append_images=frames[1:],
+                       duration=round(1000 / self.timing.fps), loop=1, quality=85, method=4)
+
+
+# =============================================================================
+# BATCH PROCESSING (one browser session per worker process)
+# =============================================================================
+
+# Per-process render state, set up once by _init_batch_worker
+_batch_state: Dict[str, Any] = {}
+
+
+def _init_batch_worker(base_dir: str, batch_dir: str, scale: float):
+    """Process initializer: build the generator and open one browser for the worker's lifetime."""
+    from multiprocessing import util
+    
+    generator = UnifiedGachaGenerator(base_dir)
+    _batch_state["generator"] = generator
+    _batch_state["html_gen"] = DynamicHTMLGenerator(generator.specs, generator.assets_dir, asset_href="assets")
+    _batch_state["batch_dir"] = Path(batch_dir)
+    _batch_state["scale"] = scale
+    _batch_state["browser"] = generator.renderer.start()
+    # Pool workers exit via os._exit, so atexit never runs - use a multiprocessing finalizer
+    util.Finalize(None, generator.renderer.stop, exitpriority=10)
+
+
+def _render_batch_item(index: int, cards: List[CardType]) -> Dict[str, Any]:
+    """Render one pull inside a worker that was set up by _init_batch_worker."""
+    generator = _batch_state["generator"]
+    batch_dir = _batch_state["batch_dir"]
+    scale = _batch_state["scale"]
+    specs = generator.specs
+    
+    pull = GachaPull(cards=list(cards))
+    base_name = f"pull_{index:05d}_{pull_label(pull) or 'empty'}"
+    html_path = batch_dir / f"{base_name}.html"
+    png_path = batch_dir / f"{base_name}.png"
+    
+    html_path.write_text(_batch_state["html_gen"].generate(pull))
+    png_result = None
+    if _batch_state["browser"]:
+        png_result = generator.renderer.render_file(
+            html_path, png_path,
+            width=specs.canvas_width, height=specs.canvas_height, scale=scale
+        )
+    
+    return {
+        "html": html_path.name,
+        "png": png_path.name if png_result else None,
+        "status": "success" if png_result else "html_only",
+    }
+
+
+class BatchGachaGenerator:
+    """
+    Renders many pulls in one session.
+    
+    Compared to one generate_gacha.py call per pull:
+    - specs and card assets are loaded once, and assets are copied once per batch
+    - each worker keeps one browser and page open for all of its pulls
+    - HTML references the shared assets/ folder, so the browser caches decoded layers
+    - identical card layouts are rendered once and shared in the manifest
+    - pulls are spread across worker processes (one per core by default)
+    """
+    
+    def __init__(self, generator: UnifiedGachaGenerator, workers: Optional[int] = None):
+        self.generator = generator
+        self.workers = max(1, workers or os.cpu_count() or 1)
+    
+    @staticmethod
+    def load_specs(path: Path) -> List[Any]:
+        """
+        Load pull specs from a file.
+        
+        .json: a list of pull spec strings, or dicts of card counts
+               (e.g. {"primal_5star": 1, "sorcery_3star": 9})
+        other: one pull spec per line; blank lines and "#" comments are ignored
+        """
+        text = Path(path).read_text()
+        if Path(path).suffix.lower() == ".json":
+            specs = json.loads(text)
+            if not isinstance(specs, list):
+                raise ValueError(f"Batch file must contain a JSON list: {path}")
+            return specs
+        return [
+            line.strip() for line in text.splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+    
+    def _to_pull(self, spec: Any) -> GachaPull:
+        """Spec -> GachaPull; raises ValueError for specs that would not render a real pull."""
+        if isinstance(spec, GachaPull):
+            pull = spec
+        elif isinstance(spec, dict):
+            unknown = [str(key) for key in spec if key not in GachaPullParser.TYPE_MAP]
+            if unknown:
+                raise ValueError(f"Unknown card type(s): {', '.join(unknown)} "
+                                 f"(expected {', '.join(GachaPullParser.TYPE_MAP)})")
+            for key, count in spec.items():
+                if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+                    raise ValueError(f"{key}: count must be a non-negative integer, got {count!r}")
+            pull = self.generator.parser.create_pull(**spec)
+        else:
+            pull = self.generator.parser.parse(str(spec))
+        if not pull.cards:
+            raise ValueError(f"Pull spec has no cards: {spec!r}")
+        return pull
+    
+    def _copy_shared_assets(self, pulls: List[GachaPull], assets_dir: Path) -> List[str]:
+        assets_dir.mkdir(parents=True, exist_ok=True)
+        filenames = ["gachabackground.jpeg", "awaken_button.png"]
+        used = {card for pull in pulls for card in pull.cards}
+        filenames += sorted({CARD_ASSETS[c].filename for c in used})
+        
+        copied = []
+        for filename in filenames:
+            src = self.generator.assets_dir / filename
+            if asset_exists(src):
+                OUTPUT_STORE.put_file(assets_dir / filename, source=src)
+                copied.append(filename)
+        return copied
+    
+    def generate_batch(self, specs: List[Any], output_name: Optional[str] = None,
+                       scale: float = 2.0) -> Dict[str, Any]:
+        """
+        Render every pull spec and write a single manifest.
+        
+        Args:
+            specs: Pull spec strings, card-count dicts, or GachaPull objects
+            output_name: Optional batch folder name (timestamped either way)
+            scale: Render scale
+            
+        Returns:
+            The manifest dict (also saved as manifest.json in the batch folder)
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        
+        if not specs:
+            # Nothing to render - don't start a browser or create a batch folder
+            return {
+                "created": datetime.now().isoformat(),
+                "specs_synced": self.generator.specs.last_synced or None,
+                "scale": scale,
+                "workers": 0,
+                "pull_count": 0,
+                "rendered_count": 0,
+                "png_count": 0,
+                "error_count": 0,
+                "elapsed_sec": 0.0,
+                "pulls_per_sec": None,
+                "assets": [],
+                "pulls": [],
+            }
+        
+        start = time.perf_counter()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        batch_dir = self.generator.output_dir / f"{output_name or 'batch'}_{timestamp}"
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Parse every spec once, up front, and collapse identical layouts.
+        # A bad spec is recorded as an error in the manifest; the rest still render.
+        pulls: List[Optional[GachaPull]] = []
+        invalid: Dict[int, str] = {}
+        for i, spec in enumerate(specs):
+            try:
+                pulls.append(self._to_pull(spec))
+            except (ValueError, TypeError) as e:
+                pulls.append(None)
+                invalid[i] = str(e)
+        unique: Dict[Tuple[CardType, ...], int] = {}
+        for i, pull in enumerate(pulls):
+            if pull is not None:
+                unique.setdefault(tuple(pull.cards), i)
+        
+        total = len(unique)
+        workers = min(self.workers, total)
+        
+        print(f"\n{'='*60}")
+        print("GACHA BATCH GENERATOR")
+        print(f"{'='*60}")
+        print(f"  Pull specs: {len(pulls)} ({total} unique layouts, {len(invalid)} invalid)")
+        print(f"  Workers:    {workers}")
+        print(f"  Scale:      {scale}x")
+        print(f"  Output:     {batch_dir}/")
+        print(f"{'='*60}\n")
+        
+        for i, error in invalid.items():
+            print(f"  ✗ Spec {i}: {error}")
+        
+        assets_copied = self._copy_shared_assets([p for p in pulls if p is not None], batch_dir / "assets")
+        print(f"  ✓ Shared assets: {len(assets_copied)} files\n")
+        
+        rendered: Dict[int, Dict[str, Any]] = {}
+        progress_every = max(1, total // 20)
+        
+        def record(index: int, result: Dict[str, Any]):
+            rendered[index] = result
+            done = len(rendered)
+            if done % progress_every == 0 or done == total:
+                rate = done / max(time.perf_counter() - start, 1e-9)
+                print(f"  [{done}/{total}] {rate:.1f} pulls/sec")
+        
+        initargs = (str(self.generator.base_dir), str(batch_dir), scale)
+        if workers == 1:
+            _init_batch_worker(*initargs)
+            try:
+                for index in unique.values():
+                    record(index, self._safe_render(index, pulls[index].cards))
+            finally:
+                _batch_state["generator"].renderer.stop()
+        elif workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                     initargs=initargs) as pool:
+                futures = {
+                    pool.submit(_render_batch_item, index, pulls[index].cards): index
+                    for index in unique.values()
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        record(index, future.result())
+                    except Exception as e:
+                        record(index, {"html": None, "png": None, "status": "error", "error": str(e)})
+        
+        elapsed = time.perf_counter() - start
+        entries = []
+        for i, (spec, pull) in enumerate(zip(specs, pulls)):
+            if pull is None:
+                entries.append({
+                    "index": i,
+                    "spec": spec if isinstance(spec, (str, dict)) else None,
+                    "cards": [],
+                    "html": None,
+                    "png": None,
+                    "status": "error",
+                    "error": invalid[i],
+                })
+                continue
+            source = unique[tuple(pull.cards)]
+            entry = {
+                "index": i,
+                "spec": spec if isinstance(spec, (str, dict)) else None,
+                "cards": [c.name for c in pull.cards],
+                **rendered[source],
+            }
+            if source != i:
+                entry["duplicate_of"] = source
+            entries.append(entry)
+        
+        manifest = {
+            "created": datetime.now().isoformat(),
+            "specs_synced": self.generator.specs.last_synced or None,
+            "scale": scale,
+            "workers": workers,
+            "pull_count": len(pulls),
+            "rendered_count": total,
+            "png_count": sum(1 for r in rendered.values() if r.get("png")),
+            "error_count": sum(1 for r in rendered.values() if r["status"] == "error") + len(invalid),
+            "elapsed_sec": round(elapsed, 3),
+            "pulls_per_sec": round(len(pulls) / elapsed, 2) if elapsed > 0 else None,
+            "assets": assets_copied,
+            "pulls": entries,
+        }
+        manifest_path = batch_dir / "manifest.json"
+        OUTPUT_STORE.write_text(manifest_path, json.dumps(manifest, indent=2))
+        # Pages were written by worker processes; track them in this one
+        OUTPUT_STORE.adopt_tree(batch_dir)
+        
+        print(f"\n{'='*60}")
+        print("✓ BATCH COMPLETE")
+        print(f"{'='*60}")
+        print(f"  Pulls:    {len(pulls)} ({total} rendered, {manifest['png_count']} PNG, {manifest['error_count']} errors)")
+        print(f"  Elapsed:  {elapsed:.2f}s ({manifest['pulls_per_sec']} pulls/sec)")
+        print(f"  Manifest: {manifest_path}")
+        print(f"{'='*60}\n")
+        
+        return manifest
+    
+    @staticmethod
+    def _safe_render(index: int, cards: List[CardType]) -> Dict[str, Any]:
+        try:
+            return _render_batch_item(index, cards)
+        except Exception as e:
+            return {"html": None, "png": None, "status": "error", "error": str(e)}
+
+
+# =============================================================================
+# PULL SIMULATOR (NumPy, vectorized)
+# =============================================================================
+
+# Card types in a fixed order so they can be stored as small integers
+CARD_ORDER: List[CardType] = list(CardType)
+
+# Keyword form of each card type, as accepted by GachaPullParser.create_pull
+CARD_KEYS: Dict[CardType, str] = {
+    CardType.PRIMAL_5STAR: "primal_5star",
+    CardType.PRIMAL_4STAR: "primal_4star",
+    CardType.PRIMAL_3STAR: "primal_3star",
+    CardType.SORCERY_5STAR: "sorcery_5star",
+    CardType.SORCERY_4STAR: "sorcery_4star",
+    CardType.SORCERY_3STAR: "sorcery_3star",
+}
+
+
+@dataclass
+class PityRules:
+    """Pity rules applied while sampling."""
+    # Every 10-pull contains at least one card of this rarity or better (0 disables)
+    guarantee_rarity: int = 4
+    # A 5star is forced after this many cards without one (0 disables)
+    hard_pity: int = 90
+    # Consecutive 10-pulls made by one simulated player (pity carries across them)
+    pulls_per_player: int = 10
+
+
+@dataclass
+class SimulationResult:
+    """Distribution of distinct 10-pull layouts from a simulation run."""
+    total_pulls: int
+    elapsed_sec: float
+    # (card counts keyed like create_pull kwargs, number of pulls) - most common first
+    layouts: List[Tuple[Dict[str, int], int]]
+    
+    @property
+    def pulls_per_sec(self) -> float:
+        return self.total_pulls / self.elapsed_sec if self.elapsed_sec > 0 else float("inf")
+    
+    def top_pulls(self, k: int) -> List[GachaPull]:
+        """The k most common layouts as GachaPulls, ready for the renderer."""
+        parser = GachaPullParser()
+        return [parser.create_pull(**counts) for counts, _ in self.layouts[:k]]
+    
+    def print_summary(self, k: int = 10):
+        print(f"\n{'='*60}")
+        print("GACHA PULL SIMULATION")
+        print(f"{'='*60}")
+        print(f"  10-pulls sampled: {self.total_pulls:,}")
+        print(f"  Elapsed:          {self.elapsed_sec:.2f}s ({self.pulls_per_sec:,.0f} pulls/sec)")
+        print(f"  Distinct layouts: {len(self.layouts):,}")
+        print(f"\n  Top {min(k, len(self.layouts))} layouts:")
+        for counts, n in self.layouts[:k]:
+            share = 100.0 * n / self.total_pulls
+            desc = ", ".join(f"{c} {key.split('_')[1]} {key.split('_')[0]}" for key, c in counts.items() if c)
+            print(f"    {share:6.2f}%  {desc}")
+        print(f"{'='*60}\n")
+
+
+class GachaPullSimulator:
+    """
+    Samples 10-pulls from per-CardType drop rates with NumPy.
+    
+    Each 10-pull is reduced to its layout - how many of each card type it
+    holds, which is exactly what GachaPullParser.create_pull (and so the
+    renderer) consumes. Layouts are encoded as one base-11 integer and counted
+    with bincount, so the only Python-level loop is over card positions when
+    pity rules need sequential state.
+    """
+    
+    # Placeholder banner rates - pass the real banner's table via --rates
+    DEFAULT_RATES: Dict[CardType, float] = {
+        CardType.PRIMAL_5STAR: 0.006,
+        CardType.PRIMAL_4STAR: 0.025,
+        CardType.PRIMAL_3STAR: 0.069,
+        CardType.SORCERY_5STAR: 0.010,
+        CardType.SORCERY_4STAR: 0.090,
+        CardType.SORCERY_3STAR: 0.800,
+    }
+    
+    # A 10-pull holds 0-10 cards of each type
+    LAYOUT_BASE = 11
+    
+    def __init__(self, rates: Optional[Dict[CardType, float]] = None,
+                 pity: Optional[PityRules] = None, seed: Optional[int] = None):
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("The pull simulator requires numpy: pip install numpy")
+        self.np = np
+        
+        rates = rates or self.DEFAULT_RATES
+        probs = np.array([rates.get(c, 0.0) for c in CARD_ORDER], dtype=np.float64)
+        if (probs < 0).any() or probs.sum() <= 0:
+            raise ValueError(f"Invalid drop rates: {rates}")
+        self.probs = probs / probs.sum()
+        self.pity = pity or PityRules()
+        self.rng = np.random.default_rng(seed)
+        
+        self.rarity = np.array([CARD_ASSETS[c].rarity for c in CARD_ORDER], dtype=np.int8)
+        self.layout_weights = self.LAYOUT_BASE ** np.arange(len(CARD_ORDER), dtype=np.int64)
+        self._cdf = self._make_cdf(self.probs)
+        self._top_cdf = self._make_cdf(np.where(self.rarity >= 5, self.probs, 0.0))
+        self._guarantee_cdf = self._make_cdf(
+            np.where(self.rarity >= self.pity.guarantee_rarity, self.probs, 0.0)
+        ) if self.pity.guarantee_rarity else None
+    
+    def _make_cdf(self, weights):
+        np = self.np
+        if weights.sum() <= 0:
+            return None
+        cdf = np.cumsum(weights / weights.sum()).astype(np.float32)
+        cdf[-1] = 1.0
+        return cdf
+    
+    def _draw(self, cdf, shape):
+        np = self.np
+        u = self.rng.random(shape, dtype=np.float32)
+        return np.minimum(np.searchsorted(cdf, u, side="right"), len(CARD_ORDER) - 1).astype(np.uint8)
+    
+    @staticmethod
+    def parse_rates(spec: str) -> Dict[CardType, float]:
+        """
+        Parse drop rates from JSON text, a JSON file path, or "key=value" pairs.
+        Keys use create_pull naming (primal_5star ... sorcery_3star); values may
+        be fractions or percentages ("0.6%").
+        """
+        if os.path.exists(spec):
+            spec = Path(spec).read_text()
+        try:
+            raw = json.loads(spec)
+        except json.JSONDecodeError:
+            raw = dict(pair.split("=", 1) for pair in re.split(r"[,\s]+", spec.strip()) if pair)
+        
+        by_key = {key: card_type for card_type, key in CARD_KEYS.items()}
+        rates = {}
+        for key, value in raw.items():
+            card_type = by_key.get(key.strip().lower())
+            if card_type is None:
+                raise ValueError(f"Unknown card type '{key}'. Available: {', '.join(by_key)}")
+            value = str(value).strip()
+            rates[card_type] = float(value[:-1]) / 100 if value.endswith("%") else float(value)
+        return rates
+    
+    def _sample_chunk(self, players: int):
+        """
+        Sample pulls_per_player consecutive 10-pulls for each of `players`
+        players. Returns the layout code of every 10-pull.
+        """
+        np = self.np
+        pity = self.pity
+        length = pity.pulls_per_player * 10
+        
+        # Position-major so each step of the pity loop touches contiguous memory
+        cards = self._draw(self._cdf, (length, players))
+        
+        if pity.hard_pity or self._guarantee_cdf is not None:
+            since_top = np.zeros(players, dtype=np.int32)
+            best = np.zeros(players, dtype=np.int8)
+            for t in range(length):
+                row = cards[t]
+                rarity = self.rarity[row]
+                
+                if pity.hard_pity and self._top_cdf is not None:
+                    force = (since_top >= pity.hard_pity - 1) & (rarity < 5)
+                    n = int(force.sum())
+                    if n:
+                        row[force] = self._draw(self._top_cdf, n)
+                        rarity = self.rarity[row]
+                
+                slot = t % 10
+                if slot == 0:
+                    best = rarity.copy()
+                else:
+                    np.maximum(best, rarity, out=best)
+                
+                if slot == 9 and self._guarantee_cdf is not None:
+                    force = best < pity.guarantee_rarity
+                    n = int(force.sum())
+                    if n:
+                        row[force] = self._draw(self._guarantee_cdf, n)
+                        rarity = self.rarity[row]
+                
+                since_top = np.where(rarity >= 5, 0, since_top + 1)
+        
+        # Layout code = sum over slots of 11**card_index == sum of count_k * 11**k
+        codes = self.layout_weights[cards].reshape(pity.pulls_per_player, 10, players).sum(axis=1)
+        return codes.ravel()
+    
+    def decode_layout(self, code: int) -> Dict[str, int]:
+        counts = {}
+        for card_type in CARD_ORDER:
+            code, count = divmod(int(code), self.LAYOUT_BASE)
+            counts[CARD_KEYS[card_type]] = count
+        return counts
+    
+    def simulate(self, total_pulls: int, chunk_pulls: int = 1_000_000) -> SimulationResult:
+        """
+        Sample `total_pulls` 10-pulls and count every distinct layout.
+        
+        Work is chunked so memory stays bounded (~50 MB per million 10-pulls).
+        """
+        np = self.np
+        per_player = self.pity.pulls_per_player
+        players_total = -(-total_pulls // per_player)
+        players_per_chunk = max(1, chunk_pulls // per_player)
+        
+        start = time.perf_counter()
+        counts = np.zeros(self.LAYOUT_BASE ** len(CARD_ORDER), dtype=np.int64)
+        remaining = players_total
+        while remaining > 0:
+            players = min(players_per_chunk, remaining)
+            counts += np.bincount(self._sample_chunk(players), minlength=counts.size)
+            remaining -= players
+        elapsed = time.perf_counter() - start
+        
+        # Rounded up to whole players, so report what was actually sampled
+        sampled = players_total * per_player
+        order = np.flatnonzero(counts)
+        order = order[np.argsort(-counts[order], kind="stable")]
+        layouts = [(self.decode_layout(code), int(counts[code])) for code in order]
+        return SimulationResult(total_pulls=sampled, elapsed_sec=elapsed, layouts=layouts)
 
 
 # =============================================================================
@@ -769,6 +1785,15 @@ Examples:
   
   # View current specs
   python generate_gacha.py --show-specs
+  
+  # Render a file of pull specs (one per line, or a JSON list) in one session
+  python generate_gacha.py --batch pulls.txt --workers 4
+  
+  # Simulate 1M 10-pulls under a banner's rates and render the 5 most common screens
+  python generate_gacha.py --simulate 1000000 --rates rates.json --top-k 5 --render-top
+  
+  # Animated reveal (APNG or animated WebP)
+  python generate_gacha.py --pull "1 5star primal, 9 3star sorcery" --animate webp
 
 The Gacha Droid can handle natural language like:
   "generate a gacha with 2 primals"
@@ -800,6 +1825,34 @@ The Gacha Droid can handle natural language like:
     parser.add_argument("--output", "-o", help="Custom output name (creates NAME.png, NAME.html, NAME_assets/)")
     parser.add_argument("--scale", "-s", type=float, default=2.0, help="Render scale (default: 2 for best quality)")
     
+    # Animation options
+    parser.add_argument("--animate", choices=["apng", "webp"],
+                        help="Export an animated reveal instead of a still screen")
+    parser.add_argument("--frames", type=int, default=60, help="Reveal frame count (default: 60)")
+    parser.add_argument("--fps", type=int, default=30, help="Reveal frame rate (default: 30)")
+    
+    # Batch options
+    parser.add_argument("--batch", "-b", metavar="PATH",
+                        help="File of pull specs (one per line, or a JSON list) to render in one session")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Batch worker processes (default: one per CPU core)")
+    
+    # Simulation options
+    parser.add_argument("--simulate", type=int, metavar="N",
+                        help="Sample N 10-pulls and report the distribution of layouts")
+    parser.add_argument("--rates", metavar="JSON",
+                        help='Drop rates as JSON, a JSON file, or pairs like "primal_5star=0.6%%,sorcery_3star=80%%"')
+    parser.add_argument("--guarantee-rarity", type=int, default=4,
+                        help="Each 10-pull has at least one card of this rarity (0 disables, default: 4)")
+    parser.add_argument("--hard-pity", type=int, default=90,
+                        help="Force a 5star after this many cards without one (0 disables, default: 90)")
+    parser.add_argument("--pulls-per-player", type=int, default=10,
+                        help="Consecutive 10-pulls per simulated player (default: 10)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible simulations")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of top layouts to report (default: 10)")
+    parser.add_argument("--render-top", action="store_true",
+                        help="Render the top-K simulated layouts as a batch")
+    
     args = parser.parse_args()
     
     generator = UnifiedGachaGenerator()
@@ -818,9 +1871,44 @@ The Gacha Droid can handle natural language like:
         generator.show_specs()
         return
     
+    # Simulate
+    if args.simulate:
+        simulator = GachaPullSimulator(
+            rates=GachaPullSimulator.parse_rates(args.rates) if args.rates else None,
+            pity=PityRules(
+                guarantee_rarity=args.guarantee_rarity,
+                hard_pity=args.hard_pity,
+                pulls_per_player=args.pulls_per_player,
+            ),
+            seed=args.seed,
+        )
+        result = simulator.simulate(args.simulate)
+        result.print_summary(args.top_k)
+        if args.render_top:
+            batch = BatchGachaGenerator(generator, workers=args.workers)
+            batch.generate_batch(result.top_pulls(args.top_k), output_name=args.output or "simulated",
+                                 scale=args.scale)
+        return
+    
+    # Batch
+    if args.batch:
+        batch = BatchGachaGenerator(generator, workers=args.workers)
+        batch.generate_batch(batch.load_specs(Path(args.batch)), output_name=args.output, scale=args.scale)
+        return
+    
     # Generate
     if args.pull or any([args.primal_5star, args.primal_4star, args.primal_3star,
                          args.sorcery_5star, args.sorcery_4star, args.sorcery_3star]):
+        if args.animate:
+            pull = None if args.pull else generator.parser.create_pull(
+                primal_5star=args.primal_5star, primal_4star=args.primal_4star,
+                primal_3star=args.primal_3star, sorcery_5star=args.sorcery_5star,
+                sorcery_4star=args.sorcery_4star, sorcery_3star=args.sorcery_3star,
+            )
+            generator.export_reveal(pull_spec=args.pull, pull=pull, fmt=args.animate,
+                                    output_name=args.output, scale=args.scale,
+                                    timing=RevealTiming(frames=args.frames, fps=args.fps))
+            return
         generator.generate(
             pull_spec=args.pull,
             primal_5star=args.primal_5star,
@@ -1,9 +1,18 @@
 import os
+import re
+import asyncio
 import argparse
-from PIL import Image
-from google import genai
 from google.genai import types
 
+from gemini_client import call_model, call_model_sync, get_client
+from icon_index import IconIndex
+from output_store import OUTPUT_STORE
+from result_cache import CACHE_DIR, ResultCache, hash_file, hash_text
+from reference_payloads import (
+    PayloadReport, call_with_references, call_with_references_async,
+    load_reference, reference_part, reference_part_async,
+)
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -20,67 +29,110 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ASSETS_DIR = os.path.join(BASE_DIR, "assets", "iconbtnref")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output", "icon")
 
-def load_image(filename):
-    path = os.path.join(ASSETS_DIR, filename)
-    if not os.path.exists(path):
-        print(f"Skipping missing asset: {path}")
-        return None
-    return Image.open(path)
+FRAME_FILE = "frame.png"
+STYLE_FILES = ["ref_grid.png", "ref_eye.png", "ref_heart.png"]
 
-def generate_icon(icon_name):
-    """Generate an icon and return the saved file path."""
-    print(f"--- Generating: {icon_name} ---")
-    
-    if not API_KEY:
-        raise ValueError("GOOGLE_API_KEY not set in environment")
-    
-    # Initialize Client
-    client = genai.Client(api_key=API_KEY)
+SYSTEM_INSTRUCTION = "You are an expert UI artist. You replicate existing asset styles perfectly."
 
-    # Load Visual References
-    frame_img = load_image("frame.png")
-    style_files = ["ref_chest.png", "ref_grid.png", "ref_eye.png", "ref_heart.png"]
-    
-    # Construct Content List
-    contents = []
-    
-    prompt = (
-        f"Generate a highly detailed 2D UI button featuring a {icon_name}. "
-        "VISUAL REFERENCES: "
-        "The first image provided is the 'Frame Structure'. You must replicate this circular button frame exactly (dark blue, sparkly background, border style). "
-        "The subsequent images are 'Style References'. The icon inside the button must match their white, distressed art style. "
-        "DETAILS: "
-        f"The {icon_name} symbol should be centered, white, and textured with the same weathered details as the style references. "
-        "The texture consists of organic chipping and irregular flaking, simulating a cohesive material that is wearing thin rather than a printed pattern. The surface wear resembles random abrasion and smooth fading. "
-        "The icon should be 2D and flat, with no depth or perspective. "
-        "The icon should blend seamlessly with the dark button surface. "
-        "The background must be transparent. "
+PROMPT_TEMPLATE = (
+    "Generate a highly detailed 2D UI button featuring a {icon_name}. "
+    "VISUAL REFERENCES: "
+    "The first image provided is the 'Frame Structure'. You must replicate this circular button frame exactly (dark blue, sparkly background, border style). "
+    "The subsequent images are 'Style References'. The icon inside the button must match their white, distressed art style. "
+    "DETAILS: "
+    "The {icon_name} symbol should be centered, white, and textured with the same weathered details as the style references. "
+    "The texture consists of organic chipping and irregular flaking, simulating a cohesive material that is wearing thin rather than a printed pattern. The surface wear resembles random abrasion and smooth fading. "
+    "The icon should be 2D and flat, with no depth or perspective. "
+    "The icon should blend seamlessly with the dark button surface. "
+    "The background must be transparent. "
+)
+
+# Generated icons are cached on disk so repeat requests skip the model call
+ICON_CACHE = ResultCache(
+    CACHE_DIR / "icon",
+    max_bytes=int(float(os.getenv("ICON_CACHE_MAX_MB", "256")) * 1024 * 1024),
+)
+
+# Past icon names, so "a red heart icon" can reuse the cached "heart"
+ICON_INDEX = IconIndex(CACHE_DIR / "icon" / "similar.jsonl")
+
+def normalize_icon_name(icon_name):
+    """Canonical form of an icon name for cache lookups ("Heart_Icon " -> "heart icon")."""
+    return re.sub(r"[\s_]+", " ", icon_name.lower()).strip()
+
+
+def icon_context_key():
+    """Everything but the name that determines an icon: prompt template + reference images + model."""
+    return ResultCache.make_key(
+        hash_text(PROMPT_TEMPLATE + SYSTEM_INSTRUCTION),
+        hash_file(os.path.join(ASSETS_DIR, FRAME_FILE)),
+        [hash_file(os.path.join(ASSETS_DIR, sf)) for sf in STYLE_FILES],
+        MODEL_ID,
     )
-    contents.append(prompt)
 
-    if frame_img:
-        contents.append(frame_img)
 
-    for sf in style_files:
-        img = load_image(sf)
-        if img:
-            contents.append(img)
+def icon_cache_key(icon_name):
+    """Cache key: normalized name + icon_context_key()."""
+    return ResultCache.make_key(normalize_icon_name(icon_name), icon_context_key())
 
-    print(f"Sending request with {len(contents)-1} reference images...")
-    
-    response = client.models.generate_content(
-        model=MODEL_ID,
-        contents=contents,
-        config=types.GenerateContentConfig(
-            response_modalities=['TEXT', 'IMAGE'],
-            system_instruction="You are an expert UI artist. You replicate existing asset styles perfectly.",
-            image_config=types.ImageConfig(
-                aspect_ratio="1:1",
-            ),
-        )
+
+def output_path_for(icon_name):
+    filename = f"ICONBTN_{icon_name.replace(' ', '_').upper()}.png"
+    return os.path.join(OUTPUT_DIR, filename)
+
+
+def request_config():
+    return types.GenerateContentConfig(
+        response_modalities=['TEXT', 'IMAGE'],
+        system_instruction=SYSTEM_INSTRUCTION,
+        image_config=types.ImageConfig(
+            aspect_ratio="1:1",
+        ),
     )
-    
-    # Save Output
+
+
+def load_icon_references(report):
+    """Visual references (encoded once per process, reused on every call)."""
+    frame_ref = load_reference(os.path.join(ASSETS_DIR, FRAME_FILE), report=report)
+    style_refs = [load_reference(os.path.join(ASSETS_DIR, sf), report=report) for sf in STYLE_FILES]
+    return [ref for ref in [frame_ref] + style_refs if ref]
+
+
+def copy_cached_icon(icon_name, cache_key):
+    """Copy a cached result to the output path; returns the path or None on a miss."""
+    cached = ICON_CACHE.get(cache_key)
+    if not cached:
+        return None
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    save_path = output_path_for(icon_name)
+    OUTPUT_STORE.put_file(save_path, source=cached)
+    print(f"CACHE HIT: {save_path} ({ICON_CACHE.stats()})")
+    return save_path
+
+
+def lookup_cached_icon(icon_name, cache_key, similar=True):
+    """
+    Exact cache lookup, then (if `similar`) the best near-duplicate from
+    ICON_INDEX. A near-duplicate is returned under its original name, so
+    "a red heart icon" resolves to ICONBTN_HEART.png.
+    """
+    cached = copy_cached_icon(icon_name, cache_key)
+    if cached or not similar:
+        return cached
+    match = ICON_INDEX.find(icon_name, context=icon_context_key())
+    if match is None or match.cache_key == cache_key:
+        return None
+    cached = copy_cached_icon(match.name, match.cache_key)
+    if cached:
+        print(f"SIMILAR: '{icon_name}' -> '{match.name}' (score {match.score})")
+    else:
+        # The matched result was evicted from the cache
+        ICON_INDEX.discard(match.cache_key)
+    return cached
+
+
+def save_icon_response(response, icon_name, cache_key):
+    """Save the first image in a model response and cache it; returns the path or None."""
     if response.parts:
         for part in response.parts:
             if part.text:
@@ -90,9 +142,12 @@ def generate_icon(icon_name):
                 image = part.as_image()
                 if image:
                     os.makedirs(OUTPUT_DIR, exist_ok=True)
-                    filename = f"ICONBTN_{icon_name.replace(' ', '_').upper()}.png"
-                    save_path = os.path.join(OUTPUT_DIR, filename)
-                    image.save(save_path)
+                    save_path = output_path_for(icon_name)
+                    OUTPUT_STORE.save_image(save_path, image)
+                    # From memory: the output may not be on disk yet (see OutputStore.deferred)
+                    ICON_CACHE.put_bytes(cache_key, OUTPUT_STORE.read_bytes(save_path), ".png",
+                                         meta={"name": normalize_icon_name(icon_name)})
+                    ICON_INDEX.add(normalize_icon_name(icon_name), cache_key, context=icon_context_key())
                     print(f"SUCCESS: Saved to {save_path}")
                     return save_path
             except AttributeError:
@@ -101,8 +156,98 @@ def generate_icon(icon_name):
     print("FAILED: No image returned from API.")
     return None
 
+
+def generate_icon(icon_name, regenerate=False, similar=True):
+    """
+    Generate an icon and return the saved file path.
+    
+    Results are cached by icon_cache_key(); pass regenerate=True to skip the
+    cache lookup and call the model again (the new result replaces the cached one).
+    With similar=True a cached near-duplicate name (see icon_index) is reused;
+    pass similar=False to only accept exact cache hits.
+    """
+    print(f"--- Generating: {icon_name} ---")
+    
+    cache_key = icon_cache_key(icon_name)
+    if not regenerate:
+        cached = lookup_cached_icon(icon_name, cache_key, similar)
+        if cached:
+            return cached
+    
+    if not API_KEY:
+        raise ValueError("GOOGLE_API_KEY not set in environment")
+    
+    # Initialize Client
+    client = get_client(API_KEY)
+    report = PayloadReport()
+    refs = load_icon_references(report)
+    prompt = PROMPT_TEMPLATE.format(icon_name=icon_name)
+
+    # Construct Content List (rebuilt if file handles need re-uploading)
+    def build_contents():
+        return [prompt] + [reference_part(ref, client, report) for ref in refs]
+
+    def call(contents):
+        print(f"Sending request with {len(contents)-1} reference images ({report.summary()})...")
+        return call_model_sync(
+            lambda: client.models.generate_content(model=MODEL_ID, contents=contents, config=request_config()),
+            op="icon",
+        )
+    
+    response = call_with_references(client, build_contents, call)
+    return save_icon_response(response, icon_name, cache_key)
+
+
+async def generate_icon_async(icon_name, regenerate=False, similar=True):
+    """
+    Async generate_icon() on the SDK's native async client.
+    
+    The model call awaits a slot from model_slots() instead of holding a thread,
+    and is hedged/retried within the request deadline by call_model().
+    """
+    print(f"--- Generating (async): {icon_name} ---")
+    
+    cache_key = icon_cache_key(icon_name)
+    if not regenerate:
+        # Disk reads and writes: kept off the event loop
+        cached = await asyncio.to_thread(lookup_cached_icon, icon_name, cache_key, similar)
+        if cached:
+            return cached
+    
+    if not API_KEY:
+        raise ValueError("GOOGLE_API_KEY not set in environment")
+    
+    client = get_client(API_KEY)
+    report = PayloadReport()
+    refs = load_icon_references(report)
+    prompt = PROMPT_TEMPLATE.format(icon_name=icon_name)
+
+    async def build_contents():
+        return [prompt] + [await reference_part_async(ref, client, report) for ref in refs]
+
+    async def call(contents):
+        print(f"Sending request with {len(contents)-1} reference images ({report.summary()})...")
+        return await call_model(
+            lambda: client.aio.models.generate_content(model=MODEL_ID, contents=contents, config=request_config()),
+            op="icon",
+        )
+    
+    response = await call_with_references_async(client, build_contents, call)
+    return await asyncio.to_thread(save_icon_response, response, icon_name, cache_key)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--name", required=True, help="Icon name")
+    parser.add_argument("--name", help="Icon name")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Ignore the cache and call the model again")
+    parser.add_argument("--exact", action="store_true",
+                        help="Only reuse a cached icon with exactly this name, not a near-duplicate")
+    parser.add_argument("--cache-stats", action="store_true", help="Show icon cache statistics")
     args = parser.parse_args()
-    generate_icon(args.name)
+    if args.cache_stats:
+        print(ICON_CACHE.stats())
+        print(ICON_INDEX.stats())
+    elif args.name:
+        generate_icon(args.name, regenerate=args.regenerate, similar=not args.exact)
+    else:
+        parser.print_help()
@@ -0,0 +1,355 @@
+"""
+Icon Index
+==========
+Near-duplicate lookup over previously generated icons.
+
+Users ask for the same icon in many phrasings ("heart", "a red heart icon",
+"Hearts", "give me a heart"), and each distinct name is a distinct result
+cache key. This index reduces a name to a set of concept tokens:
+
+  1. lowercase, split on non-letters
+  2. drop stop words ("icon", "button", "give", "me", ...)
+  3. lemmatize with a few suffix rules ("swords" -> sword, "knives" -> knife)
+  4. map multi-word phrases and synonyms to one canonical token
+     ("magnifying glass" -> search, "blade" -> sword)
+
+and scores past icons by weighted Jaccard similarity of those sets. Subject
+tokens weigh 1.0; descriptors that barely change an icon rendered in the
+house style (colours, sizes, "cute", "simple") weigh DESCRIPTOR_WEIGHT.
+A match at or above the threshold returns the earlier icon's cache key.
+
+Lookups are a dict hit for an identical token set and otherwise score only
+the icons sharing a subject token (inverted index), which keeps them well
+under a millisecond with tens of thousands of entries. Entries are appended
+to a JSONL log so adds are O(1) on disk. The log is shared by every process
+using the cache directory: each lookup first reads in what other processes
+appended, and the log is compacted under a file lock once it grows well past
+the live set.
+
+Usage:
+    index = IconIndex(CACHE_DIR / "icon" / "similar.jsonl")
+    match = index.find("a red heart icon", context=context_key)
+    if match:
+        ... reuse match.cache_key ...
+    index.add("heart", cache_key, context=context_key)
+"""
+
+import os
+import re
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from file_lock import file_lock
+
+# Minimum weighted Jaccard similarity for two names to count as the same icon
+ICON_SIMILARITY_THRESHOLD = float(os.getenv("ICON_SIMILARITY_THRESHOLD", "0.75"))
+
+DESCRIPTOR_WEIGHT = 0.25
+
+STOP_WORDS = frozenset("""
+    a an the this that these those of for with and or in on to at by from
+    me my i we us our you your please pls can could would will want need like
+    make create generate give draw design render show get do new another one some
+    icon icons ui game button btn symbol sign image picture pic graphic logo emblem badge
+    style styled version kind type sort
+""".split())
+
+# Words that modify an icon without changing what it depicts
+DESCRIPTORS = frozenset("""
+    red orange yellow green blue purple violet pink white black gray grey brown gold golden
+    silver cyan teal magenta dark light bright pale
+    small big large tiny huge little mini cute simple plain basic fancy shiny glowing cool nice
+    old ancient flat detailed
+""".split())
+
+# Multi-word phrases collapsed to one token (matched on lemmas, longest first)
+PHRASES = {
+    "magnifying glass": "search",
+    "treasure chest": "chest",
+    "loot box": "chest",
+    "question mark": "question",
+    "exclamation mark": "exclamation",
+    "exclamation point": "exclamation",
+    "check mark": "check",
+    "light bulb": "bulb",
+    "hour glass": "hourglass",
+}
+
+# Synonyms mapped to one canonical token (applied after lemmatizing)
+SYNONYMS = {
+    "blade": "sword", "sabre": "sword", "saber": "sword", "katana": "sword", "longsword": "sword",
+    "love": "heart", "life": "heart", "health": "heart", "hp": "heart",
+    "jewel": "gem", "crystal": "gem", "diamond": "gem", "gemstone": "gem",
+    "flask": "potion", "vial": "potion", "elixir": "potion", "bottle": "potion",
+    "parchment": "scroll",
+    "cog": "gear", "settings": "gear", "setting": "gear", "options": "gear",
+    "house": "home",
+    "envelope": "mail", "letter": "mail", "message": "mail",
+    "magnifier": "search", "find": "search",
+    "padlock": "lock", "locked": "lock",
+    "trophy": "cup",
+    "coins": "coin", "money": "coin", "currency": "coin",
+    "favorite": "star", "favourite": "star",
+    "bin": "trash", "garbage": "trash", "delete": "trash",
+    "close": "x",
+    "tick": "check", "checkmark": "check", "confirm": "check",
+    "info": "information",
+    "skeleton": "skull",
+    "view": "eye", "vision": "eye",
+    "bag": "backpack", "inventory": "backpack",
+    "mallet": "hammer",
+}
+
+# Irregular forms the suffix rules would get wrong
+IRREGULAR = {
+    "knives": "knife", "leaves": "leaf", "wolves": "wolf", "staves": "staff", "lives": "life",
+    "halves": "half", "shelves": "shelf", "thieves": "thief", "elves": "elf", "dwarves": "dwarf",
+    "feet": "foot", "teeth": "tooth", "mice": "mouse", "geese": "goose", "men": "man",
+    "women": "woman", "children": "child", "dice": "die", "axes": "axe",
+}
+
+# Words ending in "s" that are not plurals
+NOT_PLURAL = frozenset({"cross", "glass", "compass", "boss", "moss", "bus", "gas", "lotus", "chaos",
+                        "atlas", "cactus", "iris", "canvas", "status", "bonus", "news", "this", "its"})
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def lemmatize(word: str) -> str:
+    """Cheap rule-based lemma: plural nouns and -ing/-ed verb forms."""
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) <= 3 or word in NOT_PLURAL:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            stem = word[:-len(suffix)]
+            # "burning" -> burn, "shielded" -> shield; undo a doubled consonant ("stopped")
+            if len(stem) > 4 and stem[-1] == stem[-2] and stem[-1] not in "lsz":
+                stem = stem[:-1]
+            return stem
+    return word
+
+
+_LEMMA_PHRASES = {" ".join(lemmatize(w) for w in phrase.split()): token for phrase, token in PHRASES.items()}
+_PHRASE = re.compile(r"\b(?:" + "|".join(re.escape(p) for p in sorted(_LEMMA_PHRASES, key=len, reverse=True)) + r")\b")
+
+
+def concept_tokens(name: str) -> FrozenSet[str]:
+    """Canonical token set for an icon name ("A red Heart icon" -> {"red", "heart"})."""
+    lemmas = []
+    for word in _WORD.findall(name.lower()):
+        if word in STOP_WORDS:
+            continue
+        lemma = lemmatize(word)
+        if lemma not in STOP_WORDS:
+            lemmas.append(SYNONYMS.get(word, lemma))
+    text = _PHRASE.sub(lambda m: _LEMMA_PHRASES[m.group(0)], " ".join(lemmas))
+    return frozenset(SYNONYMS.get(token, token) for token in text.split())
+
+
+def token_weight(token: str) -> float:
+    return DESCRIPTOR_WEIGHT if token in DESCRIPTORS else 1.0
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Weighted Jaccard similarity of two token sets."""
+    if not a and not b:
+        return 1.0
+    union = sum(token_weight(t) for t in a | b)
+    return sum(token_weight(t) for t in a & b) / union
+
+
+@dataclass(frozen=True)
+class IconMatch:
+    name: str
+    cache_key: str
+    score: float
+
+
+class IconIndex:
+    """
+    In-memory similarity index over past icon names, persisted as an
+    append-only JSONL log. Entries are scoped by `context` (the prompt,
+    references and model the icon was generated with) so an icon is never
+    matched against results produced under a different setup.
+
+    Like ResultCache's index, the log is appended to under a file lock and
+    re-read from where this process left off, so entries added or removed by
+    other workers are seen on their next lookup.
+    """
+
+    def __init__(self, log_path, threshold: float = ICON_SIMILARITY_THRESHOLD):
+        self.log_path = Path(log_path)
+        self.lock_path = self.log_path.with_suffix(".lock")
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # cache_key -> (name, tokens, context)
+        self._entries: Dict[str, Tuple[str, FrozenSet[str], str]] = {}
+        # (context, tokens) -> cache_key, for exact concept matches
+        self._exact: Dict[Tuple[str, FrozenSet[str]], str] = {}
+        # (context, subject token) -> cache keys
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        # How far into which log file this process has read
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+        self._log_lines = 0
+
+        # Metrics (per process)
+        self.hits = 0
+        self.misses = 0
+
+    # -- index ----------------------------------------------------------------
+
+    def _read_log(self):
+        """Apply the records appended since the last read (everything, after a compaction)."""
+        try:
+            with open(self.log_path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._log_inode:
+                    # New or replaced by a compaction: replay the file from the start
+                    self._log_inode, self._log_offset, self._log_lines = inode, 0, 0
+                    self._entries, self._exact, self._postings = {}, {}, {}
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Whole lines only; a line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        self._log_offset += end
+        for line in data[:end].splitlines():
+            self._log_lines += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn write from a crashed process
+            self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]):
+        if record.get("removed"):
+            self._remove(record["cache_key"])
+        else:
+            self._insert(record["name"], record["cache_key"], record.get("context", ""))
+
+    def _append(self, record: Dict[str, Any]):
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.lock_path):
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            # Catch up, re-applying our own record (idempotent) along with other processes'
+            self._read_log()
+        if self._log_lines > 2 * len(self._entries) + 1000:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only live entries (caller holds self._lock)."""
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.lock_path):
+            # Merge what other processes appended, so the rewrite drops nothing
+            self._read_log()
+            tmp = self.log_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                for cache_key, (name, _, context) in self._entries.items():
+                    f.write(json.dumps({"name": name, "cache_key": cache_key, "context": context}) + "\n")
+            tmp.replace(self.log_path)
+            self._log_inode = self.log_path.stat().st_ino
+            self._log_offset = self.log_path.stat().st_size
+            self._log_lines = len(self._entries)
+
+    @staticmethod
+    def _subjects(tokens: Iterable[str]) -> List[str]:
+        return [t for t in tokens if t not in DESCRIPTORS]
+
+    def _insert(self, name: str, cache_key: str, context: str):
+        self._remove(cache_key)
+        tokens = concept_tokens(name)
+        self._entries[cache_key] = (name, tokens, context)
+        self._exact[(context, tokens)] = cache_key
+        for token in self._subjects(tokens) or tokens:
+            self._postings.setdefault((context, token), set()).add(cache_key)
+
+    def _remove(self, cache_key: str):
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        _, tokens, context = entry
+        if self._exact.get((context, tokens)) == cache_key:
+            del self._exact[(context, tokens)]
+        for token in self._subjects(tokens) or tokens:
+            posting = self._postings.get((context, token))
+            if posting:
+                posting.discard(cache_key)
+                if not posting:
+                    del self._postings[(context, token)]
+
+    # -- public API -----------------------------------------------------------
+
+    def find(self, name: str, context: str = "", threshold: Optional[float] = None) -> Optional[IconMatch]:
+        """Best past icon whose name is at least `threshold` similar to `name`, or None."""
+        threshold = self.threshold if threshold is None else threshold
+        tokens = concept_tokens(name)
+        with self._lock:
+            # Pick up icons other processes added (or dropped) since the last lookup
+            self._read_log()
+            exact = self._exact.get((context, tokens))
+            if exact is not None:
+                self.hits += 1
+                return IconMatch(self._entries[exact][0], exact, 1.0)
+
+            # Only icons sharing a subject token can clear any sensible threshold
+            candidates: Set[str] = set()
+            for token in self._subjects(tokens) or tokens:
+                candidates |= self._postings.get((context, token), set())
+
+            best: Optional[IconMatch] = None
+            for cache_key in candidates:
+                entry_name, entry_tokens, _ = self._entries[cache_key]
+                score = similarity(tokens, entry_tokens)
+                if score >= threshold and (best is None or score > best.score):
+                    best = IconMatch(entry_name, cache_key, round(score, 4))
+
+            if best:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return best
+
+    def add(self, name: str, cache_key: str, context: str = ""):
+        """Record that `name` was generated and cached under `cache_key`."""
+        with self._lock:
+            self._insert(name, cache_key, context)
+            self._append({"name": name, "cache_key": cache_key, "context": context})
+
+    def discard(self, cache_key: str):
+        """Forget an entry (e.g. its cached file was evicted)."""
+        with self._lock:
+            self._read_log()
+            if cache_key in self._entries:
+                self._remove(cache_key)
+                self._append({"cache_key": cache_key, "removed": True})
+
+    def compact(self):
+        """Rewrite the log with only live entries (also done automatically as it grows)."""
+        with self._lock:
+            self._compact()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._read_log()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,587 @@
+"""
+Output Store
+============
+Managed storage for everything the generators write under output/.
+
+Files keep their usual names (output/icon/ICONBTN_HEART.png, output/gacha/<run>/...)
+so download URLs do not change, but each name is a hard link to a
+content-addressed blob in output/.store/blobs/. That gives:
+
+  - dedupe: identical outputs (the gacha art copied into every run folder,
+    a CTA regenerated with the same result) share one blob on disk
+  - a disk budget: when the blobs exceed OUTPUT_MAX_MB, whole outputs are
+    evicted, least recently used first (OUTPUT_EVICTION=lru) or oldest first
+    (OUTPUT_EVICTION=age); OUTPUT_MAX_AGE_DAYS also expires old outputs
+  - clean misses: evicted names are remembered, so /downloads answers
+    410 Gone instead of a bare 404 for a link that used to work
+
+An output is evicted as a group: the first two levels of its name, so
+a gacha run folder, or a boon sheet together with its sliced variants
+(boon/BOON_FIRE_UP.png and boon/BOON_FIRE_UP/...), goes at once.
+
+Names are always replaced by rename, never rewritten in place, because an
+in-place write would change the blob shared by every other name linked to
+it. Blobs are made read-only to catch writers that bypass the store.
+
+The name index is an append-only JSONL log (output/.store/index.jsonl),
+replayed on first use and compacted when it grows well past the live set.
+Every worker appends to the same log under a file lock and reads the other
+workers' records as it goes; compaction merges the on-disk log before
+rewriting it, so no worker's outputs are dropped.
+
+Inside `with OUTPUT_STORE.deferred() as held:` (and asyncio.to_thread work
+started from it) put_bytes() keeps the data in memory instead of writing it,
+so the API can answer with the image straight away and persist it with
+flush(held) in the background. read_bytes(), exists() and digest_of() see
+held writes, so code reading an output back before the flush still works.
+
+Usage:
+    from output_store import OUTPUT_STORE
+    OUTPUT_STORE.save_image(save_path, image)        # PIL image
+    OUTPUT_STORE.put_file(save_path, source=cached)  # copy a file in
+    OUTPUT_STORE.put_file(screenshot_path)           # adopt a file written by another tool
+    OUTPUT_STORE.status(path)                        # "live", "evicted" or "unknown"
+
+    python scripts/output_store.py --stats
+    python scripts/output_store.py --adopt     # bring an existing output/ tree under management
+    python scripts/output_store.py --sweep     # apply the budget and age limit now
+"""
+
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from file_lock import file_lock
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_ROOT = BASE_DIR / "output"
+
+OUTPUT_MAX_MB = float(os.getenv("OUTPUT_MAX_MB", "2048"))
+OUTPUT_MAX_AGE_DAYS = float(os.getenv("OUTPUT_MAX_AGE_DAYS", "0"))  # 0 = no age limit
+OUTPUT_EVICTION = os.getenv("OUTPUT_EVICTION", "lru").lower()      # lru | age
+
+STORE_DIR_NAME = ".store"
+# Evicted names remembered for 410 responses
+MAX_TOMBSTONES = 10000
+# Reads are logged at most this often per name (last-use times are kept in memory)
+TOUCH_LOG_INTERVAL_S = 60
+# Budget/age sweeps triggered by writes run at most this often
+SWEEP_INTERVAL_S = 60
+
+PIL_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".gif": "GIF"}
+
+# Names written while deferred() is active in this context, or None
+_held: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("output_store_held", default=None)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_path(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OutputStore:
+    """
+    Content-addressed store behind the output/ tree. Paths outside `root`
+    are written normally and not tracked, so callers can pass any path.
+    """
+
+    def __init__(self, root, max_bytes: int = int(OUTPUT_MAX_MB * 1024 * 1024),
+                 max_age_s: float = OUTPUT_MAX_AGE_DAYS * 86400, policy: str = OUTPUT_EVICTION):
+        if policy not in ("lru", "age"):
+            raise ValueError(f"Unknown eviction policy: {policy} (use lru or age)")
+        self.root = Path(root).resolve()
+        self.store_dir = self.root / STORE_DIR_NAME
+        self.blob_dir = self.store_dir / "blobs"
+        self.log_path = self.store_dir / "index.jsonl"
+        self.lock_path = self.store_dir / "index.lock"
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.policy = policy
+        self._lock = threading.RLock()
+        self._loaded = False
+        # name -> {"digest", "size", "created", "last_used"}
+        self._names: Dict[str, dict] = {}
+        # group -> names
+        self._groups: Dict[str, Set[str]] = {}
+        # digest -> (size, reference count)
+        self._blobs: Dict[str, Tuple[int, int]] = {}
+        self._bytes = 0
+        # evicted name -> eviction time
+        self._tombstones: Dict[str, float] = {}
+        self._touch_logged: Dict[str, float] = {}
+        # name -> (data, digest) held in memory by deferred() until flushed
+        self._pending: Dict[str, Tuple[bytes, str]] = {}
+        # How far into which log file this process has read
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+        self._log_lines = 0
+        self._last_sweep = 0.0
+
+        # Metrics (per process)
+        self.writes = 0
+        self.deduped = 0
+        self.evictions = 0
+
+    # -- naming ---------------------------------------------------------------
+
+    def name_for(self, path) -> Optional[str]:
+        """Store name ("icon/ICONBTN_HEART.png") for a path under root, else None."""
+        try:
+            rel = Path(os.path.abspath(path)).relative_to(self.root)
+        except ValueError:
+            return None
+        if not rel.parts or rel.parts[0] == STORE_DIR_NAME:
+            return None
+        return rel.as_posix()
+
+    @staticmethod
+    def group_of(name: str) -> str:
+        """Eviction unit: the first two levels of a name, without suffix."""
+        parts = name.split("/")
+        head = parts[:2]
+        head[-1] = os.path.splitext(head[-1])[0]
+        return "/".join(head)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    # -- index ----------------------------------------------------------------
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        self._read_log()
+
+    def _read_log(self):
+        """Apply the records appended since the last read (everything, after a compaction)."""
+        try:
+            with open(self.log_path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                previous = None
+                if inode != self._log_inode:
+                    # Replaced by a compaction: replay the new file from the start
+                    previous = self._names
+                    self._names, self._groups, self._blobs, self._bytes = {}, {}, {}, 0
+                    self._tombstones = {}
+                    self._log_inode, self._log_offset, self._log_lines = inode, 0, 0
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Whole lines only; a line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        self._log_offset += end
+        for line in data[:end].splitlines():
+            self._log_lines += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn write from a crashed process
+            self._apply(record)
+        if previous:
+            # Keep last-use times this process has not logged yet
+            for name, entry in self._names.items():
+                if name in previous:
+                    entry["last_used"] = max(entry["last_used"], previous[name]["last_used"])
+
+    def _apply(self, record: dict):
+        op = record.get("op")
+        name = record.get("name")
+        if op == "put":
+            self._insert(name, record["digest"], record["size"], record["t"], record.get("used", record["t"]))
+        elif op == "touch" and name in self._names:
+            entry = self._names[name]
+            entry["last_used"] = max(entry["last_used"], record["t"])
+        elif op in ("evict", "discard"):
+            self._remove(name)
+            if op == "evict":
+                self._tombstones[name] = record["t"]
+
+    def _append(self, record: dict):
+        with file_lock(self.lock_path):
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            # Catch up, re-applying our own record (idempotent) along with other processes'
+            self._read_log()
+        if self._log_lines > 2 * (len(self._names) + len(self._tombstones)) + 1000:
+            self._compact()
+
+    def _compact(self):
+        with file_lock(self.lock_path):
+            # Merge what other processes appended, so the rewrite drops nothing
+            self._read_log()
+            tmp = self.log_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                for name, when in self._tombstones.items():
+                    f.write(json.dumps({"op": "evict", "name": name, "t": when}) + "\n")
+                for name, entry in self._names.items():
+                    f.write(json.dumps({"op": "put", "name": name, "digest": entry["digest"], "size": entry["size"],
+                                        "t": entry["created"], "used": entry["last_used"]}) + "\n")
+            tmp.replace(self.log_path)
+            stat = self.log_path.stat()
+            self._log_inode, self._log_offset = stat.st_ino, stat.st_size
+            self._log_lines = len(self._tombstones) + len(self._names)
+
+    def _insert(self, name: str, digest: str, size: int, created: float, last_used: float):
+        self._remove(name)
+        self._names[name] = {"digest": digest, "size": size, "created": created, "last_used": last_used}
+        self._groups.setdefault(self.group_of(name), set()).add(name)
+        blob_size, refs = self._blobs.get(digest, (size, 0))
+        if refs == 0:
+            self._bytes += blob_size
+        self._blobs[digest] = (blob_size, refs + 1)
+        self._tombstones.pop(name, None)
+
+    def _remove(self, name: str) -> Optional[str]:
+        """Drop `name` from the index; returns its digest if that blob is now unreferenced."""
+        entry = self._names.pop(name, None)
+        if entry is None:
+            return None
+        group = self.group_of(name)
+        members = self._groups.get(group)
+        if members:
+            members.discard(name)
+            if not members:
+                del self._groups[group]
+        self._touch_logged.pop(name, None)
+        size, refs = self._blobs[entry["digest"]]
+        if refs > 1:
+            self._blobs[entry["digest"]] = (size, refs - 1)
+            return None
+        del self._blobs[entry["digest"]]
+        self._bytes -= size
+        return entry["digest"]
+
+    # -- files ----------------------------------------------------------------
+
+    def _store_blob(self, digest: str, write) -> Path:
+        """Create the blob for `digest` with write(tmp_path) unless it already exists."""
+        blob = self._blob_path(digest)
+        if blob.exists():
+            self.deduped += 1
+            return blob
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(f".{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        write(tmp)
+        os.chmod(tmp, 0o444)
+        tmp.replace(blob)
+        return blob
+
+    @staticmethod
+    def _link(blob: Path, path: Path):
+        """Point `path` at `blob` atomically (hard link, or a copy where links are unsupported)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Already linked (same output regenerated); renaming a link onto itself would leave the tmp behind
+        if path.exists() and os.path.samefile(blob, path):
+            return
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        tmp.replace(path)
+
+    def _unlink_name(self, name: str):
+        path = self.root / name
+        path.unlink(missing_ok=True)
+        # Remove directories left empty (gacha run folders, boon variant folders), keeping output/<type>/
+        parent = path.parent
+        while self.root in parent.parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def _commit(self, name: str, digest: str, size: int):
+        """Record a written name, release the blob it replaced and apply the budget."""
+        now = time.time()
+        previous = self._names.get(name, {}).get("digest")
+        orphan = self._remove(name) if previous and previous != digest else None
+        if orphan:
+            self._blob_path(orphan).unlink(missing_ok=True)
+        self._insert(name, digest, size, now, now)
+        self._append({"op": "put", "name": name, "digest": digest, "size": size, "t": now})
+        self.writes += 1
+        self._enforce(keep=self.group_of(name))
+
+    # -- public API -----------------------------------------------------------
+
+    def put_bytes(self, path, data: bytes) -> Path:
+        """Write `data` to `path` (atomically, deduplicated when under root)."""
+        path = Path(path)
+        name = self.name_for(path)
+        if name is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            return path
+        digest = hash_bytes(data)
+        held = _held.get()
+        if held is not None:
+            with self._lock:
+                self._pending[name] = (data, digest)
+            held.append(name)
+            return path
+        self._write(name, data, digest)
+        return path
+
+    def _write(self, name: str, data: bytes, digest: str):
+        with self._lock:
+            self._load()
+            blob = self._store_blob(digest, lambda tmp: tmp.write_bytes(data))
+            self._link(blob, self.root / name)
+            self._commit(name, digest, len(data))
+
+    def put_file(self, path, source=None) -> Path:
+        """
+        Store the file at `source` under `path`, or with no source adopt a file
+        another tool already wrote at `path` (e.g. a Playwright screenshot).
+        """
+        path = Path(path)
+        source = Path(source) if source is not None else path
+        name = self.name_for(path)
+        if name is None:
+            if source != path:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(source, path)
+            return path
+        digest = hash_path(source)
+        size = source.stat().st_size
+        with self._lock:
+            self._load()
+            self._pending.pop(name, None)
+            blob = self._store_blob(digest, lambda tmp: shutil.copyfile(source, tmp))
+            self._link(blob, path)
+            self._commit(name, digest, size)
+        return path
+
+    def save_image(self, path, image, **save_kwargs) -> Path:
+        """
+        Store an image at `path`: a google.genai Image is written as its bytes
+        (like Image.save), a PIL image is encoded by the path's suffix (PNG by default).
+        """
+        data = getattr(image, "image_bytes", None)
+        if data is not None:
+            return self.put_bytes(path, data)
+        buffer = io.BytesIO()
+        image.save(buffer, PIL_FORMATS.get(Path(path).suffix.lower(), "PNG"), **save_kwargs)
+        return self.put_bytes(path, buffer.getvalue())
+
+    def write_text(self, path, text: str) -> Path:
+        return self.put_bytes(path, text.encode("utf-8"))
+
+    def discard(self, path):
+        """Delete a stored file that is being replaced (no tombstone)."""
+        path = Path(path)
+        name = self.name_for(path)
+        with self._lock:
+            self._load()
+            self._pending.pop(name, None)
+            if name is not None and name in self._names:
+                orphan = self._remove(name)
+                if orphan:
+                    self._blob_path(orphan).unlink(missing_ok=True)
+                self._append({"op": "discard", "name": name, "t": time.time()})
+        path.unlink(missing_ok=True)
+
+    # -- deferred writes ------------------------------------------------------
+
+    @contextmanager
+    def deferred(self):
+        """Hold put_bytes() writes made in this context in memory; yields the held names for flush()."""
+        held: List[str] = []
+        token = _held.set(held)
+        try:
+            yield held
+        finally:
+            _held.reset(token)
+
+    def flush(self, names: Iterable[str]) -> int:
+        """Write held outputs to disk (latest data per name); returns the number written."""
+        written = 0
+        for name in dict.fromkeys(names):
+            with self._lock:
+                pending = self._pending.get(name)
+            if pending is None:
+                continue  # already flushed, or replaced by a direct write
+            data, digest = pending
+            self._write(name, data, digest)
+            with self._lock:
+                if self._pending.get(name) is pending:
+                    del self._pending[name]
+            written += 1
+        return written
+
+    def held_bytes(self, path) -> Optional[bytes]:
+        """Contents of an output still held in memory, else None."""
+        pending = self._pending.get(self.name_for(path))
+        return pending[0] if pending else None
+
+    def read_bytes(self, path) -> bytes:
+        """Contents of an output, held or on disk."""
+        data = self.held_bytes(path)
+        return data if data is not None else Path(path).read_bytes()
+
+    def exists(self, path) -> bool:
+        return self.name_for(path) in self._pending or Path(path).is_file()
+
+    def digest_of(self, path) -> Optional[str]:
+        """SHA-256 of a tracked or held output (its strong ETag), else None."""
+        name = self.name_for(path)
+        with self._lock:
+            pending = self._pending.get(name)
+            if pending:
+                return pending[1]
+            self._load()
+            entry = self._names.get(name)
+            return entry["digest"] if entry else None
+
+    def blob_path(self, digest: str) -> Path:
+        """On-disk content for a digest (may be absent until a held write is flushed)."""
+        return self._blob_path(digest)
+
+    def status(self, path) -> str:
+        """"live" (tracked), "evicted" (was here, removed by the budget) or "unknown"."""
+        name = self.name_for(path)
+        if name is None:
+            return "unknown"
+        with self._lock:
+            self._load()
+            if name in self._names:
+                return "live"
+            return "evicted" if name in self._tombstones else "unknown"
+
+    def touch(self, path):
+        """Mark a stored file as used (for LRU eviction)."""
+        name = self.name_for(path)
+        with self._lock:
+            self._load()
+            entry = self._names.get(name)
+            if entry is None:
+                return
+            now = time.time()
+            entry["last_used"] = now
+            if now - self._touch_logged.get(name, 0.0) >= TOUCH_LOG_INTERVAL_S:
+                self._touch_logged[name] = now
+                self._append({"op": "touch", "name": name, "t": now})
+
+    # -- eviction -------------------------------------------------------------
+
+    def _group_time(self, members: Set[str]) -> float:
+        field = "last_used" if self.policy == "lru" else "created"
+        return max(self._names[name][field] for name in members)
+
+    def _evict_group(self, group: str, now: float):
+        for name in list(self._groups.get(group, ())):
+            orphan = self._remove(name)
+            if orphan:
+                self._blob_path(orphan).unlink(missing_ok=True)
+            self._unlink_name(name)
+            self._tombstones[name] = now
+            self._append({"op": "evict", "name": name, "t": now})
+        while len(self._tombstones) > MAX_TOMBSTONES:
+            self._tombstones.pop(next(iter(self._tombstones)))
+        self.evictions += 1
+        print(f"[OutputStore] Evicted {group}")
+
+    def _enforce(self, keep: Optional[str] = None, force: bool = False) -> int:
+        """Evict groups over the age limit or the byte budget; returns groups evicted."""
+        now = time.time()
+        over_budget = self._bytes > self.max_bytes
+        if not over_budget and not force and now - self._last_sweep < SWEEP_INTERVAL_S:
+            return 0
+        self._last_sweep = now
+        ordered = sorted((self._group_time(members), group) for group, members in self._groups.items())
+        evicted = 0
+        for when, group in ordered:
+            expired = self.max_age_s > 0 and now - when > self.max_age_s
+            if not expired and self._bytes <= self.max_bytes:
+                break
+            if group == keep:
+                continue
+            self._evict_group(group, now)
+            evicted += 1
+        return evicted
+
+    def sweep(self) -> int:
+        """Apply the age limit and byte budget now; returns the number of outputs evicted."""
+        with self._lock:
+            self._load()
+            return self._enforce(force=True)
+
+    def adopt_tree(self, directory=None) -> int:
+        """
+        Bring untracked files under root (or under `directory`) under management:
+        outputs written before the store existed, or by worker processes.
+        """
+        adopted = 0
+        for path in self._walk(Path(directory) if directory else self.root):
+            name = self.name_for(path)
+            with self._lock:
+                self._load()
+                tracked = name in self._names
+            if not tracked:
+                self.put_file(path)
+                adopted += 1
+        return adopted
+
+    def _walk(self, directory: Path) -> Iterator[Path]:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if not filename.startswith("."):
+                    yield Path(dirpath) / filename
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {
+                "outputs": len(self._groups),
+                "files": len(self._names),
+                "blobs": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_age_days": round(self.max_age_s / 86400, 2),
+                "policy": self.policy,
+                "evicted_names": len(self._tombstones),
+                "pending_writes": len(self._pending),
+                "writes": self.writes,
+                "deduped": self.deduped,
+                "evictions": self.evictions,
+            }
+
+
+OUTPUT_STORE = OutputStore(OUTPUT_ROOT)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and maintain the managed output/ tree")
+    parser.add_argument("--stats", action="store_true", help="Show store statistics")
+    parser.add_argument("--adopt", action="store_true", help="Track files written before the store existed")
+    parser.add_argument("--sweep", action="store_true", help="Apply the disk budget and age limit now")
+    args = parser.parse_args()
+
+    if args.adopt:
+        print(f"Adopted {OUTPUT_STORE.adopt_tree()} files")
+    if args.sweep:
+        print(f"Evicted {OUTPUT_STORE.sweep()} outputs")
+    if args.stats or not (args.adopt or args.sweep):
+        print(json.dumps(OUTPUT_STORE.stats(), indent=2))
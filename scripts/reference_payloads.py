@@ -0,0 +1,319 @@
+"""
+Reference Payloads
+==================
+Pre-encoded, size-capped image payloads for Gemini requests.
+
+Passing a PIL image to generate_content makes the SDK re-encode it as PNG on
+every call, at full resolution. Reference assets never change between
+requests, so each one is downscaled and encoded once per process and the
+same bytes are sent with every request. Missing references are remembered
+too, so an absent file is probed once rather than on every call.
+
+With GEMINI_REFERENCE_MODE=files, references are instead uploaded once via
+the Files API and sent as file handles, so a request carries little more
+than the prompt text. Handles are re-uploaded before they expire, and
+call_with_references() re-uploads and retries once if the service rejects a
+handle early.
+
+Usage:
+    report = PayloadReport()
+    frame = load_reference(ASSETS_DIR / "frame.png", report=report)
+    contents = [prompt, reference_part(frame, client, report)]
+    print(report.summary())
+"""
+
+import io
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from asset_bundle import open_asset
+
+# Longest side of an encoded reference - style references don't need more
+REFERENCE_MAX_SIDE = int(os.getenv("REFERENCE_MAX_SIDE", "768"))
+
+# WebP keeps alpha and is ~10x smaller than PNG for these assets
+REFERENCE_FORMAT = "WEBP"
+REFERENCE_QUALITY = 90
+
+MIME_TYPES = {"WEBP": "image/webp", "PNG": "image/png", "JPEG": "image/jpeg"}
+
+# "inline" sends encoded bytes with every request; "files" uploads once and sends handles
+REFERENCE_MODE = os.getenv("GEMINI_REFERENCE_MODE", "inline").lower()
+
+# Re-upload a handle this long before the service says it expires
+FILE_REFRESH_MARGIN = timedelta(minutes=10)
+
+
+@dataclass(frozen=True)
+class ReferencePayload:
+    """An encoded image ready to send as an inline request part."""
+    name: str
+    data: bytes
+    mime_type: str
+    size: Tuple[int, int]
+    source_bytes: int
+    encode_ms: float
+    
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+    
+    def as_part(self):
+        from google.genai import types
+        return types.Part.from_bytes(data=self.data, mime_type=self.mime_type)
+
+
+class PayloadReport:
+    """Upload bytes and encode time for the images in one request."""
+    
+    def __init__(self):
+        self.images = 0
+        self.upload_bytes = 0
+        self.source_bytes = 0
+        self.encode_ms = 0.0
+        self.handles = 0
+        self.file_upload_bytes = 0
+        self._sent_as_handle = set()
+    
+    def add(self, payload: ReferencePayload, encoded_now: bool):
+        self.images += 1
+        self.upload_bytes += len(payload.data)
+        self.source_bytes += payload.source_bytes
+        if encoded_now:
+            self.encode_ms += payload.encode_ms
+    
+    def sent_as_handle(self, payload: ReferencePayload, uploaded_now: bool):
+        """Record that a payload went out as a file handle instead of inline bytes."""
+        if payload.digest not in self._sent_as_handle:
+            # Count each payload once, even if a retry re-sends it
+            self._sent_as_handle.add(payload.digest)
+            self.handles += 1
+            self.upload_bytes -= len(payload.data)
+        if uploaded_now:
+            self.file_upload_bytes += len(payload.data)
+    
+    def summary(self) -> str:
+        summary = (f"{self.images} images, {self.upload_bytes / 1024:.1f} KB upload "
+                   f"(source {self.source_bytes / 1024:.1f} KB), "
+                   f"encode {self.encode_ms:.1f} ms this call")
+        if self.handles:
+            summary += (f", {self.handles} via file handles "
+                        f"({self.file_upload_bytes / 1024:.1f} KB uploaded this call)")
+        return summary
+
+
+def encode_image(image: Image.Image, name: str = "image",
+                 max_side: int = REFERENCE_MAX_SIDE,
+                 report: Optional[PayloadReport] = None,
+                 source_bytes: int = 0) -> ReferencePayload:
+    """Downscale (never upscale) and encode an image for upload."""
+    start = time.perf_counter()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    
+    buf = io.BytesIO()
+    image.save(buf, REFERENCE_FORMAT, quality=REFERENCE_QUALITY)
+    payload = ReferencePayload(
+        name=name,
+        data=buf.getvalue(),
+        mime_type=MIME_TYPES[REFERENCE_FORMAT],
+        size=image.size,
+        source_bytes=source_bytes,
+        encode_ms=(time.perf_counter() - start) * 1000,
+    )
+    if report is not None:
+        report.add(payload, encoded_now=True)
+    return payload
+
+
+# (path, max_side) -> (mtime_ns, payload or None if the file is missing)
+_payloads: Dict[Tuple[str, int], Tuple[int, Optional[ReferencePayload]]] = {}
+_lock = threading.Lock()
+
+
+def load_reference(path, max_side: int = REFERENCE_MAX_SIDE,
+                   report: Optional[PayloadReport] = None) -> Optional[ReferencePayload]:
+    """
+    Return the encoded payload for a reference asset, encoding it on first use.
+    Returns None for a missing file (and remembers that it is missing).
+    """
+    path = Path(path)
+    key = (str(path), max_side)
+    with _lock:
+        cached = _payloads.get(key)
+        if cached is not None and cached[1] is None:
+            return None
+        
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            print(f"Skipping missing asset: {path}")
+            _payloads[key] = (0, None)
+            return None
+        
+        if cached is not None and cached[0] == mtime:
+            if report is not None:
+                report.add(cached[1], encoded_now=False)
+            return cached[1]
+        
+        with open_asset(path) as image:
+            payload = encode_image(image, name=path.name, max_side=max_side,
+                                   report=report, source_bytes=path.stat().st_size)
+        _payloads[key] = (mtime, payload)
+        return payload
+
+
+# =============================================================================
+# FILE HANDLES (GEMINI_REFERENCE_MODE=files)
+# =============================================================================
+
+class ReferenceFileHandles:
+    """
+    Uploads each reference payload once per client through the Files API and
+    hands out file_uri parts, re-uploading when a handle is about to expire.
+    """
+    
+    def __init__(self):
+        # (id(client), payload digest) -> uploaded types.File
+        self._handles: Dict[Tuple[int, str], Any] = {}
+        self._lock = threading.Lock()
+        # In-flight async uploads, so concurrent requests share one upload per payload
+        self._uploading: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.uploads = 0
+    
+    @staticmethod
+    def _expiring(handle) -> bool:
+        expires = getattr(handle, "expiration_time", None)
+        if expires is None:
+            return False
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        return expires - FILE_REFRESH_MARGIN <= datetime.now(timezone.utc)
+    
+    def handle_for(self, client, payload: ReferencePayload) -> Tuple[Any, bool]:
+        """Return (file handle, uploaded_now) for a payload."""
+        from google.genai import types
+        
+        key = (id(client), payload.digest)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and not self._expiring(handle):
+                return handle, False
+            handle = client.files.upload(
+                file=io.BytesIO(payload.data),
+                config=types.UploadFileConfig(mime_type=payload.mime_type, display_name=payload.name),
+            )
+            self._handles[key] = handle
+            self.uploads += 1
+            print(f"Uploaded reference {payload.name} -> {handle.name}")
+            return handle, True
+    
+    async def handle_for_async(self, client, payload: ReferencePayload) -> Tuple[Any, bool]:
+        """Async handle_for(), uploading through client.aio."""
+        from google.genai import types
+        
+        key = (id(client), payload.digest)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and not self._expiring(handle):
+                return handle, False
+        
+        pending = self._uploading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending), False
+        
+        pending = asyncio.ensure_future(client.aio.files.upload(
+            file=io.BytesIO(payload.data),
+            config=types.UploadFileConfig(mime_type=payload.mime_type, display_name=payload.name),
+        ))
+        self._uploading[key] = pending
+        try:
+            handle = await asyncio.shield(pending)
+        finally:
+            self._uploading.pop(key, None)
+        with self._lock:
+            self._handles[key] = handle
+            self.uploads += 1
+        print(f"Uploaded reference {payload.name} -> {handle.name}")
+        return handle, True
+    
+    def invalidate(self, client=None):
+        """Forget handles (for one client, or all) so the next use re-uploads."""
+        with self._lock:
+            if client is None:
+                self._handles.clear()
+            else:
+                for key in [k for k in self._handles if k[0] == id(client)]:
+                    del self._handles[key]
+
+
+FILE_HANDLES = ReferenceFileHandles()
+
+
+def reference_part(payload: ReferencePayload, client=None, report: Optional[PayloadReport] = None):
+    """Request part for a reference: a file handle in "files" mode, inline bytes otherwise."""
+    if REFERENCE_MODE != "files" or client is None:
+        return payload.as_part()
+    
+    from google.genai import types
+    handle, uploaded_now = FILE_HANDLES.handle_for(client, payload)
+    if report is not None:
+        report.sent_as_handle(payload, uploaded_now)
+    return types.Part.from_uri(file_uri=handle.uri, mime_type=handle.mime_type or payload.mime_type)
+
+
+async def reference_part_async(payload: ReferencePayload, client=None,
+                               report: Optional[PayloadReport] = None):
+    """Async reference_part(); uploads without blocking the event loop."""
+    if REFERENCE_MODE != "files" or client is None:
+        return payload.as_part()
+    
+    from google.genai import types
+    handle, uploaded_now = await FILE_HANDLES.handle_for_async(client, payload)
+    if report is not None:
+        report.sent_as_handle(payload, uploaded_now)
+    return types.Part.from_uri(file_uri=handle.uri, mime_type=handle.mime_type or payload.mime_type)
+
+
+def call_with_references(client, build_contents: Callable[[], List[Any]],
+                         call: Callable[[List[Any]], Any]):
+    """
+    Run call(build_contents()). In "files" mode, if the service rejects the
+    request (e.g. a handle expired early or was deleted), drop this client's
+    handles, rebuild the contents (re-uploading) and retry once.
+    """
+    try:
+        return call(build_contents())
+    except Exception as e:
+        code = getattr(e, "code", None)
+        if REFERENCE_MODE != "files" or code not in (400, 403, 404):
+            raise
+        print(f"Reference handles rejected ({code}), re-uploading and retrying...")
+        FILE_HANDLES.invalidate(client)
+        return call(build_contents())
+
+
+async def call_with_references_async(client, build_contents: Callable[[], Awaitable[List[Any]]],
+                                     call: Callable[[List[Any]], Awaitable[Any]]):
+    """Async call_with_references(); build_contents and call are coroutine functions."""
+    try:
+        return await call(await build_contents())
+    except Exception as e:
+        code = getattr(e, "code", None)
+        if REFERENCE_MODE != "files" or code not in (400, 403, 404):
+            raise
+        print(f"Reference handles rejected ({code}), re-uploading and retrying...")
+        FILE_HANDLES.invalidate(client)
+        return await call(await build_contents())
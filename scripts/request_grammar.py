@@ -0,0 +1,223 @@
+"""
+Request Grammar
+===============
+One set of rules for reading card, gacha and CTA requests, shared by the
+chat API's IntentParser (backend/services/parser.py), generate_card's
+CommandParser and generate_gacha's GachaPullParser, so a message is parsed
+once and the generators receive typed intents instead of strings.
+
+    parse_card("5 star might card for Elara")
+        -> CardIntent(character="Elara", rarity="5star", calling="Might")
+    parse_gacha("1 5star primal, 9 3star sorcery")
+        -> GachaIntent(primal_5star=1, sorcery_3star=9, ...)
+    parse_cta("secondary button that says 'BACK' in red", "secondary")
+        -> CtaIntent(button_type="secondary", text="BACK", color="red")
+"""
+
+import re
+from dataclasses import dataclass
+from typing import ClassVar, Dict, Optional, Union
+
+# =============================================================================
+# VOCABULARY
+# =============================================================================
+
+CALLINGS = ("Cunning", "Might", "Wisdom", "Spirit", "Shadow")
+RARITIES = ("3star", "4star", "5star")
+# When a request mentions several rarities, the first of these wins (the chat parser's rule)
+RARITY_PRECEDENCE = ("4star", "5star", "3star")
+
+# Words that never belong to a character name
+CARD_STOP_WORDS = frozenset([
+    "card", "sorcery", "primal", "create", "make", "generate", "give", "me", "a", "an",
+    "the", "of", "for", "with", "calling", "star", "3star", "4star", "5star", "rarity", "type", "class",
+] + [c.lower() for c in CALLINGS])
+
+# "5 star", "5star", "5-star"; "rarity: 5"
+RARITY_MENTION = re.compile(r'\b([345])\s*-?\s*star|\brarity[:\s]+([345])\b')
+# "calling: cunning", "class might", "type: spirit" - any word, so the field is
+# kept out of character names; only CALLINGS are accepted as the calling
+CALLING_FIELD = re.compile(r'\b(?:calling|class|type)[:\s]+(\w+)')
+
+# Gacha rarity words, as accepted in pull specs
+GACHA_RARITY = {
+    "5star": 5, "5-star": 5, "legendary": 5, "gold": 5, "ssr": 5,
+    "4star": 4, "4-star": 4, "epic": 4, "purple": 4, "sr": 4,
+    "3star": 3, "3-star": 3, "rare": 3, "blue": 3, "common": 3, "r": 3,
+}
+GACHA_GROUP = re.compile(
+    r'(\d+)\s*(?:x\s*)?(\d+[- ]?star|legendary|epic|rare|common|gold|purple|blue|ssr|sr|r)?\s*'
+    r'(primal|sorcery|primals|sorcerys|sorceries)'
+)
+GACHA_PULL_SIZE = 10
+
+CTA_QUOTED_TEXT = re.compile(r'["\']([^"\']+)["\']')
+CTA_TEXT_PATTERNS = [
+    re.compile(r'says?\s+(\w+(?:\s+\w+)?)', re.IGNORECASE),
+    re.compile(r'labeled?\s+(\w+(?:\s+\w+)?)', re.IGNORECASE),
+    re.compile(r'with\s+text\s+(\w+(?:\s+\w+)?)', re.IGNORECASE),
+    re.compile(r':\s*(\w+(?:\s+\w+)?)\s*$', re.IGNORECASE),
+]
+CTA_CAPS_TEXT = re.compile(r'\b([A-Z]{2,}(?:\s+[A-Z]{2,})?)\b')
+CTA_COLOR = re.compile(r'(?:in|with|using)\s+(\w+)\s*(?:color|theme)?')
+
+
+# =============================================================================
+# TYPED INTENTS
+# =============================================================================
+
+@dataclass(frozen=True)
+class IconIntent:
+    asset_type: ClassVar[str] = "icon"
+    name: str
+
+    def params(self) -> dict:
+        return {"name": self.name}
+
+
+@dataclass(frozen=True)
+class CtaIntent:
+    asset_type: ClassVar[str] = "cta"
+    button_type: str
+    text: str
+    color: Optional[str] = None
+
+    def params(self) -> dict:
+        return {"type": self.button_type, "text": self.text, "color": self.color}
+
+
+@dataclass(frozen=True)
+class BoonIntent:
+    asset_type: ClassVar[str] = "boon"
+    boon: str
+    subicon: str
+
+    def params(self) -> dict:
+        return {"boon": self.boon, "subicon": self.subicon}
+
+
+@dataclass(frozen=True)
+class CardIntent:
+    asset_type: ClassVar[str] = "card"
+    character: str
+    rarity: Optional[str] = None
+    calling: Optional[str] = None
+
+    def params(self) -> dict:
+        return {"character": self.character, "rarity": self.rarity, "calling": self.calling}
+
+
+@dataclass(frozen=True)
+class GachaIntent:
+    asset_type: ClassVar[str] = "gacha"
+    primal_5star: int = 0
+    primal_4star: int = 0
+    primal_3star: int = 0
+    sorcery_5star: int = 0
+    sorcery_4star: int = 0
+    sorcery_3star: int = 0
+    # The request as written, kept for labels and API details
+    spec: str = ""
+
+    def counts(self) -> Dict[str, int]:
+        """Card counts keyed like GachaPullParser.create_pull kwargs."""
+        return {
+            "primal_5star": self.primal_5star, "primal_4star": self.primal_4star,
+            "primal_3star": self.primal_3star, "sorcery_5star": self.sorcery_5star,
+            "sorcery_4star": self.sorcery_4star, "sorcery_3star": self.sorcery_3star,
+        }
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts().values())
+
+    def params(self) -> dict:
+        return {"pull": self.spec}
+
+
+Intent = Union[IconIntent, CtaIntent, BoonIntent, CardIntent, GachaIntent]
+
+
+# =============================================================================
+# CARDS
+# =============================================================================
+
+def parse_rarity(text: str) -> Optional[str]:
+    """
+    Rarity mentioned ("5 star", "4-star", "rarity: 3"), or None. If several
+    are mentioned, RARITY_PRECEDENCE decides ("4 star ... 5 star" -> 4star).
+    """
+    mentioned = {f"{star or field}star" for star, field in RARITY_MENTION.findall(text.lower())}
+    return next((rarity for rarity in RARITY_PRECEDENCE if rarity in mentioned), None)
+
+
+def parse_calling(text: str) -> Optional[str]:
+    """First known calling in CALLINGS order, or None ("type: fire" is not a calling)."""
+    text = text.lower()
+    for calling in CALLINGS:
+        if calling.lower() in text:
+            return calling
+    return None
+
+
+def parse_character(text: str) -> str:
+    """Character name: what is left once rarity, calling and command words are removed."""
+    text = RARITY_MENTION.sub(" ", text.lower())
+    text = CALLING_FIELD.sub(" ", text)
+    text = re.sub(r"[^\w\s'-]", " ", text)
+    words = [w for w in text.split() if w not in CARD_STOP_WORDS and not w.isdigit()]
+    return " ".join(words).title()
+
+
+def parse_card(text: str) -> CardIntent:
+    """Card request -> CardIntent; rarity and calling are None when not mentioned."""
+    text = text.lower()
+    return CardIntent(character=parse_character(text), rarity=parse_rarity(text), calling=parse_calling(text))
+
+
+# =============================================================================
+# GACHA
+# =============================================================================
+
+def parse_gacha(spec: str) -> GachaIntent:
+    """
+    Pull spec -> GachaIntent, e.g. "1 5star primal, 9 3star sorcery". Groups
+    without a rarity count as 3star. Counts are kept as written; the pull
+    itself is capped at GACHA_PULL_SIZE cards, primals and higher rarities first.
+    """
+    counts: Dict[str, int] = {}
+    for count, rarity_word, card_word in GACHA_GROUP.findall(spec.lower()):
+        rarity = GACHA_RARITY.get(rarity_word.replace(" ", "").replace("-", ""), 3) if rarity_word else 3
+        kind = "primal" if "primal" in card_word else "sorcery"
+        key = f"{kind}_{rarity}star"
+        counts[key] = counts.get(key, 0) + int(count)
+    return GachaIntent(spec=spec, **counts)
+
+
+# =============================================================================
+# CTA BUTTONS
+# =============================================================================
+
+def parse_cta_text(message: str) -> str:
+    """Button text: quoted text, then "says X"/"labeled X"/..., then CAPS words, else BUTTON."""
+    quoted = CTA_QUOTED_TEXT.search(message)
+    if quoted:
+        return quoted.group(1).upper()
+    for pattern in CTA_TEXT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return match.group(1).upper()
+    caps = CTA_CAPS_TEXT.findall(message)
+    return caps[0] if caps else "BUTTON"
+
+
+def parse_cta_color(message: str) -> Optional[str]:
+    """Color after "in"/"with"/"using", if any ("in red", "with gold theme")."""
+    match = CTA_COLOR.search(message.lower())
+    if match and match.group(1) not in ("text", "a", "the"):
+        return match.group(1)
+    return None
+
+
+def parse_cta(message: str, button_type: str = "primary") -> CtaIntent:
+    return CtaIntent(button_type=button_type, text=parse_cta_text(message), color=parse_cta_color(message))
@@ -0,0 +1,284 @@
+"""
+Result Cache
+============
+Persistent, size-bounded LRU cache for generated assets.
+
+Model calls are slow and billed per request, so outputs are stored on disk
+under a key that captures everything that determines the result (request
+parameters, prompt template, reference images, model ID). A lookup with the
+same key returns the stored file instead of calling the model again.
+
+Usage:
+    cache = ResultCache(CACHE_DIR / "icon", max_bytes=256 * 1024 * 1024)
+    key = cache.make_key("heart", prompt_hash, frame_hash, MODEL_ID)
+    path = cache.get(key)
+    if path is None:
+        ... generate ...
+        cache.put(key, generated_path)
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from file_lock import file_lock
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = Path(os.getenv("ASSET_CACHE_DIR", BASE_DIR / "cache"))
+
+# Hits are logged at most this often per key (last-use times are kept in memory)
+TOUCH_LOG_INTERVAL_S = 60
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# (path, mtime_ns, size) -> digest, so each reference file is hashed once per process
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def hash_file(path) -> str:
+    """SHA-256 of a file's contents (memoized on path, mtime and size)."""
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+    stat = path.stat()
+    memo_key = (str(path), stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(memo_key)
+    if digest is None:
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        _file_hashes[memo_key] = digest
+    return digest
+
+
+class ResultCache:
+    """
+    Stores one file per key in `cache_dir`, with an index tracking size and
+    last use. When the total size exceeds `max_bytes`, the least recently
+    used entries are evicted.
+    
+    The index lives in memory and is persisted as an append-only JSONL log
+    (index.jsonl) shared by every process using the directory: puts and
+    evictions are appended, hits only update the in-memory last-use time and
+    are logged at most every TOUCH_LOG_INTERVAL_S per key. Records appended
+    by other processes are read in on a miss and before evicting, and the log
+    is compacted (merged under a file lock) when it grows well past the
+    live set.
+    """
+    
+    LOG_NAME = "index.jsonl"
+    LOCK_NAME = "index.lock"
+    # Written by older versions; imported once if no log exists yet
+    LEGACY_INDEX_NAME = "index.json"
+    
+    def __init__(self, cache_dir, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.log_path = self.cache_dir / self.LOG_NAME
+        self.lock_path = self.cache_dir / self.LOCK_NAME
+        self._lock = threading.Lock()
+        self._loaded = False
+        # key -> {"suffix", "size", "created", "last_used", "meta"}
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._touch_logged: Dict[str, float] = {}
+        # How far into which log file this process has read
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+        self._log_lines = 0
+        
+        # Metrics (per process)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a cache key from any JSON-serializable parts."""
+        return hash_text(json.dumps(parts, sort_keys=True, default=str))
+    
+    # -- index ----------------------------------------------------------------
+    
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        legacy = self.cache_dir / self.LEGACY_INDEX_NAME
+        if not self.log_path.exists() and legacy.exists():
+            try:
+                self._index = json.loads(legacy.read_text())
+            except json.JSONDecodeError:
+                self._index = {}
+            with file_lock(self.lock_path):
+                if not self.log_path.exists():
+                    self._write_log()
+            legacy.unlink(missing_ok=True)
+        self._read_log()
+    
+    def _read_log(self):
+        """Apply the records appended since the last read (everything, after a compaction)."""
+        try:
+            with open(self.log_path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._log_inode:
+                    # Replaced by a compaction: replay the new file from the start
+                    self._log_inode, self._log_offset, self._log_lines = inode, 0, 0
+                    previous, self._index = self._index, {}
+                else:
+                    previous = None
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Whole lines only; a line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        self._log_offset += end
+        for line in data[:end].splitlines():
+            self._log_lines += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn write from a crashed process
+            self._apply(record)
+        if previous:
+            # Keep last-use times this process has not logged yet
+            for key, entry in self._index.items():
+                if key in previous:
+                    entry["last_used"] = max(entry["last_used"], previous[key]["last_used"])
+    
+    def _apply(self, record: Dict[str, Any]):
+        op, key = record.get("op"), record.get("key")
+        if op == "put":
+            self._index[key] = {"suffix": record["suffix"], "size": record["size"], "created": record["t"],
+                                "last_used": record.get("used", record["t"]), "meta": record.get("meta", {})}
+        elif op == "touch" and key in self._index:
+            entry = self._index[key]
+            entry["last_used"] = max(entry["last_used"], record["t"])
+        elif op == "evict":
+            self._index.pop(key, None)
+            self._touch_logged.pop(key, None)
+    
+    def _append(self, *records: Dict[str, Any]):
+        with file_lock(self.lock_path):
+            with open(self.log_path, "a") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+            # Catch up, re-applying our own records (idempotent) along with other processes'
+            self._read_log()
+        if self._log_lines > 2 * len(self._index) + 1000:
+            self._compact()
+    
+    def _compact(self):
+        with file_lock(self.lock_path):
+            # Merge what other processes appended, so the rewrite drops nothing
+            self._read_log()
+            self._write_log()
+    
+    def _write_log(self):
+        """Replace the log with a snapshot of the index (caller holds the file lock)."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.log_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            for key, entry in self._index.items():
+                f.write(json.dumps({"op": "put", "key": key, "suffix": entry["suffix"], "size": entry["size"],
+                                    "t": entry["created"], "used": entry["last_used"],
+                                    "meta": entry.get("meta", {})}) + "\n")
+        tmp.replace(self.log_path)
+        self._log_inode = self.log_path.stat().st_ino
+        self._log_offset = self.log_path.stat().st_size
+        self._log_lines = len(self._index)
+    
+    def _entry_path(self, key: str, suffix: str) -> Path:
+        return self.cache_dir / f"{key}{suffix}"
+    
+    # -- public API -----------------------------------------------------------
+    
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached file for `key`, or None on a miss."""
+        with self._lock:
+            self._load()
+            entry = self._index.get(key)
+            if entry is None:
+                # Possibly stored by another process since we last looked
+                self._read_log()
+                entry = self._index.get(key)
+            path = self._entry_path(key, entry["suffix"]) if entry else None
+            if path is None or not path.exists():
+                if entry:
+                    del self._index[key]
+                    self._append({"op": "evict", "key": key, "t": time.time()})
+                self.misses += 1
+                return None
+            now = time.time()
+            entry["last_used"] = now
+            if now - self._touch_logged.get(key, 0.0) >= TOUCH_LOG_INTERVAL_S:
+                self._touch_logged[key] = now
+                self._append({"op": "touch", "key": key, "t": now})
+            self.hits += 1
+            return path
+    
+    def put(self, key: str, source, meta: Optional[Dict[str, Any]] = None) -> Path:
+        """Copy `source` into the cache under `key` and evict down to the size bound."""
+        source = Path(source)
+        return self._put(key, source.suffix, lambda path: shutil.copyfile(source, path), meta)
+    
+    def put_bytes(self, key: str, data: bytes, suffix: str, meta: Optional[Dict[str, Any]] = None) -> Path:
+        """Store in-memory `data` under `key` (like put(), without a source file)."""
+        return self._put(key, suffix, lambda path: path.write_bytes(data), meta)
+    
+    def _put(self, key: str, suffix: str, write, meta: Optional[Dict[str, Any]]) -> Path:
+        with self._lock:
+            self._load()
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._entry_path(key, suffix)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            write(tmp)
+            tmp.replace(path)
+            now = time.time()
+            record = {"op": "put", "key": key, "suffix": suffix, "size": path.stat().st_size,
+                      "t": now, "used": now, "meta": meta or {}}
+            self._apply(record)
+            self._touch_logged[key] = now
+            self._append(record, *self._evict(keep=key))
+            return path
+    
+    def _evict(self, keep: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Evict down to max_bytes; returns the log records for the evicted keys."""
+        index = self._index
+        total = sum(e["size"] for e in index.values())
+        if total <= self.max_bytes:
+            return []
+        # Count what other processes stored before deciding what to drop
+        self._read_log()
+        total = sum(e["size"] for e in index.values())
+        records, now = [], time.time()
+        for key in sorted(index, key=lambda k: index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            entry = index.pop(key)
+            self._touch_logged.pop(key, None)
+            self._entry_path(key, entry["suffix"]).unlink(missing_ok=True)
+            total -= entry["size"]
+            self.evictions += 1
+            records.append({"op": "evict", "key": key, "t": now})
+        return records
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": sum(e["size"] for e in self._index.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
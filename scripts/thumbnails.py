@@ -0,0 +1,119 @@
+"""
+Thumbnails
+==========
+Small previews of generated images for the chat UI, which shows results in
+a box a few hundred pixels tall while the files themselves are full size
+(1123x2000 cards, 2x gacha screens).
+
+Requested widths are snapped up to one of THUMB_WIDTHS so a handful of
+sizes per image are ever rendered. Previews are WebP (keeping alpha),
+cached on disk by source content and width, and never upscaled. JPEG
+sources are decoded at reduced scale (draft mode) instead of full size.
+
+Usage:
+    path, etag = THUMBNAILS.get(PROJECT_ROOT / "output/card/elara.png", 384)
+    THUMBNAILS.etag(PROJECT_ROOT / "output/card/elara.png", 384)     # same ETag, without rendering
+
+    python scripts/thumbnails.py output/card/elara.png --width 384
+"""
+
+import os
+import sys
+import argparse
+from io import BytesIO
+from pathlib import Path
+from typing import Tuple
+
+from PIL import Image
+
+from output_store import OUTPUT_STORE
+from result_cache import CACHE_DIR, ResultCache, hash_file
+
+THUMB_WIDTHS = (96, 192, 384, 768)
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+# File types a preview can be made from
+THUMB_SOURCES = {".png", ".jpg", ".jpeg", ".webp"}
+THUMB_MEDIA_TYPE = "image/webp"
+
+
+def snap_width(requested: int) -> int:
+    """Smallest allowed width at or above `requested` (the largest if none is)."""
+    for width in THUMB_WIDTHS:
+        if width >= requested:
+            return width
+    return THUMB_WIDTHS[-1]
+
+
+def make_thumbnail(data: bytes, width: int) -> bytes:
+    """Encoded image -> WebP at most `width` pixels wide, aspect ratio kept."""
+    with Image.open(BytesIO(data)) as img:
+        if img.format == "JPEG":
+            # libjpeg scales by 1/2..1/8 while decoding, to no less than the target
+            img.draft(img.mode, (width, max(1, img.height * width // img.width)))
+        if img.mode not in ("RGB", "RGBA"):
+            has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        out = BytesIO()
+        img.save(out, "WEBP", quality=THUMB_QUALITY, method=4)
+        return out.getvalue()
+
+
+class Thumbnailer:
+    """Renders previews of output files and keeps them in a ResultCache."""
+
+    def __init__(self, cache: ResultCache):
+        self.cache = cache
+
+    @staticmethod
+    def key_for(path, width: int) -> str:
+        """
+        Cache key of a preview (source digest, snapped width, quality), known
+        without rendering. Raises FileNotFoundError when the source is missing.
+        """
+        path = Path(path)
+        digest = OUTPUT_STORE.digest_of(path) or hash_file(path)
+        if digest == "missing":
+            raise FileNotFoundError(path)
+        return ResultCache.make_key("thumb", digest, snap_width(width), THUMB_QUALITY)
+
+    def etag(self, path, width: int) -> str:
+        """Strong ETag of a preview, so a conditional request can be answered before rendering."""
+        return f'"{self.key_for(path, width)}"'
+
+    def get(self, path, width: int) -> Tuple[Path, str]:
+        """
+        (cached preview file, strong ETag) for an output at a snapped width.
+        Raises FileNotFoundError when the source is missing.
+        """
+        path = Path(path)
+        width = snap_width(width)
+        key = self.key_for(path, width)
+        cached = self.cache.get(key)
+        if cached is None:
+            data = make_thumbnail(OUTPUT_STORE.read_bytes(path), width)
+            cached = self.cache.put_bytes(key, data, ".webp", meta={"source": path.name, "width": width})
+        return cached, f'"{key}"'
+
+
+THUMBNAILS = Thumbnailer(ResultCache(
+    CACHE_DIR / "thumb",
+    max_bytes=int(float(os.getenv("THUMB_CACHE_MAX_MB", "128")) * 1024 * 1024),
+))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render (and cache) a preview of an output image")
+    parser.add_argument("source", help="Image under output/")
+    parser.add_argument("--width", type=int, default=384)
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    if not source.is_file():
+        print(f"Error: {source} not found")
+        sys.exit(1)
+    preview, _ = THUMBNAILS.get(source.resolve(), args.width)
+    print(f"{source} ({source.stat().st_size:,} bytes) -> {preview} "
+          f"({preview.stat().st_size:,} bytes, {snap_width(args.width)}px wide)")
@@ -0,0 +1,22 @@
+"""
+Shared test setup: the scripts/ modules are imported flat, as the backend
+and the benchmarks import them.
+
+    python -m pytest -q
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+from output_store import OutputStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """An OutputStore over an empty output/ tree."""
+    return OutputStore(tmp_path / "output")
@@ -0,0 +1,82 @@
+"""Asset bundle: bundled pixels match a disk decode, and stale or missing entries fall back."""
+import os
+import shutil
+
+import pytest
+from PIL import Image, ImageChops
+
+import asset_bundle
+from asset_bundle import AssetBundle, build_bundle, open_asset
+from conftest import PROJECT_ROOT
+
+REAL_ASSETS = ["gacharef/gachabackground.jpeg", "gacharef/awaken_button.png", "iconbtnref/frame.png"]
+
+
+def gradient(mode, size=(37, 23)):
+    image = Image.new("RGBA", size)
+    image.putdata([(x * 7 % 256, y * 11 % 256, (x + y) * 5 % 256, (x * y) % 256)
+                   for y in range(size[1]) for x in range(size[0])])
+    return image if mode == "RGBA" else image.convert(mode)
+
+
+@pytest.fixture
+def assets(tmp_path):
+    root = tmp_path / "assets"
+    (root / "ref").mkdir(parents=True)
+    gradient("RGBA").save(root / "ref" / "alpha.png")
+    gradient("RGB").save(root / "ref" / "opaque.png")
+    gradient("RGB").save(root / "ref" / "photo.jpg", quality=90)
+    gradient("LA").save(root / "ref" / "gray_alpha.png")
+    palette = gradient("RGB").convert("P", palette=Image.Palette.ADAPTIVE)
+    palette.save(root / "ref" / "palette.png", transparency=0)
+    (root / "ref" / "notes.txt").write_text("not an image")
+    for name in REAL_ASSETS:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(PROJECT_ROOT / "assets" / name, root / name)
+    return root
+
+
+@pytest.fixture
+def bundle(assets, tmp_path):
+    build_bundle(assets, tmp_path / "assets.rgba")
+    return AssetBundle(tmp_path / "assets.rgba", assets)
+
+
+def same_pixels(a, b):
+    return a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+@pytest.mark.parametrize("name", ["ref/alpha.png", "ref/opaque.png", "ref/photo.jpg", "ref/gray_alpha.png",
+                                  "ref/palette.png"] + REAL_ASSETS)
+def test_bundled_pixels_match_disk(bundle, assets, name):
+    mapped = bundle.image(assets / name)
+    with Image.open(assets / name) as disk:
+        mode = "RGBA" if disk.mode in ("RGBA", "LA", "PA") or "transparency" in disk.info else "RGB"
+        assert mapped.mode == mode
+        assert same_pixels(mapped.convert("RGBA"), disk.convert(mode).convert("RGBA"))
+
+
+def test_only_images_are_bundled(bundle, assets):
+    assert bundle.stats()["entries"] == 5 + len(REAL_ASSETS)
+    assert bundle.image(assets / "ref" / "notes.txt") is None
+
+
+def test_changed_assets_are_decoded_from_disk(bundle, assets, monkeypatch):
+    gradient("RGBA", (5, 5)).save(assets / "ref" / "alpha.png")
+    os.utime(assets / "ref" / "alpha.png", ns=(1, 1))
+    assert bundle.image(assets / "ref" / "alpha.png") is None
+    assert bundle.stale == ["ref/alpha.png"]
+
+    monkeypatch.setattr(asset_bundle, "ASSET_BUNDLE", bundle)
+    assert open_asset(assets / "ref" / "alpha.png").size == (5, 5)
+    assert open_asset(assets / "ref" / "opaque.png").size == (37, 23)
+    stats = bundle.stats()
+    assert (stats["mapped"], stats["decoded"]) == (1, 1)
+
+
+def test_missing_or_foreign_bundle_is_ignored(assets, tmp_path):
+    assert AssetBundle(tmp_path / "none.rgba", assets).image(assets / "ref" / "alpha.png") is None
+    (tmp_path / "foreign.rgba").write_bytes(b"something else entirely")
+    foreign = AssetBundle(tmp_path / "foreign.rgba", assets)
+    assert foreign.image(assets / "ref" / "alpha.png") is None
+    assert not foreign.stats()["loaded"]
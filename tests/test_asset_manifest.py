@@ -0,0 +1,79 @@
+"""AssetManifest: lookups, and rebuilding only when files are added, removed or rewritten."""
+import os
+
+from asset_manifest import AssetManifest, asset_exists, manifest_for, normalize_name
+
+
+def write(root, name, data=b"x"):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_lookups(tmp_path):
+    write(tmp_path, "primals/Frost_Queen.png")
+    write(tmp_path, "primals/ember king.jpg")
+    write(tmp_path, "gacharef/awaken_button.png")
+    write(tmp_path, ".cache/hidden.png")
+    manifest = AssetManifest(tmp_path, check_interval_s=0)
+
+    assert manifest.entry("gacharef/awaken_button.png").path == tmp_path / "gacharef" / "awaken_button.png"
+    assert manifest.entry_ci("Gacharef/Awaken_Button.PNG").name == "gacharef/awaken_button.png"
+    assert manifest.match("primals", "frost queen").name == "primals/Frost_Queen.png"
+    assert manifest.match("/primals/", "EmberKing").name == "primals/ember king.jpg"
+    assert [e.name for e in manifest.files("primals")] == ["primals/Frost_Queen.png", "primals/ember king.jpg"]
+    assert manifest.exists(tmp_path / "primals" / "Frost_Queen.png")
+    assert not manifest.exists(tmp_path.parent / "elsewhere.png")
+    assert manifest.entry(".cache/hidden.png") is None
+    assert normalize_name("Frost_Queen v2") == "frostqueenv2"
+
+
+def test_refresh_rebuilds_only_on_changes(tmp_path):
+    path = write(tmp_path, "ref/heart.png", b"v1")
+    manifest = AssetManifest(tmp_path, check_interval_s=0)
+    manifest.refresh()
+    digest = manifest.entry("ref/heart.png").digest
+    assert manifest.rebuilds == 1
+
+    manifest.refresh()
+    assert manifest.rebuilds == 1
+    # Unchanged files keep their hash across rebuilds
+    write(tmp_path, "ref/eye.png")
+    manifest.refresh()
+    assert (manifest.rebuilds, manifest.generation) == (2, 2)
+    assert manifest.entry("ref/heart.png")._digest == digest
+
+    write(tmp_path, "ref/heart.png", b"v2")
+    os.utime(path, ns=(1, 1))
+    manifest.refresh()
+    assert manifest.rebuilds == 3
+    assert manifest.entry("ref/heart.png").digest != digest
+
+    (tmp_path / "ref" / "eye.png").unlink()
+    manifest.refresh()
+    assert manifest.rebuilds == 4
+    assert manifest.entry("ref/eye.png") is None
+    assert manifest.stats()["files"] == 1
+
+
+def test_checks_are_throttled(tmp_path):
+    manifest = AssetManifest(tmp_path, check_interval_s=3600)
+    manifest.refresh()
+    write(tmp_path, "ref/new.png")
+    assert manifest.entry("ref/new.png") is None
+    manifest.refresh(force=True)
+    assert manifest.entry("ref/new.png") is not None
+
+
+def test_asset_exists_uses_the_registered_manifest(tmp_path):
+    manifest = manifest_for(tmp_path)
+    assert manifest_for(tmp_path) is manifest
+    manifest.check_interval_s = 3600
+    write(tmp_path, "ref/heart.png")
+    manifest.refresh(force=True)
+    assert asset_exists(tmp_path / "ref" / "heart.png")
+    # Answered from memory until the next check
+    (tmp_path / "ref" / "heart.png").unlink()
+    assert asset_exists(tmp_path / "ref" / "heart.png")
+    assert not asset_exists(tmp_path / "ref" / "other.png")
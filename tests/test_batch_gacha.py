@@ -0,0 +1,79 @@
+"""Batch mode: spec files, layout dedupe and per-spec errors in the manifest."""
+import json
+
+import pytest
+
+import generate_gacha
+from generate_gacha import BatchGachaGenerator, PlaywrightRenderer, UnifiedGachaGenerator
+from conftest import PROJECT_ROOT
+
+
+@pytest.fixture
+def batch(store, monkeypatch):
+    # Render HTML only; PNG rendering needs a browser
+    monkeypatch.setattr(PlaywrightRenderer, "start", lambda self: False)
+    monkeypatch.setattr(generate_gacha, "OUTPUT_STORE", store)
+    generator = UnifiedGachaGenerator(str(PROJECT_ROOT))
+    generator.output_dir = store.root / "gacha"
+    return BatchGachaGenerator(generator, workers=1)
+
+
+def test_load_specs_reads_lines_and_json(tmp_path):
+    lines = tmp_path / "pulls.txt"
+    lines.write_text("# weekly banner\n1 5star primal, 9 sorcery\n\n  10 sorcery  \n")
+    assert BatchGachaGenerator.load_specs(lines) == ["1 5star primal, 9 sorcery", "10 sorcery"]
+
+    listed = tmp_path / "pulls.json"
+    listed.write_text(json.dumps([{"primal_5star": 1, "sorcery_3star": 9}, "10 sorcery"]))
+    assert BatchGachaGenerator.load_specs(listed) == [{"primal_5star": 1, "sorcery_3star": 9}, "10 sorcery"]
+
+    listed.write_text(json.dumps({"primal_5star": 1}))
+    with pytest.raises(ValueError):
+        BatchGachaGenerator.load_specs(listed)
+
+
+def test_identical_layouts_are_rendered_once(batch):
+    manifest = batch.generate_batch(
+        ["1 5star primal, 9 sorcery", {"primal_5star": 1, "sorcery_3star": 9}, "10 sorcery"],
+        output_name="dedupe")
+
+    assert (manifest["pull_count"], manifest["rendered_count"], manifest["error_count"]) == (3, 2, 0)
+    first, duplicate, other = manifest["pulls"]
+    assert duplicate["duplicate_of"] == 0
+    assert duplicate["html"] == first["html"]
+    assert other["cards"] == ["SORCERY_3STAR"] * 10
+    assert all(entry["status"] == "html_only" for entry in manifest["pulls"])
+
+    batch_dir = next(batch.generator.output_dir.glob("dedupe_*"))
+    assert json.loads((batch_dir / "manifest.json").read_text()) == manifest
+    assert (batch_dir / first["html"]).exists()
+    assert "assets/gachabackground.jpeg" in (batch_dir / first["html"]).read_text()
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"primal_5star": "1"}, "non-negative integer"),
+    ({"primal_5stars": 2}, "Unknown card type"),
+    ({"sorcery_3star": -1}, "non-negative integer"),
+    ("nonsense spec", "no cards"),
+])
+def test_invalid_specs_are_recorded_without_stopping_the_batch(batch, spec, message):
+    manifest = batch.generate_batch([spec, "10 sorcery"], output_name="invalid")
+
+    bad, good = manifest["pulls"]
+    assert bad["status"] == "error"
+    assert message in bad["error"]
+    assert bad["html"] is None and bad["cards"] == []
+    assert good["status"] == "html_only"
+    assert (manifest["rendered_count"], manifest["error_count"]) == (1, 1)
+
+
+def test_a_batch_of_only_invalid_specs_still_writes_a_manifest(batch):
+    manifest = batch.generate_batch(["nonsense spec"], output_name="empty")
+    assert (manifest["workers"], manifest["rendered_count"], manifest["error_count"]) == (0, 0, 1)
+    assert next(batch.generator.output_dir.glob("empty_*")).joinpath("manifest.json").exists()
+
+
+def test_no_specs_renders_nothing(batch):
+    manifest = batch.generate_batch([])
+    assert manifest["pull_count"] == 0
+    assert not batch.generator.output_dir.exists()
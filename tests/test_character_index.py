@@ -0,0 +1,73 @@
+"""CharacterIndex: ranking, ambiguity and incremental updates."""
+from pathlib import Path
+
+from asset_manifest import AssetManifest
+from character_index import CharacterIndex, character_key, index_for
+
+
+def build(*names):
+    index = CharacterIndex()
+    index.sync((f"{name}.png", Path(f"/primals/{name}.png")) for name in names)
+    return index
+
+
+def test_character_key_normalizes_names():
+    assert character_key("Frost_Queen-v2") == character_key("frost queen v2") == "frostqueenv2"
+
+
+def test_exact_match_wins_and_is_not_ambiguous():
+    result = build("frostqueen", "frostqueens", "emberking").resolve("Frost Queen")
+    assert result.match.name == "frostqueen.png"
+    assert result.match.score == 1.0
+    assert not result.ambiguous
+
+
+def test_misspelling_resolves_to_closest_name():
+    result = build("frostqueen", "emberking", "stormcaller").resolve("frostqeen")
+    assert result.match.name == "frostqueen.png"
+    assert not result.ambiguous
+
+
+def test_close_candidates_are_ambiguous():
+    result = build("frostqueen", "frostqueem", "emberking").resolve("frost queex")
+    assert result.ambiguous
+    assert {c.name for c in result.candidates[:2]} == {"frostqueen.png", "frostqueem.png"}
+    details = result.details()
+    assert details["ambiguous"] and details["match"] == result.match.path.stem
+    assert [c["name"] for c in details["candidates"]][:2] == [c.path.stem for c in result.candidates[:2]]
+
+
+def test_unrelated_query_has_no_match():
+    assert build("frostqueen").resolve("zzz").match is None
+    assert build("frostqueen").resolve("").candidates == []
+
+
+def test_sync_adds_and_removes_only_changes():
+    index = build("frostqueen", "emberking")
+    assert index.sync([("frostqueen.png", Path("/primals/frostqueen.png")),
+                       ("stormcaller.png", Path("/primals/stormcaller.png"))]) == (1, 1)
+    assert len(index) == 2
+    assert index.resolve("emberking").match is None
+    assert index.resolve("stormcaller").match.name == "stormcaller.png"
+
+    # A moved file is re-added; the freed slot is reused
+    assert index.sync([("frostqueen.png", Path("/other/frostqueen.png")),
+                       ("stormcaller.png", Path("/primals/stormcaller.png"))]) == (1, 0)
+    assert index.resolve("frostqueen").match.path == Path("/other/frostqueen.png")
+    assert len(index._names) == 2
+
+
+def test_index_for_follows_the_manifest(tmp_path):
+    primals = tmp_path / "sorcerycardref" / "primals"
+    primals.mkdir(parents=True)
+    (primals / "frostqueen.png").write_bytes(b"x")
+    (primals / "notes.txt").write_text("not a character")
+    manifest = AssetManifest(tmp_path, check_interval_s=0)
+
+    index = index_for(manifest, "sorcerycardref/primals")
+    assert len(index) == 1
+    assert index.resolve("frostqueen").match.path == primals / "frostqueen.png"
+
+    (primals / "emberking.jpg").write_bytes(b"y")
+    assert index_for(manifest, "sorcerycardref/primals") is index
+    assert index.resolve("ember king").match.name == "sorcerycardref/primals/emberking.jpg"
@@ -0,0 +1,117 @@
+"""Versioned downloads: redirects, ETags, byte ranges and 410 for replaced outputs."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.routers import downloads
+from backend.routers.downloads import UNSATISFIABLE, parse_range
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    monkeypatch.setattr(downloads, "OUTPUT_STORE", store)
+    monkeypatch.setattr(downloads, "OUTPUT_ROOT", store.root)
+    app = FastAPI()
+    app.include_router(downloads.router, prefix="/downloads")
+    return TestClient(app, follow_redirects=False)
+
+
+def put(store, name, data):
+    store.put_bytes(store.root / name, data)
+    return store.digest_of(store.root / name)
+
+
+def test_alias_redirects_to_current_version(client, store):
+    digest = put(store, "icon/HEART.png", b"0123456789")
+    response = client.get("/downloads/icon/HEART.png")
+    assert response.status_code == 307
+    assert response.headers["location"] == f"/downloads/v/{digest}/icon/HEART.png"
+    assert response.headers["cache-control"] == downloads.REVALIDATE
+
+
+def test_version_is_immutable_and_revalidates_with_304(client, store):
+    digest = put(store, "icon/HEART.png", b"0123456789")
+    response = client.get(f"/downloads/v/{digest}/icon/HEART.png")
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["etag"] == f'"{digest}"'
+    assert response.headers["cache-control"] == downloads.IMMUTABLE
+
+    response = client.get(f"/downloads/v/{digest}/icon/HEART.png", headers={"If-None-Match": f'"{digest}"'})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("header, status, body, content_range", [
+    ("bytes=2-5", 206, b"2345", "bytes 2-5/10"),
+    ("bytes=7-", 206, b"789", "bytes 7-9/10"),
+    ("bytes=-3", 206, b"789", "bytes 7-9/10"),
+    ("bytes=4-100", 206, b"456789", "bytes 4-9/10"),
+    ("bytes=10-", 416, b"", "bytes */10"),
+])
+def test_byte_ranges(client, store, header, status, body, content_range):
+    digest = put(store, "icon/HEART.png", b"0123456789")
+    response = client.get(f"/downloads/v/{digest}/icon/HEART.png", headers={"Range": header})
+    assert response.status_code == status
+    assert response.content == body
+    assert response.headers.get("content-range") == content_range
+
+
+def test_multiple_ranges_are_left_to_file_response(client, store):
+    digest = put(store, "icon/HEART.png", b"0123456789")
+    response = client.get(f"/downloads/v/{digest}/icon/HEART.png", headers={"Range": "bytes=0-1,4-5"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+
+
+def test_if_range_for_another_version_sends_everything(client, store):
+    digest = put(store, "icon/HEART.png", b"0123456789")
+    response = client.get(f"/downloads/v/{digest}/icon/HEART.png",
+                          headers={"Range": "bytes=0-1", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+
+
+def test_replaced_version_is_gone(client, store):
+    old = put(store, "icon/HEART.png", b"old")
+    new = put(store, "icon/HEART.png", b"new")
+    assert client.get(f"/downloads/v/{old}/icon/HEART.png").status_code == 410
+    assert client.get(f"/downloads/v/{new}/icon/HEART.png").content == b"new"
+
+
+def test_evicted_output_is_gone_and_unknown_is_missing(client, store):
+    digest = put(store, "icon/HEART.png", b"0123456789")
+    store.max_bytes = 0
+    store.sweep()
+    assert client.get(f"/downloads/v/{digest}/icon/HEART.png").status_code == 410
+    assert client.get("/downloads/icon/HEART.png").status_code == 410
+    assert client.get("/downloads/icon/NEVER.png").status_code == 404
+    assert client.get("/downloads/.store/index.jsonl").status_code == 404
+
+
+def test_pages_are_served_from_the_alias_so_relative_assets_resolve(client, store):
+    page = put(store, "gacha/batch_1/pull_00000.html", b'<img src="assets/a.png">')
+    asset = put(store, "gacha/batch_1/assets/a.png", b"PNG")
+
+    response = client.get("/downloads/gacha/batch_1/pull_00000.html")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{page}"'
+    assert response.headers["cache-control"] == downloads.REVALIDATE
+    assert client.get("/downloads/gacha/batch_1/pull_00000.html",
+                      headers={"If-None-Match": f'"{page}"'}).status_code == 304
+
+    versioned = client.get(f"/downloads/v/{page}/gacha/batch_1/pull_00000.html")
+    assert versioned.status_code == 307
+    assert versioned.headers["location"] == "/downloads/gacha/batch_1/pull_00000.html"
+    assert downloads.versioned_url("/downloads/gacha/batch_1/pull_00000.html") == \
+        "/downloads/gacha/batch_1/pull_00000.html"
+
+    relative = client.get("/downloads/gacha/batch_1/assets/a.png")
+    assert relative.headers["location"] == f"/downloads/v/{asset}/gacha/batch_1/assets/a.png"
+
+
+def test_parse_range():
+    assert parse_range(None, 10) is None
+    assert parse_range("bytes=3-1", 10) is None
+    assert parse_range("bytes=x-", 10) is None
+    assert parse_range("bytes=-0", 10) == UNSATISFIABLE
+    assert parse_range("bytes=-20", 10) == (0, 9)
@@ -0,0 +1,84 @@
+"""Model call wrappers: deadlines, retries and the per-operation counters."""
+import asyncio
+
+import pytest
+
+import gemini_client
+from gemini_client import DeadlineExceeded, ModelCallMetrics, call_model, call_model_sync, request_deadline
+
+
+class Transient(Exception):
+    code = 503
+
+
+class Rejected(Exception):
+    code = 400
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    fresh = ModelCallMetrics()
+    monkeypatch.setattr(gemini_client, "METRICS", fresh)
+    monkeypatch.setattr(gemini_client, "GEMINI_RETRY_BASE_S", 0.001)
+    return fresh
+
+
+def flaky(failures, error=Transient):
+    """make_call that fails `failures` times before answering "ok"."""
+    state = {"left": failures}
+
+    def make_call():
+        if state["left"]:
+            state["left"] -= 1
+            raise error()
+        return "ok"
+    return make_call
+
+
+def run_async(make_call, seconds=None):
+    async def call():
+        async def attempt():
+            return make_call()
+        with request_deadline(seconds):
+            return await call_model(attempt, op="test")
+    return asyncio.run(call())
+
+
+def run_sync(make_call, seconds=None):
+    with request_deadline(seconds):
+        return call_model_sync(make_call, op="test")
+
+
+def counts(metrics):
+    snapshot = metrics.snapshot()["test"]
+    assert snapshot["calls"] == snapshot["successes"] + snapshot["failures"]
+    return snapshot
+
+
+@pytest.mark.parametrize("run", [run_async, run_sync])
+def test_transient_errors_are_retried(metrics, run):
+    assert run(flaky(2)) == "ok"
+    snapshot = counts(metrics)
+    assert (snapshot["calls"], snapshot["attempts"], snapshot["retries"], snapshot["successes"]) == (1, 3, 2, 1)
+
+
+@pytest.mark.parametrize("run", [run_async, run_sync])
+def test_other_errors_are_raised_at_once(metrics, run):
+    with pytest.raises(Rejected):
+        run(flaky(1, Rejected))
+    snapshot = counts(metrics)
+    assert (snapshot["attempts"], snapshot["retries"], snapshot["failures"]) == (1, 0, 1)
+
+
+@pytest.mark.parametrize("run", [run_async, run_sync])
+def test_a_spent_budget_counts_as_a_failure(metrics, run):
+    with pytest.raises(DeadlineExceeded):
+        run(flaky(0), seconds=0)
+    snapshot = counts(metrics)
+    assert (snapshot["attempts"], snapshot["deadline_exceeded"], snapshot["failures"]) == (0, 1, 1)
+
+
+def test_nested_deadlines_only_shorten_the_budget():
+    with request_deadline(10):
+        with request_deadline(60):
+            assert gemini_client.remaining_budget() <= 10
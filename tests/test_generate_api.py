@@ -0,0 +1,80 @@
+"""/api/generate responses: inline images, ETags and background persistence."""
+import base64
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend.routers import downloads, generate
+
+
+def png(width=64, height=48, color="red"):
+    buf = io.BytesIO()
+    Image.new("RGBA", (width, height), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+ICON = png()
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    for module in (generate, downloads):
+        monkeypatch.setattr(module, "OUTPUT_STORE", store)
+    monkeypatch.setattr(downloads, "OUTPUT_ROOT", store.root)
+
+    async def run_generation(intent, **options):
+        # Stands in for the generator scripts: one icon written through the store
+        store.put_bytes(store.root / "icon" / "HEART.png", ICON)
+        return {"message": "Generated heart", "download_url": "/downloads/icon/HEART.png"}
+
+    monkeypatch.setattr(generate, "run_generation", run_generation)
+    app = FastAPI()
+    app.include_router(generate.router, prefix="/api")
+    app.include_router(downloads.router, prefix="/downloads")
+    with TestClient(app, follow_redirects=False) as client:
+        yield client
+
+
+def test_inline_image_carries_the_download_etag(client):
+    body = client.post("/api/generate", json={"message": "heart icon", "inline": True}).json()
+    digest = hashlib.sha256(ICON).hexdigest()
+    assert body["download_url"] == f"/downloads/v/{digest}/icon/HEART.png"
+    image = body["image"]
+    assert (image["media_type"], image["etag"], image["size"]) == ("image/png", f'"{digest}"', len(ICON))
+    assert base64.b64decode(image["data"]) == ICON
+
+    # A client holding the inline copy revalidates the download without a transfer
+    response = client.get(body["download_url"], headers={"If-None-Match": image["etag"]})
+    assert response.status_code == 304
+
+
+def test_accept_image_returns_the_bytes(client):
+    response = client.post("/api/generate", json={"message": "heart icon"}, headers={"Accept": "image/png"})
+    assert response.status_code == 200
+    assert response.content == ICON
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{hashlib.sha256(ICON).hexdigest()}"'
+    assert response.headers["x-asset-type"] == "icon"
+    assert response.headers["x-download-url"].startswith("/downloads/v/")
+
+
+def test_images_are_not_inlined_unless_asked(client, store):
+    body = client.post("/api/generate", json={"message": "heart icon"}).json()
+    assert body["image"] is None
+    assert client.get(body["download_url"]).content == ICON
+    client.portal.call(generate.drain_background_writes)
+    assert (store.root / "icon" / "HEART.png").read_bytes() == ICON
+
+
+def test_deferred_writes_are_readable_before_the_flush(store):
+    path = store.root / "card/x.png"
+    with store.deferred() as held:
+        store.put_bytes(path, b"pixels")
+    assert not path.exists()
+    assert store.read_bytes(path) == b"pixels"
+    assert store.flush(held) == 1
+    assert path.read_bytes() == b"pixels"
@@ -0,0 +1,52 @@
+"""IconIndex: concept tokens, near-duplicate lookup and the shared JSONL log."""
+from icon_index import IconIndex, concept_tokens
+
+
+def test_concept_tokens_drop_filler_and_merge_synonyms():
+    assert concept_tokens("Give me a red Heart icon") == {"red", "heart"}
+    assert concept_tokens("swords") == concept_tokens("a blade") == {"sword"}
+    assert concept_tokens("magnifying glass") == {"search"}
+
+
+def test_near_duplicates_match_within_a_context(tmp_path):
+    index = IconIndex(tmp_path / "similar.jsonl")
+    index.add("heart", "k-heart", context="v1")
+    assert index.find("a red heart icon", context="v1").cache_key == "k-heart"
+    assert index.find("hearts", context="v1").score == 1.0
+    assert index.find("sword", context="v1") is None
+    assert index.find("heart", context="v2") is None
+    assert (index.stats()["hits"], index.stats()["misses"]) == (2, 2)
+
+
+def test_processes_see_each_others_entries(tmp_path):
+    first, second = IconIndex(tmp_path / "similar.jsonl"), IconIndex(tmp_path / "similar.jsonl")
+    first.find("warm up")
+    first.add("heart", "k-heart")
+    second.add("sword", "k-sword")
+    assert first.find("swords").cache_key == "k-sword"
+    assert second.find("heart").cache_key == "k-heart"
+
+    second.discard("k-heart")
+    assert first.find("heart") is None
+
+
+def test_compaction_keeps_other_processes_entries(tmp_path):
+    first, second = IconIndex(tmp_path / "similar.jsonl"), IconIndex(tmp_path / "similar.jsonl")
+    first.add("heart", "k-heart")
+    first.add("skull", "k-skull")
+    first.discard("k-skull")
+    second.add("sword", "k-sword")
+    first.compact()
+    assert len((tmp_path / "similar.jsonl").read_text().splitlines()) == 2
+
+    second.add("crown", "k-crown")
+    assert first.find("crown").cache_key == "k-crown"
+    assert IconIndex(tmp_path / "similar.jsonl").stats()["entries"] == 3
+
+
+def test_log_is_compacted_as_it_grows(tmp_path):
+    index = IconIndex(tmp_path / "similar.jsonl")
+    for _ in range(1_100):
+        index.add("heart", "k-heart")
+    assert len((tmp_path / "similar.jsonl").read_text().splitlines()) < 1_000
+    assert IconIndex(tmp_path / "similar.jsonl").find("heart").cache_key == "k-heart"
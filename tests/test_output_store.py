@@ -0,0 +1,70 @@
+"""OutputStore: dedupe, budget eviction and merging of the shared index log."""
+import os
+
+from output_store import OutputStore
+
+
+def test_identical_outputs_share_a_blob(store):
+    store.put_bytes(store.root / "gacha/run_1/art.png", b"art")
+    store.put_bytes(store.root / "gacha/run_2/art.png", b"art")
+    assert store.stats()["blobs"] == 1
+    assert os.path.samefile(store.root / "gacha/run_1/art.png", store.root / "gacha/run_2/art.png")
+
+
+def test_lru_eviction_keeps_recently_used_outputs(store):
+    store.max_bytes = 8
+    store.put_bytes(store.root / "icon/A.png", b"aaaa")
+    store.put_bytes(store.root / "icon/B.png", b"bbbb")
+    store._names["icon/A.png"]["last_used"] += 10  # A read after B was written
+    store.put_bytes(store.root / "icon/C.png", b"cccc")
+
+    assert store.status(store.root / "icon/B.png") == "evicted"
+    assert not (store.root / "icon/B.png").exists()
+    assert store.status(store.root / "icon/A.png") == "live"
+    assert store.status(store.root / "icon/C.png") == "live"
+    assert store.stats()["bytes"] == 8
+
+
+def test_groups_are_evicted_together(store):
+    store.put_bytes(store.root / "boon/BOON_FIRE_UP.png", b"sheet")
+    store.put_bytes(store.root / "boon/BOON_FIRE_UP/fire_up_0.png", b"v0")
+    store.put_bytes(store.root / "icon/HEART.png", b"heart")
+    store._names["icon/HEART.png"]["last_used"] += 10
+    store.max_bytes = 5
+    assert store.sweep() == 1
+    assert store.status(store.root / "boon/BOON_FIRE_UP.png") == "evicted"
+    assert store.status(store.root / "boon/BOON_FIRE_UP/fire_up_0.png") == "evicted"
+    assert store.status(store.root / "icon/HEART.png") == "live"
+
+
+def test_index_is_replayed_by_a_new_process(store):
+    store.put_bytes(store.root / "icon/A.png", b"a")
+    store.put_bytes(store.root / "icon/A.png", b"a2")
+    store.discard(store.root / "icon/A.png")
+    store.put_bytes(store.root / "icon/B.png", b"b")
+
+    reloaded = OutputStore(store.root)
+    assert reloaded.read_bytes(store.root / "icon/B.png") == b"b"
+    assert reloaded.status(store.root / "icon/A.png") == "unknown"
+
+
+def test_compaction_merges_records_from_other_processes(store):
+    other = OutputStore(store.root)
+    store.put_bytes(store.root / "icon/A.png", b"a")
+    other.put_bytes(store.root / "icon/B.png", b"b")
+
+    # store has not seen B yet; compacting must not drop it
+    store._compact()
+    lines = (store.root / ".store" / "index.jsonl").read_text().splitlines()
+    assert len(lines) == 2
+    assert OutputStore(store.root).status(store.root / "icon/B.png") == "live"
+
+    # other keeps appending to the compacted log
+    other.put_bytes(store.root / "icon/C.png", b"c")
+    store.put_bytes(store.root / "icon/D.png", b"d")
+    expected = {"icon/A.png", "icon/B.png", "icon/C.png", "icon/D.png"}
+    assert set(store._names) == expected
+    fresh = OutputStore(store.root)
+    assert fresh.stats()["outputs"] == 4
+    assert set(fresh._names) == expected
+
@@ -0,0 +1,89 @@
+"""IntentParser: splitting multi-asset messages, and the shared parse cache."""
+import pytest
+
+from backend.services.parser import IntentParser
+from benchmarks.parser_benchmark import CORPUS_PATH, classify, load_corpus
+
+
+@pytest.fixture
+def parser():
+    IntentParser.clear_cache()
+    yield IntentParser()
+    IntentParser.clear_cache()
+
+
+def summary(intents):
+    return [(intent.asset_type, intent.raw_message) for intent in intents]
+
+
+def test_each_clause_naming_an_asset_is_its_own_intent(parser):
+    intents = parser.parse_all("fire boon up, ice boon down and a PLAY button")
+    assert summary(intents) == [("boon", "fire boon up"), ("boon", "ice boon down"), ("cta", "a PLAY button")]
+    assert [intent.params for intent in intents[:2]] == [{"boon": "fire", "subicon": "up"},
+                                                         {"boon": "ice", "subicon": "down"}]
+
+
+def test_every_separator_splits(parser):
+    assert [intent.params["name"] for intent in parser.parse_all("heart icon then sword icon; also shield icon")] == \
+        ["heart", "sword", "shield"]
+
+
+def test_clauses_without_an_asset_stay_with_their_neighbour(parser):
+    assert summary(parser.parse_all("salt and pepper icon")) == [("icon", "salt and pepper icon")]
+    card, icon = parser.parse_all("5 star might card for Elara, and a heart icon")
+    assert card.params == {"character": "Elara", "rarity": "5star", "calling": "Might"}
+    assert icon.params == {"name": "heart"}
+
+
+def test_quoted_text_is_never_split(parser):
+    cta, icon = parser.parse_all("a button that says 'PLAY, NOW' and a sword icon")
+    assert cta.params["text"] == "PLAY, NOW"
+    assert icon.params == {"name": "sword"}
+
+
+def test_gacha_specs_are_not_split(parser):
+    message = "gacha pull: 1 5star primal, 9 sorcery and a heart icon"
+    assert summary(parser.parse_all(message)) == [("gacha", message)]
+
+
+@pytest.mark.parametrize("message", ["heart icon", "a red heart icon, 5 star", "rock and roll guitar icon"])
+def test_single_asset_messages_parse_like_parse(parser, message):
+    (intent,) = parser.parse_all(message)
+    expected = parser.parse(message)
+    assert (intent.asset_type, intent.params, intent.raw_message) == \
+        (expected.asset_type, expected.params, expected.raw_message)
+
+
+def test_repeats_are_served_from_the_cache(parser):
+    first = parser.parse("a red heart icon")
+    again = IntentParser().parse("  a red   heart icon ")
+    assert IntentParser.cache_info() == {"size": 1, "capacity": IntentParser.CACHE_SIZE,
+                                         "hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert again.params == first.params
+    # Each caller gets its own message and params
+    assert again.raw_message == "  a red   heart icon "
+    again.params["name"] = "changed"
+    assert parser.parse("a red heart icon").params == first.params
+
+
+def test_least_recently_used_messages_are_dropped(parser, monkeypatch):
+    monkeypatch.setattr(IntentParser, "CACHE_SIZE", 2)
+    for message in ("heart icon", "sword icon", "heart icon", "shield icon"):
+        parser.parse(message)
+    assert list(IntentParser._cache) == ["heart icon", "shield icon"]
+    assert IntentParser.cache_info()["size"] == 2
+
+
+def test_a_zero_size_cache_is_disabled(parser, monkeypatch):
+    monkeypatch.setattr(IntentParser, "CACHE_SIZE", 0)
+    parser.parse("heart icon")
+    parser.parse("heart icon")
+    info = IntentParser.cache_info()
+    assert (info["size"], info["hits"], info["misses"]) == (0, 0, 2)
+
+
+def test_cached_parse_matches_fresh_parse(parser):
+    messages = load_corpus(CORPUS_PATH)
+    fresh = [classify(parser, message) for message in messages]
+    assert [classify(parser, message) for message in messages] == fresh
+    assert IntentParser.cache_info()["hits"] >= len(messages)
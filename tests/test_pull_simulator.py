@@ -0,0 +1,78 @@
+"""GachaPullSimulator: layout counting, pity rules and drop-rate parsing."""
+import pytest
+
+from generate_gacha import CARD_ASSETS, CARD_KEYS, CardType, GachaPullSimulator, PityRules
+
+RARITY = {CARD_KEYS[card_type]: asset.rarity for card_type, asset in CARD_ASSETS.items()}
+NO_PITY = PityRules(guarantee_rarity=0, hard_pity=0)
+
+
+def rarities(counts):
+    return [RARITY[key] for key, count in counts.items() for _ in range(count)]
+
+
+def test_every_layout_is_a_full_ten_pull():
+    result = GachaPullSimulator(seed=1).simulate(5_000, chunk_pulls=700)
+    assert result.total_pulls == 5_000
+    assert sum(n for _, n in result.layouts) == 5_000
+    assert all(sum(counts.values()) == 10 for counts, _ in result.layouts)
+    shares = [n for _, n in result.layouts]
+    assert shares == sorted(shares, reverse=True)
+
+
+def test_same_seed_gives_the_same_distribution():
+    first = GachaPullSimulator(seed=7).simulate(2_000)
+    second = GachaPullSimulator(seed=7).simulate(2_000)
+    assert first.layouts == second.layouts
+
+
+def test_total_is_rounded_up_to_whole_players():
+    result = GachaPullSimulator(pity=PityRules(pulls_per_player=10), seed=1).simulate(15)
+    assert result.total_pulls == 20
+
+
+def test_only_sorcery_3star_without_pity():
+    simulator = GachaPullSimulator(rates={CardType.SORCERY_3STAR: 1.0}, pity=NO_PITY, seed=1)
+    assert [counts for counts, _ in simulator.simulate(100).layouts] == [
+        {**{key: 0 for key in RARITY}, "sorcery_3star": 10}]
+
+
+def test_every_ten_pull_meets_the_guarantee():
+    rates = {CardType.SORCERY_3STAR: 0.99, CardType.SORCERY_4STAR: 0.01}
+    simulator = GachaPullSimulator(rates=rates, pity=PityRules(guarantee_rarity=4, hard_pity=0), seed=3)
+    for counts, _ in simulator.simulate(2_000).layouts:
+        assert max(rarities(counts)) >= 4
+
+
+def test_hard_pity_forces_a_5star():
+    rates = {CardType.SORCERY_3STAR: 1.0, CardType.PRIMAL_5STAR: 1e-9}
+    pity = PityRules(guarantee_rarity=0, hard_pity=10, pulls_per_player=3)
+    result = GachaPullSimulator(rates=rates, pity=pity, seed=5).simulate(300)
+    # The 10th card without a 5star is forced, so every 10-pull ends on one
+    assert [counts["primal_5star"] for counts, _ in result.layouts] == [1]
+
+
+def test_top_pulls_are_renderable():
+    result = GachaPullSimulator(seed=2).simulate(1_000)
+    pulls = result.top_pulls(3)
+    assert len(pulls) == min(3, len(result.layouts))
+    assert all(len(pull.cards) == 10 for pull in pulls)
+
+
+def test_decode_layout_inverts_the_encoding():
+    simulator = GachaPullSimulator(seed=0)
+    code = sum(count * simulator.LAYOUT_BASE ** i for i, count in enumerate([1, 0, 2, 0, 3, 4]))
+    assert list(simulator.decode_layout(code).values()) == [1, 0, 2, 0, 3, 4]
+
+
+def test_parse_rates():
+    assert GachaPullSimulator.parse_rates("primal_5star=0.6%, sorcery_3star=0.994") == {
+        CardType.PRIMAL_5STAR: pytest.approx(0.006), CardType.SORCERY_3STAR: 0.994}
+    assert GachaPullSimulator.parse_rates('{"primal_4star": 0.5}') == {CardType.PRIMAL_4STAR: 0.5}
+    with pytest.raises(ValueError):
+        GachaPullSimulator.parse_rates("legendary=1")
+
+
+def test_invalid_rates_are_rejected():
+    with pytest.raises(ValueError):
+        GachaPullSimulator(rates={CardType.SORCERY_3STAR: -1.0})
@@ -0,0 +1,54 @@
+"""Shared request grammar: parity with the recorded parser baseline, and card field rules."""
+import json
+
+import pytest
+
+from backend.services.parser import IntentParser
+from benchmarks.parser_benchmark import BASELINE_PATH, CORPUS_PATH, classify, diff_against, load_corpus
+from request_grammar import CardIntent, parse_calling, parse_card, parse_gacha, parse_rarity
+
+
+@pytest.fixture(autouse=True)
+def fresh_parse_cache():
+    IntentParser.clear_cache()
+    yield
+    IntentParser.clear_cache()
+
+
+def test_corpus_matches_recorded_baseline():
+    baseline = json.loads(BASELINE_PATH.read_text())
+    parser = IntentParser()
+    results = {message: classify(parser, message) for message in load_corpus(CORPUS_PATH)}
+    assert set(results) <= set(baseline)
+    assert diff_against(baseline, results) == []
+
+
+def test_parse_card():
+    assert parse_card("5 star might card for Elara") == CardIntent(character="Elara", rarity="5star", calling="Might")
+    assert parse_card("give me a 5-star card of mira, calling: wisdom") == \
+        CardIntent(character="Mira", rarity="5star", calling="Wisdom")
+
+
+@pytest.mark.parametrize("text, rarity", [
+    ("rarity: 3", "3star"),
+    ("a 4-star card", "4star"),
+    ("5 star, no wait, 4 star", "4star"),
+    ("3 star or 5 star", "5star"),
+    ("a card", None),
+])
+def test_rarity_precedence(text, rarity):
+    assert parse_rarity(text) == rarity
+
+
+def test_only_known_callings_are_accepted():
+    assert parse_calling("class: Shadow") == "Shadow"
+    assert parse_calling("type fire") is None
+    intent = parse_card("card for elara type fire")
+    assert intent.calling is None
+    assert intent.character == "Elara"
+
+
+def test_parse_gacha_counts():
+    intent = parse_gacha("1 5star primal, 2 epic primals, 7 sorcery")
+    assert (intent.primal_5star, intent.primal_4star, intent.sorcery_3star) == (1, 2, 7)
+    assert intent.total == 10
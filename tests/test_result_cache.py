@@ -0,0 +1,88 @@
+"""ResultCache: hit/miss counters, LRU eviction and the shared index log."""
+import json
+
+from result_cache import ResultCache
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get("icon") is None
+    path = cache.put_bytes("icon", b"png", ".png", meta={"name": "heart"})
+    assert cache.get("icon") == path
+    assert path.read_bytes() == b"png"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 3)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=8)
+    cache.put_bytes("a", b"aaaa", ".bin")
+    cache.put_bytes("b", b"bbbb", ".bin")
+    cache._index["a"]["last_used"] += 10  # a read after b was written
+    cache.put_bytes("c", b"cccc", ".bin")
+
+    assert cache.get("b") is None
+    assert not (tmp_path / "b.bin").exists()
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_an_entry_larger_than_the_budget_is_kept(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=2)
+    cache.put_bytes("big", b"bigger", ".bin")
+    assert cache.get("big") is not None
+
+
+def test_missing_files_count_as_misses(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put_bytes("gone", b"x", ".bin").unlink()
+    assert cache.get("gone") is None
+    assert ResultCache(tmp_path).stats()["entries"] == 0
+
+
+def test_hits_do_not_rewrite_the_index(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put_bytes("icon", b"png", ".png")
+    log = tmp_path / ResultCache.LOG_NAME
+    size = log.stat().st_size
+    for _ in range(100):
+        cache.get("icon")
+    # At most one touch record per TOUCH_LOG_INTERVAL_S
+    assert log.stat().st_size == size
+
+
+def test_processes_see_each_others_entries(tmp_path):
+    first, second = ResultCache(tmp_path), ResultCache(tmp_path)
+    first.get("warm")
+    first.put_bytes("a", b"a", ".bin")
+    second.put_bytes("b", b"b", ".bin")
+    assert first.get("b") is not None
+    assert second.get("a") is not None
+
+
+def test_compaction_keeps_other_processes_entries(tmp_path):
+    first, second = ResultCache(tmp_path), ResultCache(tmp_path)
+    first.put_bytes("a", b"a", ".bin")
+    second.put_bytes("b", b"b", ".bin")
+    first._compact()
+    assert len((tmp_path / ResultCache.LOG_NAME).read_text().splitlines()) == 2
+
+    second.put_bytes("c", b"c", ".bin")
+    assert {"a", "b", "c"} <= set(second._index)
+    assert ResultCache(tmp_path).stats()["entries"] == 3
+
+
+def test_legacy_index_is_imported(tmp_path):
+    (tmp_path / "old.png").write_bytes(b"p")
+    (tmp_path / "index.json").write_text(json.dumps(
+        {"old": {"suffix": ".png", "size": 1, "created": 1.0, "last_used": 1.0, "hits": 3, "meta": {}}}))
+    cache = ResultCache(tmp_path)
+    assert cache.get("old") == tmp_path / "old.png"
+    assert not (tmp_path / "index.json").exists()
+    assert ResultCache(tmp_path).get("old") is not None
+
+
+def test_make_key_is_order_sensitive_and_stable():
+    assert ResultCache.make_key("heart", 1) == ResultCache.make_key("heart", 1)
+    assert ResultCache.make_key("heart", 1) != ResultCache.make_key(1, "heart")
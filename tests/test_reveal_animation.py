@@ -0,0 +1,85 @@
+"""Animated reveal export: APNG chunk layout, frame timing and partial-frame updates."""
+import io
+import struct
+
+from PIL import Image, ImageChops
+
+import generate_gacha
+from generate_gacha import APNGStreamWriter, GachaRevealAnimator, RevealTiming, UnifiedGachaGenerator
+from conftest import PROJECT_ROOT
+
+
+def chunks(data):
+    pos = len(APNGStreamWriter.SIGNATURE)
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def same_pixels(a, b):
+    return ImageChops.difference(a.convert("RGBA"), b.convert("RGBA")).getbbox() is None
+
+
+def test_stream_writer_chunks_and_timing():
+    frames = [Image.new("RGBA", (8, 6), color) for color in ("red", "green", "blue")]
+    buf = io.BytesIO()
+    writer = APNGStreamWriter(buf, (8, 6), num_frames=3, fps=25)
+    writer.add(frames[0])
+    writer.add(frames[1], (2, 1, 5, 4))
+    writer.add(frames[2])
+    writer.close()
+
+    data = buf.getvalue()
+    assert data.startswith(APNGStreamWriter.SIGNATURE)
+    parsed = list(chunks(data))
+    assert [kind for kind, _ in parsed] == [b"IHDR", b"acTL", b"fcTL", b"IDAT", b"fcTL", b"fdAT",
+                                            b"fcTL", b"fdAT", b"IEND"]
+    assert struct.unpack(">II", parsed[1][1]) == (3, 1)
+
+    controls = [struct.unpack(">IIIIIHHBB", body) for kind, body in parsed if kind == b"fcTL"]
+    # sequence, width, height, x, y, delay num/den, dispose, blend
+    assert controls[0] == (0, 8, 6, 0, 0, 1, 25, 0, 0)
+    assert controls[1] == (1, 3, 3, 2, 1, 1, 25, 0, 0)
+    assert controls[2][:5] == (3, 8, 6, 0, 0)
+    assert [struct.unpack(">I", body[:4])[0] for kind, body in parsed if kind == b"fdAT"] == [2, 4]
+
+    image = Image.open(io.BytesIO(data))
+    assert image.n_frames == 3
+    assert image.info["duration"] == 40
+    image.seek(1)
+    expected = frames[0].copy()
+    expected.paste(frames[1].crop((2, 1, 5, 4)), (2, 1))
+    assert same_pixels(image, expected)
+
+
+def test_reveal_frames_match_the_animator(store, monkeypatch):
+    monkeypatch.setattr(generate_gacha, "OUTPUT_STORE", store)
+    generator = UnifiedGachaGenerator(str(PROJECT_ROOT))
+    generator.output_dir = store.root / "gacha"
+    timing = RevealTiming(frames=40, fps=20)
+    pull = generator.parser.parse("1 5star primal, 9 sorcery")
+
+    path = generator.export_reveal(pull=pull, fmt="apng", output_name="reveal", scale=0.2, timing=timing)
+    animator = GachaRevealAnimator(generator.specs, generator.assets_dir, scale=0.2, timing=timing)
+    expected = [frame for frame, _ in animator.frames(pull)]
+
+    image = Image.open(path)
+    assert image.n_frames == 40
+    assert image.size == animator.size
+    assert image.info["duration"] == 50
+    for index in (0, 10, 39):
+        image.seek(index)
+        assert same_pixels(image, expected[index])
+
+
+def test_webp_reveal_has_every_frame(store, monkeypatch):
+    monkeypatch.setattr(generate_gacha, "OUTPUT_STORE", store)
+    generator = UnifiedGachaGenerator(str(PROJECT_ROOT))
+    generator.output_dir = store.root / "gacha"
+
+    path = generator.export_reveal("10 sorcery", fmt="webp", scale=0.1, timing=RevealTiming(frames=12, fps=30))
+    image = Image.open(path)
+    assert path.suffix == ".webp"
+    assert image.n_frames == 12
+    assert image.info["loop"] == 1
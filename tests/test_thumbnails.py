@@ -0,0 +1,98 @@
+"""/api/thumb previews: width snapping, caching and 304s answered without rendering."""
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import thumbnails
+from backend.routers import downloads, generate
+from result_cache import ResultCache
+from thumbnails import Thumbnailer, snap_width
+
+
+def png(width, height, color="red"):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Widths make_thumbnail was asked to render."""
+    calls = []
+    make_thumbnail = thumbnails.make_thumbnail
+
+    def counting(data, width):
+        calls.append(width)
+        return make_thumbnail(data, width)
+
+    monkeypatch.setattr(thumbnails, "make_thumbnail", counting)
+    return calls
+
+
+@pytest.fixture
+def client(store, tmp_path, monkeypatch, renders):
+    for module in (generate, downloads, thumbnails):
+        monkeypatch.setattr(module, "OUTPUT_STORE", store)
+    monkeypatch.setattr(downloads, "OUTPUT_ROOT", store.root)
+    monkeypatch.setattr(generate, "THUMBNAILS", Thumbnailer(ResultCache(tmp_path / "thumb")))
+    store.put_bytes(store.root / "icon" / "HEART.png", png(1000, 500))
+    app = FastAPI()
+    app.include_router(generate.router, prefix="/api")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("requested, width", [(1, 96), (96, 96), (97, 192), (384, 384), (500, 768), (4096, 768)])
+def test_snap_width(requested, width):
+    assert snap_width(requested) == width
+
+
+def test_preview_is_rendered_at_the_snapped_width(client, renders):
+    response = client.get("/api/thumb/icon/HEART.png?w=100")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == downloads.REVALIDATE
+    assert Image.open(io.BytesIO(response.content)).size == (192, 96)
+
+    # Any width that snaps to 192 is the same cached preview
+    again = client.get("/api/thumb/icon/HEART.png?w=192")
+    assert again.headers["etag"] == response.headers["etag"]
+    assert again.content == response.content
+    assert renders == [192]
+
+
+def test_revalidation_is_answered_without_rendering(client, store, renders):
+    # The ETag comes from the source digest and snapped width, so it is known before any render
+    etag = generate.THUMBNAILS.etag(store.root / "icon" / "HEART.png", 768)
+    response = client.get("/api/thumb/icon/HEART.png?w=700", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert renders == []
+
+    assert client.get("/api/thumb/icon/HEART.png?w=700").headers["etag"] == etag
+    assert renders == [768]
+
+
+def test_versioned_previews_are_immutable(client, store):
+    digest = hashlib.sha256(png(1000, 500)).hexdigest()
+    response = client.get(f"/api/thumb/v/{digest}/icon/HEART.png?w=96")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == downloads.IMMUTABLE
+
+    store.put_bytes(store.root / "icon" / "HEART.png", png(1000, 500, "blue"))
+    assert client.get(f"/api/thumb/v/{digest}/icon/HEART.png?w=96").status_code == 410
+
+
+def test_small_sources_are_not_upscaled(client, store):
+    store.put_bytes(store.root / "icon" / "DOT.png", png(50, 50))
+    response = client.get("/api/thumb/icon/DOT.png?w=768")
+    assert Image.open(io.BytesIO(response.content)).size == (50, 50)
+
+
+def test_missing_and_unsupported_sources_are_not_found(client, store):
+    store.put_bytes(store.root / "gacha" / "page.html", b"<html></html>")
+    assert client.get("/api/thumb/icon/NEVER.png").status_code == 404
+    assert client.get("/api/thumb/gacha/page.html").status_code == 404